@@ -0,0 +1,189 @@
+"""
+Контроль допуска вопросов: квоты пользователя и чата в скользящем окне, общий предел нагрузки
+и деградированный режим (меньше итераций, малая модель), пока модели отвечают слишком медленно
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Hashable, Optional
+from model_router import ModelRouter
+from metrics import counter, gauge
+
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_DECISIONS = counter(
+    "reshala_admission_decisions", "Решения о допуске вопросов: admitted, user_quota, chat_quota, overloaded", ("decision",)
+)
+
+
+class SlidingWindowQuota:
+    """Не больше limit событий за последние window_seconds секунд на каждый ключ"""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._events: Dict[Hashable, Deque[float]] = {}
+
+    def _prune(self, key: Hashable, now: float) -> Deque[float]:
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window_seconds:
+            events.popleft()
+        if not events:
+            del self._events[key]
+        return events
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> Optional[float]:
+        """Через сколько секунд ключ снова сможет пройти (None - может сейчас)"""
+        now = time.monotonic() if now is None else now
+        events = self._prune(key, now)
+        if len(events) < self.limit:
+            return None
+        return events[len(events) - self.limit] + self.window_seconds - now
+
+    def record(self, key: Hashable, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._prune(key, now)
+        self._events.setdefault(key, deque()).append(now)
+
+
+@dataclass
+class Admission:
+    """Решение о допуске вопроса"""
+    admitted: bool
+    # admitted, user_quota, chat_quota или overloaded
+    reason: str
+    # Через сколько секунд имеет смысл повторить (для отказов по квоте)
+    retry_after: float = 0.0
+
+
+class AdmissionController:
+    """
+    Допуск вопросов до постановки в очередь: отказ сразу, с понятным сообщением, вместо бесконечно растущей очереди.
+
+    Деградированный режим включается, когда перцентиль задержки моделей (по предохранителям маршрутизатора,
+    только модели с успешными ответами за последние latency_window_seconds) превышает degraded_latency_seconds,
+    и выключается, когда задержка опустилась ниже recovery_ratio от порога (но не раньше чем через hold_seconds).
+    """
+
+    def __init__(
+        self,
+        router: ModelRouter,
+        user_quota: Optional[SlidingWindowQuota] = None,
+        chat_quota: Optional[SlidingWindowQuota] = None,
+        max_in_flight: int = 0,
+        degraded_latency_seconds: float = 0,
+        degraded_max_iterations: Optional[int] = None,
+        degraded_model: Optional[str] = None,
+        latency_percentile: float = 95,
+        latency_window_seconds: float = 60,
+        hold_seconds: float = 60,
+        recovery_ratio: float = 0.7
+    ):
+        self.router = router
+        self.user_quota = user_quota
+        self.chat_quota = chat_quota
+        self.max_in_flight = max_in_flight
+        self.degraded_latency_seconds = degraded_latency_seconds
+        self.degraded_max_iterations = degraded_max_iterations
+        self.degraded_model = degraded_model
+        self.latency_percentile = latency_percentile
+        self.latency_window_seconds = latency_window_seconds
+        self.hold_seconds = hold_seconds
+        self.recovery_ratio = recovery_ratio
+        self.degraded = False
+        self._degraded_since = 0.0
+
+    def admit(self, chat_id: int, user_id: Optional[int], in_flight: int) -> Admission:
+        """Проверяет вопрос; in_flight - вопросы в работе и в очереди. Допущенный вопрос расходует квоты"""
+        self.refresh()
+        now = time.monotonic()
+        if self.max_in_flight and in_flight >= self.max_in_flight:
+            return self._decide(Admission(False, "overloaded"))
+        if self.user_quota and user_id is not None:
+            retry_after = self.user_quota.retry_after(user_id, now)
+            if retry_after is not None:
+                return self._decide(Admission(False, "user_quota", retry_after))
+        if self.chat_quota:
+            retry_after = self.chat_quota.retry_after(chat_id, now)
+            if retry_after is not None:
+                return self._decide(Admission(False, "chat_quota", retry_after))
+        if self.user_quota and user_id is not None:
+            self.user_quota.record(user_id, now)
+        if self.chat_quota:
+            self.chat_quota.record(chat_id, now)
+        return self._decide(Admission(True, "admitted"))
+
+    @staticmethod
+    def _decide(admission: Admission) -> Admission:
+        ADMISSION_DECISIONS.inc(decision=admission.reason)
+        return admission
+
+    def upstream_latency(self) -> Optional[float]:
+        """Наибольший перцентиль задержки среди моделей, отвечавших за последние latency_window_seconds"""
+        now = time.time()
+        latencies = [
+            breaker.latency_percentile(self.latency_percentile)
+            for breaker in self.router.breakers().values()
+            if breaker.last_success_at is not None and now - breaker.last_success_at <= self.latency_window_seconds
+        ]
+        latencies = [latency for latency in latencies if latency is not None]
+        return max(latencies) if latencies else None
+
+    def refresh(self) -> bool:
+        """Пересчитывает деградированный режим по текущей задержке моделей"""
+        if not self.degraded_latency_seconds:
+            return False
+        latency = self.upstream_latency()
+        if not self.degraded:
+            if latency is not None and latency > self.degraded_latency_seconds:
+                self._set_degraded(True, latency)
+        elif time.monotonic() - self._degraded_since >= self.hold_seconds:
+            if latency is None or latency < self.degraded_latency_seconds * self.recovery_ratio:
+                self._set_degraded(False, latency)
+        return self.degraded
+
+    def _set_degraded(self, degraded: bool, latency: Optional[float]) -> None:
+        self.degraded = degraded
+        self._degraded_since = time.monotonic()
+        latency_text = f"{latency:.1f} с" if latency is not None else "нет данных"
+        if degraded:
+            logger.warning(f"Деградированный режим включен: задержка моделей {latency_text} (порог {self.degraded_latency_seconds:.0f} с)")
+        else:
+            logger.info(f"Деградированный режим выключен: задержка моделей {latency_text}")
+        if self.degraded_model:
+            self.router.force_model(self.degraded_model if degraded else None)
+
+    def max_iterations(self) -> Optional[int]:
+        """Предел итераций для нового рассуждения (None - обычный)"""
+        return self.degraded_max_iterations if self.refresh() else None
+
+
+def _quota(prefix: str, default_limit: str) -> Optional[SlidingWindowQuota]:
+    limit = int(os.getenv(f"ADMISSION_{prefix}_LIMIT", default_limit))
+    if limit <= 0:
+        return None
+    return SlidingWindowQuota(limit, float(os.getenv(f"ADMISSION_{prefix}_WINDOW_SECONDS", "60")))
+
+
+def admission_from_env(router: ModelRouter) -> AdmissionController:
+    """Контроллер допуска с настройками из ADMISSION_* и DEGRADED_*"""
+    controller = AdmissionController(
+        router,
+        user_quota=_quota("USER", "10"),
+        chat_quota=_quota("CHAT", "30"),
+        max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "100")),
+        degraded_latency_seconds=float(os.getenv("DEGRADED_LATENCY_SECONDS", "30")),
+        degraded_max_iterations=int(os.getenv("DEGRADED_MAX_ITERATIONS", "2")) or None,
+        degraded_model=os.getenv("DEGRADED_MODEL", "mistral-small-latest") or None,
+        latency_percentile=float(os.getenv("DEGRADED_LATENCY_PERCENTILE", "95")),
+        latency_window_seconds=float(os.getenv("DEGRADED_LATENCY_WINDOW_SECONDS", "60")),
+        hold_seconds=float(os.getenv("DEGRADED_HOLD_SECONDS", "60")),
+    )
+    gauge("reshala_degraded_mode", "Деградированный режим (1 - включен)", collect=lambda: {(): int(controller.degraded)})
+    return controller
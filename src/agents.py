@@ -1,51 +1,315 @@
 import os
 from mistralai import Mistral
-from models import ProblemAnalysis, Hypothesis, Solution, ValidationResult
-import json
-from typing import List, Dict, Any
+from mistral_client import get_shared_client
+from models import ProblemAnalysis, Hypothesis, Solution, ValidationResult, FusedSolution
+from cache import get_response_cache, make_key
+from rate_limiter import get_rate_limiter, estimate_tokens, count_tokens, parse_retry_after
+from context_budget import ContextBudget
+from model_router import get_model_router
+from hedging import get_hedging_policy
+from metrics import AGENT_CALL_SECONDS, AGENT_TOKENS, AGENT_RETRIES, MODEL_FALLBACKS, LIMITER_WAIT_SECONDS
+from tracing import span
+from usage import current_usage
+from partial_json import extract_partial_string, extract_partial_list
+from structured_output import STRUCTURED_OUTPUT, StructuredOutputError, parse_structured, response_format_for
+from pydantic import BaseModel, ValidationError
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple, Type, TypeVar
+import logging
+import random
 import time
+import asyncio
 import httpx
 
+# Резерв токенов на ответ при оценке квоты (уточняется по usage ответа)
+EXPECTED_COMPLETION_TOKENS = int(os.getenv("MISTRAL_EXPECTED_COMPLETION_TOKENS", "500"))
+
+# Бюджет токенов промпта агента; растущая часть контекста (история попыток) сжимается под него
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+# Получает текст частичного результата агента по мере генерации
+PartialCallback = Callable[[str], Awaitable[None]]
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class StreamedResponse:
+    """Собранный потоковый ответ в том же виде, что и ответ complete_async"""
+    def __init__(self, content: str, usage: Any):
+        self.choices = [SimpleNamespace(message=SimpleNamespace(content=content))]
+        self.usage = usage
+
+
 class BaseAgent:
     """Базовый класс для всех агентов"""
-    def __init__(self, api_key: str, model: str = "mistral-large-latest", max_retries: int = 3):
-        self.client = Mistral(api_key=api_key)
+    # Поле JSON-ответа, которое показывается пользователю во время потоковой генерации
+    STREAM_FIELD: Optional[str] = None
+    # Этап конвейера, по которому маршрутизатор выбирает модель
+    STAGE = "solution"
+    
+    def __init__(self, api_key: str, model: Optional[str] = None, max_retries: int = 3, client: Optional[Mistral] = None):
+        # Все агенты по умолчанию используют общий пул соединений
+        self.client = client or get_shared_client(api_key)
+        # Явно заданная модель закрепляется за агентом; иначе модель выбирает маршрутизатор по этапу
         self.model = model
+        self.router = get_model_router()
         self.max_retries = max_retries
+        self.prompt_token_budget = PROMPT_TOKEN_BUDGET
+        self.context_budget = ContextBudget(keep_recent=int(os.getenv("PROMPT_KEEP_RECENT_ATTEMPTS", "1")))
         
     def _create_message(self, role: str, content: str) -> dict:
         return {"role": role, "content": content}
 
-    def _safe_chat_complete(self, messages: List[Dict[str, Any]], response_format: Dict[str, str], current_model: str) -> Any:
-        for attempt in range(self.max_retries):
+    @staticmethod
+    def _error_response(error: Exception) -> Optional[httpx.Response]:
+        """HTTP-ответ, вызвавший ошибку API (httpx или SDK Mistral)"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response
+        return getattr(error, "raw_response", None)
+
+    def _is_rate_limited(self, error: Exception) -> bool:
+        response = self._error_response(error)
+        status_code = response.status_code if response is not None else getattr(error, "status_code", None)
+        return status_code == 429 or "capacity exceeded" in str(error)
+
+    def _is_transient(self, error: Exception) -> bool:
+        """Сбой на стороне сервера или сети, после которого стоит повторить запрос (возможно, другой модели)"""
+        if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+            return True
+        response = self._error_response(error)
+        status_code = response.status_code if response is not None else getattr(error, "status_code", None)
+        return isinstance(status_code, int) and status_code >= 500
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        response = self._error_response(error)
+        if response is None:
+            return None
+        return parse_retry_after(response.headers.get("retry-after"))
+
+    async def _stream_chat(self, on_content: Callable[[str], Awaitable[None]], **params) -> StreamedResponse:
+        """Потоковый вызов чата: on_content получает накопленный текст после каждого фрагмента"""
+        stream = await self.client.chat.stream_async(**params)
+        content = ""
+        usage = None
+        async for event in stream:
+            chunk = event.data
+            if chunk.usage is not None:
+                usage = chunk.usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if isinstance(delta, str) and delta:
+                content += delta
+                await on_content(content)
+        return StreamedResponse(content, usage)
+
+    async def _call_model(self, model: str, messages: List[Dict[str, Any]], response_format: Dict[str, Any], extra_params: Dict[str, Any], on_content: Optional[Callable[[str], Awaitable[None]]], estimated_tokens: int, attempt: int, sent: Optional[asyncio.Event] = None) -> Any:
+        """
+        Один вызов модели: ожидание квоты, запрос и учет здоровья модели (sent выставляется после отправки).
+
+        Returns:
+            Tuple[ответ, модель, которая ответила]
+        """
+        breaker = self.router.breaker(model)
+        limiter = get_rate_limiter(model)
+        usage = current_usage()
+        agent = type(self).__name__
+        with span("model_call", agent=agent, model=model, attempt=attempt, streaming=on_content is not None) as call_span:
+            waited = await limiter.acquire(estimated_tokens)
+            LIMITER_WAIT_SECONDS.observe(waited, model=model)
+            if usage:
+                usage.queue_wait += waited
+            if sent is not None:
+                sent.set()
+            started = time.monotonic()
             try:
-                response = self.client.chat.complete(
-                    model=current_model,
-                    messages=messages,
-                    response_format=response_format
-                )
-                return response
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 429:
-                    print(f"Rate limit hit with model {current_model}. Retrying with mistral-small-latest...")
-                    current_model = "mistral-small-latest" # Switch to a different model
-                    time.sleep(2 ** attempt) # Exponential backoff
+                if on_content:
+                    response = await self._stream_chat(
+                        on_content,
+                        model=model,
+                        messages=messages,
+                        response_format=response_format,
+                        **extra_params
+                    )
                 else:
-                    raise # Re-raise other API errors
+                    response = await self.client.chat.complete_async(
+                        model=model,
+                        messages=messages,
+                        response_format=response_format,
+                        **extra_params
+                    )
             except Exception as e:
-                if "capacity exceeded" in str(e):
-                    print(f"Rate limit hit with model {current_model}. Retrying with mistral-small-latest...")
-                    current_model = "mistral-small-latest" # Switch to a different model
-                    time.sleep(2 ** attempt) # Exponential backoff
+                latency = time.monotonic() - started
+                if not self._is_rate_limited(e) and not self._is_transient(e):
+                    # Модель ответила, ошибка в самом запросе - ни успех, ни сбой модели
+                    breaker.record_neutral()
+                    AGENT_CALL_SECONDS.observe(latency, agent=agent, model=model, outcome="error")
+                    raise
+                breaker.record_failure()
+                if self._is_rate_limited(e):
+                    AGENT_CALL_SECONDS.observe(latency, agent=agent, model=model, outcome="rate_limited")
+                    # Ждем столько, сколько просит сервер; без Retry-After - экспоненциально с джиттером
+                    delay = self._retry_after(e)
+                    if delay is None:
+                        delay = min(30, 2 ** attempt) * random.uniform(0.5, 1)
+                    logging.warning(f"Rate limit hit with model {model}. Retrying in {delay:.1f}s...")
+                    limiter.block_for(delay)
                 else:
+                    AGENT_CALL_SECONDS.observe(latency, agent=agent, model=model, outcome="transient_error")
+                raise
+            latency = time.monotonic() - started
+            breaker.record_success(latency)
+            AGENT_CALL_SECONDS.observe(latency, agent=agent, model=model, outcome="ok")
+            if response.usage is not None:
+                limiter.reconcile(estimated_tokens, response.usage.total_tokens)
+                prompt_tokens = getattr(response.usage, "prompt_tokens", 0) or 0
+                completion_tokens = getattr(response.usage, "completion_tokens", 0) or 0
+                AGENT_TOKENS.inc(prompt_tokens, agent=agent, model=model, kind="prompt")
+                AGENT_TOKENS.inc(completion_tokens, agent=agent, model=model, kind="completion")
+                if call_span:
+                    call_span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            if call_span:
+                call_span.set(queue_wait=round(waited, 4))
+            if usage:
+                usage.add_response(response, model)
+            return response, model
+
+    async def _hedged_call(self, model: str, call: Callable[[str, Optional[Callable[[str], Awaitable[None]]], Optional[asyncio.Event]], Awaitable[Any]], on_content: Optional[Callable[[str], Awaitable[None]]]) -> Any:
+        """
+        Вызов с дублированием: если модель не ответила за обычное для нее время, отправляется копия
+        (той же или запасной модели). Поток частичного вывода идет только от основного вызова.
+        """
+        hedging = get_hedging_policy()
+        delay = hedging.delay_for(self.router.breaker(model)) if hedging.enabled else None
+        if delay is None:
+            return await call(model, on_content, None)
+        hedge_model = model
+        if hedging.to_fallback and not self.model:
+            hedge_model = self.router.fallback_for(model, self.STAGE) or model
+        return await hedging.run(
+            lambda sent: call(model, on_content, sent),
+            lambda sent: call(hedge_model, None, sent),
+            delay
+        )
+
+    async def _safe_chat_complete(self, messages: List[Dict[str, Any]], response_format: Dict[str, Any], current_model: Optional[str] = None, temperature: Optional[float] = None, on_content: Optional[Callable[[str], Awaitable[None]]] = None) -> Tuple[Any, str]:
+        """
+        Асинхронный вызов чата через общий ограничитель квот модели (потоковый, если задан on_content).
+        Без current_model модель выбирается маршрутизатором заново на каждой попытке, поэтому после
+        срабатывания предохранителя повтор уходит на запасную модель этапа.
+
+        Returns:
+            Tuple[ответ, модель, которая ответила (запасная или модель дублирующего запроса)]
+        """
+        # Температура передается, только если задана явно (иначе - значение модели по умолчанию)
+        extra_params = {"temperature": temperature} if temperature is not None else {}
+        usage = current_usage()
+        estimated_tokens = estimate_tokens(messages) + EXPECTED_COMPLETION_TOKENS
+        for attempt in range(self.max_retries):
+            model = current_model or self.router.select(self.STAGE)
+            if not current_model and model != self.router.candidates(self.STAGE)[0]:
+                MODEL_FALLBACKS.inc(stage=self.STAGE, model=model)
+            
+            def call(call_model: str, call_on_content, sent: Optional[asyncio.Event]) -> Awaitable[Any]:
+                return self._call_model(call_model, messages, response_format, extra_params, call_on_content, estimated_tokens, attempt, sent)
+            
+            try:
+                return await self._hedged_call(model, call, on_content)
+            except Exception as e:
+                rate_limited = self._is_rate_limited(e)
+                if not rate_limited and not self._is_transient(e):
                     raise # Re-raise other API errors
+                if usage:
+                    usage.retries += 1
+                AGENT_RETRIES.inc(agent=type(self).__name__, model=model, reason="rate_limit" if rate_limited else "transient")
+                if not rate_limited:
+                    if attempt == self.max_retries - 1:
+                        raise
+                    logging.warning(f"Transient error with model {model}: {e}. Retrying...")
         raise Exception("Max retries exceeded for API call.")
 
+    def _with_similar_solutions(self, context: str, similar_solutions: Optional[List[Dict[str, Any]]]) -> str:
+        """Дописывает к контексту принятые ранее решения похожих проблем (до предыдущих попыток - они делят остаток бюджета)"""
+        if not similar_solutions:
+            return context
+        return context + "\n\nПохожие проблемы, решенные ранее (используй как отправную точку, если они подходят):\n" + self.context_budget.render_solutions(similar_solutions)
+
+    def _with_previous_attempts(self, system_prompt: str, context: str, previous_attempts: Optional[List[Dict[str, Any]]]) -> str:
+        """Дописывает к контексту предыдущие попытки: им достается остаток бюджета промпта, старые сжимаются"""
+        if not previous_attempts:
+            return context
+        fixed_tokens = count_tokens(system_prompt) + count_tokens(context)
+        return context + "\n\nПредыдущие попытки:\n" + self.context_budget.render_attempts(
+            previous_attempts, max_tokens=max(0, self.prompt_token_budget - fixed_tokens)
+        )
+
+    def _preview(self, buffer: str) -> Optional[str]:
+        """Текст для показа по недописанному JSON-ответу"""
+        return extract_partial_string(buffer, self.STREAM_FIELD) if self.STREAM_FIELD else None
+
+    def _partial_handler(self, on_partial: Optional[PartialCallback]) -> Optional[Callable[[str], Awaitable[None]]]:
+        """Превращает поток сырого JSON в поток изменившихся превью для on_partial"""
+        if on_partial is None:
+            return None
+        last_preview = None
+        
+        async def handle(buffer: str) -> None:
+            nonlocal last_preview
+            preview = self._preview(buffer)
+            if preview and preview != last_preview:
+                last_preview = preview
+                await on_partial(preview)
+        
+        return handle
+
+    async def _complete_model(self, messages: List[Dict[str, Any]], model_cls: Type[ModelT], temperature: Optional[float] = None, on_partial: Optional[PartialCallback] = None) -> ModelT:
+        """
+        Возвращает ответ модели, разобранный в model_cls; одинаковые запросы берутся из кэша без обращения к API.
+        Ответ сначала проверяется напрямую, затем чинится локально; только если не помогло - запрос повторяется один раз.
+        """
+        response_format = response_format_for(model_cls)
+        agent = type(self).__name__
+        cache = get_response_cache()
+
+        def cache_key(model: str) -> str:
+            return make_key("chat", model, messages, response_format, temperature)
+
+        # Ответ ищется по модели, которая ответила бы сейчас, а сохраняется по той, что ответила на самом деле:
+        # ответ запасной модели не выдается за ответ основной
+        key = cache_key(self.model or self.router.candidates(self.STAGE)[0])
+        content = await cache.get(key) if cache else None
+        if content is not None:
+            try:
+                return model_cls.model_validate_json(content)
+            except ValidationError:
+                pass # Запись старого формата - запрашиваем заново
+        for reissue in range(2):
+            response, answered_model = await self._safe_chat_complete(
+                messages=messages,
+                response_format=response_format,
+                current_model=self.model,
+                temperature=temperature,
+                on_content=self._partial_handler(on_partial)
+            )
+            try:
+                result, path = parse_structured(response.choices[0].message.content, model_cls)
+            except StructuredOutputError as e:
+                if reissue:
+                    STRUCTURED_OUTPUT.inc(agent=agent, path="failed")
+                    raise
+                logging.warning(f"{agent}: {e}. Повторяем запрос...")
+                continue
+            STRUCTURED_OUTPUT.inc(agent=agent, path="reissued" if reissue else path)
+            # В кэш попадает только ответ, прошедший проверку, в нормализованном виде
+            if cache:
+                await cache.set(cache_key(answered_model), result.model_dump_json())
+            return result
+
 
 class ProblemAnalyzer(BaseAgent):
     """Агент для анализа проблемы и определения области"""
+    STREAM_FIELD = "problem_statement"
+    STAGE = "analyzer"
     
-    def analyze(self, user_question: str) -> ProblemAnalysis:
+    async def analyze(self, user_question: str, on_partial: Optional[PartialCallback] = None) -> ProblemAnalysis:
         """Анализирует вопрос пользователя и возвращает структурированный результат"""
         
         system_prompt = """Ты - эксперт по анализу проблем. Твоя задача - проанализировать вопрос пользователя и:
@@ -63,31 +327,31 @@ class ProblemAnalyzer(BaseAgent):
             self._create_message("user", user_question)
         ]
         
-        response = self._safe_chat_complete(
-            messages=messages,
-            response_format={"type": "json_object"},
-            current_model=self.model
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        
-        return ProblemAnalysis(**result)
+        return await self._complete_model(messages, ProblemAnalysis, on_partial=on_partial)
 
 
 class HypothesisAgent(BaseAgent):
     """Агент для построения гипотез"""
+    STREAM_FIELD = "hypothesis"
+    STAGE = "hypothesis"
     
-    def build_hypothesis(self, problem: ProblemAnalysis, previous_attempts: List[Dict[str, Any]] = None) -> Hypothesis:
-        """Строит гипотезу решения проблемы"""
+    # Направления поиска для разных вариантов гипотез в beam-режиме
+    VARIANT_ANGLES = [
+        "самый простой и прямой подход",
+        "альтернативный подход с другой стороны проблемы",
+        "подход через устранение первопричины",
+        "подход на основе проверенных практик",
+        "нестандартный, творческий подход",
+    ]
+    
+    async def build_hypothesis(self, problem: ProblemAnalysis, previous_attempts: List[Dict[str, Any]] = None, variant: int = 0, variants: int = 1, on_partial: Optional[PartialCallback] = None, similar_solutions: Optional[List[Dict[str, Any]]] = None) -> Hypothesis:
+        """
+        Строит гипотезу решения проблемы (variant из variants - номер варианта в beam-режиме).
+        similar_solutions - принятые ранее решения похожих проблем из индекса решений
+        """
         
         context = f"Проблема: {problem.problem_statement}\nОбласть: {problem.problem_area}"
         
-        if previous_attempts:
-            context += "\n\nПредыдущие попытки:\n"
-            for attempt in previous_attempts:
-                context += f"- Гипотеза: {attempt['hypothesis']}\n"
-                context += f"  Обратная связь: {attempt['feedback']}\n"
-        
         system_prompt = f"""Ты - эксперт по построению гипотез в области {problem.problem_area}. 
 Твоя задача - предложить гипотезу решения проблемы.
 Если есть предыдущие попытки, то учитывай их и придумай новую гипотезу.
@@ -99,25 +363,39 @@ class HypothesisAgent(BaseAgent):
     "confidence": 0.8 (значение от 0 до 1 - уверенность в гипотезе)
 }}"""
         
+        temperature = None
+        if variants > 1:
+            # Разные направления и температура делают гипотезы параллельных веток непохожими
+            angle = self.VARIANT_ANGLES[variant % len(self.VARIANT_ANGLES)]
+            system_prompt += f"""
+
+Это вариант {variant + 1} из {variants} независимых гипотез. Используй {angle}, чтобы твоя гипотеза отличалась от остальных вариантов."""
+            temperature = min(1.0, 0.3 + 0.2 * variant)
+        
+        context = self._with_similar_solutions(context, similar_solutions)
+        context = self._with_previous_attempts(system_prompt, context, previous_attempts)
+        
         messages = [
             self._create_message("system", system_prompt),
             self._create_message("user", context)
         ]
         
-        response = self._safe_chat_complete(
-            messages=messages,
-            response_format={"type": "json_object"},
-            current_model=self.model
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        return Hypothesis(**result)
+        return await self._complete_model(messages, Hypothesis, temperature=temperature, on_partial=on_partial)
 
 
 class SolutionAgent(BaseAgent):
     """Агент для построения решений"""
+    STREAM_FIELD = "solution"
+    STAGE = "solution"
+    
+    def _preview(self, buffer: str) -> Optional[str]:
+        solution = extract_partial_string(buffer, "solution")
+        if not solution:
+            return None
+        steps = extract_partial_list(buffer, "steps")
+        return solution + "".join(f"\n{i}. {step}" for i, step in enumerate(steps, 1))
     
-    def build_solution(self, problem: ProblemAnalysis, hypothesis: Hypothesis) -> Solution:
+    async def build_solution(self, problem: ProblemAnalysis, hypothesis: Hypothesis, on_partial: Optional[PartialCallback] = None) -> Solution:
         """Строит конкретное решение на основе гипотезы"""
         
         context = f"""Проблема: {problem.problem_statement}
@@ -138,23 +416,55 @@ class SolutionAgent(BaseAgent):
             self._create_message("user", context)
         ]
         
-        response = self._safe_chat_complete(
-            messages=messages,
-            response_format={"type": "json_object"},
-            current_model=self.model
-        )
+        return await self._complete_model(messages, Solution, on_partial=on_partial)
+
+
+class FusedSolverAgent(SolutionAgent):
+    """Агент fused-режима: гипотеза, решение и самопроверка за один вызов"""
+    
+    async def solve(self, problem: ProblemAnalysis, previous_attempts: List[Dict[str, Any]] = None, on_partial: Optional[PartialCallback] = None, similar_solutions: Optional[List[Dict[str, Any]]] = None) -> FusedSolution:
+        """Предлагает гипотезу, строит по ней решение и оценивает, решает ли оно проблему"""
+        
+        context = f"Проблема: {problem.problem_statement}\nОбласть: {problem.problem_area}"
         
-        result = json.loads(response.choices[0].message.content)
-        return Solution(**result)
+        system_prompt = f"""Ты - эксперт по решению проблем в области {problem.problem_area}.
+Твоя задача:
+1. Предложить самую простую гипотезу решения проблемы
+2. Построить по ней конкретное решение по шагам
+3. Провести критическую самопроверку: решает ли решение проблему и чего в нем не хватает
+Если есть предыдущие попытки, то учитывай их и придумай новую гипотезу.
+
+Отвечай в формате JSON:
+{{
+    "hypothesis": "детальное описание гипотезы решения",
+    "solution": "описание решения",
+    "steps": ["шаг 1", "шаг 2", "шаг 3", ...],
+    "confidence": 0.8 (значение от 0 до 1 - насколько решение решает проблему по итогам самопроверки),
+    "weaknesses": ["слабое место 1", "слабое место 2"] или null
+}}"""
+        
+        context = self._with_similar_solutions(context, similar_solutions)
+        context = self._with_previous_attempts(system_prompt, context, previous_attempts)
+        
+        messages = [
+            self._create_message("system", system_prompt),
+            self._create_message("user", context)
+        ]
+        
+        return await self._complete_model(messages, FusedSolution, on_partial=on_partial)
 
 
 class ValidationAgent(BaseAgent):
     """Агент для проверки решений"""
+    STREAM_FIELD = "feedback"
+    STAGE = "validator"
     
-    def __init__(self, api_key: str, model: str = "mistral-large-latest", max_retries: int = 3):
-        super().__init__(api_key, model, max_retries)
+    def __init__(self, api_key: str, model: Optional[str] = None, max_retries: int = 3, client: Optional[Mistral] = None, focus: Optional[str] = None):
+        super().__init__(api_key, model, max_retries, client)
+        # На чем критик сосредоточен особо (разные критики в ансамбле валидаторов); None - общая проверка
+        self.focus = focus
 
-    def validate_solution(self, problem: ProblemAnalysis, solution: Solution) -> ValidationResult:
+    async def validate_solution(self, problem: ProblemAnalysis, solution: Solution, on_partial: Optional[PartialCallback] = None) -> ValidationResult:
         """Проверяет, решает ли предложенное решение проблему"""
         
         context = f"""Проблема: {problem.problem_statement}
@@ -162,13 +472,15 @@ class ValidationAgent(BaseAgent):
 Предложенное решение: {solution.solution}
 Шаги: {', '.join(solution.steps)}"""
         
+        focus = f"\nОсобое внимание удели {self.focus}." if self.focus else ""
+        
         system_prompt = f"""Ты - критический эксперт в области {problem.problem_area}.
 Твоя задача - проверить, действительно ли предложенное решение решает проблему.
-Будь критичен, но справедлив.
+Будь критичен, но справедлив.{focus}
 
 Отвечай в формате JSON:
 {{
-    "confidence": 0.55, (Результат сходимости решения в процентах)
+    "confidence": 0.55, (сходимость решения - значение от 0 до 1)
     "feedback": "детальная обратная связь",
     "missing_aspects": ["аспект 1", "аспект 2"] или null
 }}"""
@@ -178,11 +490,4 @@ class ValidationAgent(BaseAgent):
             self._create_message("user", context)
         ]
         
-        response = self._safe_chat_complete(
-            messages=messages,
-            response_format={"type": "json_object"},
-            current_model=self.model
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        return ValidationResult(**result) 
\ No newline at end of file
+        return await self._complete_model(messages, ValidationResult, on_partial=on_partial) 
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Пакетный прогон вопросов из JSONL через ReasoningEngine (например, после изменения промптов или порогов).
+
+Каждая строка входного файла - {"id": "...", "question": "..."} (без id идентификатором служит хэш вопроса).
+Результаты дописываются в выходной JSONL по мере готовности; при повторном запуске с тем же выходным
+файлом уже успешно решенные id пропускаются.
+
+Примеры:
+    python batch_eval.py questions.jsonl --output ../data/eval.jsonl --concurrency 8
+    python batch_eval.py questions.jsonl --output ../data/eval.jsonl --limit 50 --summary ../data/eval_summary.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from reasoning_engine import ReasoningEngine
+import mistral_client
+
+
+def question_id(record: Dict[str, Any], id_field: str, question: str) -> str:
+    if record.get(id_field) is not None:
+        return str(record[id_field])
+    return hashlib.sha1(question.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def completed_ids(path: str) -> Set[str]:
+    """id успешно обработанных вопросов из прошлых запусков (неудачные будут повторены)"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue # Строка, оборванная при аварийной остановке
+            if result.get("ok"):
+                done.add(str(result["id"]))
+    return done
+
+
+async def read_questions(path: str, id_field: str, question_field: str, skip: Set[str], limit: Optional[int]) -> AsyncIterator[Tuple[str, str]]:
+    """Читает вопросы построчно (файл целиком в память не загружается)"""
+    taken = 0
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print(f"⚠️ {path}:{number}: строка пропущена ({e})", file=sys.stderr)
+                continue
+            question = record.get(question_field) if isinstance(record, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                print(f"⚠️ {path}:{number}: нет поля {question_field!r}", file=sys.stderr)
+                continue
+            qid = question_id(record, id_field, question)
+            if qid in skip:
+                continue
+            skip.add(qid) # Повторы id внутри файла решаются один раз
+            yield qid, question
+            taken += 1
+            if limit is not None and taken >= limit:
+                return
+            await asyncio.sleep(0)
+
+
+async def evaluate(engine: ReasoningEngine, qid: str, question: str) -> Dict[str, Any]:
+    started = time.monotonic()
+    try:
+        report = await engine.reason_with_report(question)
+    except Exception as e:
+        return {
+            "id": qid, "question": question, "ok": False,
+            "error": f"{type(e).__name__}: {e}", "latency": round(time.monotonic() - started, 3),
+        }
+    return {
+        "id": qid,
+        "question": question,
+        "ok": True,
+        "solution": report.solution.solution,
+        "steps": report.solution.steps,
+        "accepted": report.accepted,
+        "stop_reason": report.stop_reason,
+        "iterations": report.iterations,
+        "confidence": report.confidence,
+        "tokens": {
+            "prompt": report.usage.prompt_tokens,
+            "completion": report.usage.completion_tokens,
+            "total": report.usage.total_tokens,
+        },
+        "calls": report.usage.calls,
+        "retries": report.usage.retries,
+        "cost": round(report.usage.cost, 6),
+        "latency": round(time.monotonic() - started, 3),
+        "cached": report.cached,
+    }
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))], 3)
+
+
+def summarize(results: List[Dict[str, Any]], skipped: int, elapsed: float) -> Dict[str, Any]:
+    succeeded = [result for result in results if result["ok"]]
+    latencies = [result["latency"] for result in succeeded]
+    cost = sum(result["cost"] for result in succeeded)
+    stop_reasons: Dict[str, int] = {}
+    for result in succeeded:
+        stop_reasons[result["stop_reason"]] = stop_reasons.get(result["stop_reason"], 0) + 1
+    return {
+        "questions": len(results),
+        "skipped": skipped,
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "accepted": sum(1 for result in succeeded if result["accepted"]),
+        "stop_reasons": stop_reasons,
+        "elapsed_seconds": round(elapsed, 3),
+        "questions_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "latency_seconds": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "max": max(latencies, default=None)},
+        "iterations_per_question": round(sum(result["iterations"] for result in succeeded) / len(succeeded), 3) if succeeded else None,
+        "tokens": sum(result["tokens"]["total"] for result in succeeded),
+        "cost": round(cost, 6),
+        "cost_per_question": round(cost / len(succeeded), 6) if succeeded else None,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    engine = ReasoningEngine(os.environ["MISTRAL_API_KEY"])
+    # Кэш готовых решений по вопросу вернул бы ответы, полученные со старыми промптами
+    engine.result_cache_enabled = args.result_cache
+    if not args.solution_index:
+        engine.solution_memory = None
+    done = completed_ids(args.output) if args.resume else set()
+    skipped = len(done)
+    queue: "asyncio.Queue[Optional[Tuple[str, str]]]" = asyncio.Queue(maxsize=args.concurrency * 2)
+    results: List[Dict[str, Any]] = []
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    started = time.monotonic()
+
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                result = await evaluate(engine, *item)
+                # Пишем сразу: прерванный прогон продолжается с места остановки
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                results.append(result)
+                status = f"{result['stop_reason']}, итераций {result['iterations']}, уверенность {result['confidence']}" if result["ok"] else result["error"]
+                print(f"[{len(results)}] {result['id']}: {status} ({result['latency']:.1f} с)", file=sys.stderr)
+
+        # Число одновременных рассуждений ограничено воркерами; вызовы API - общим ограничителем квот
+        workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+        try:
+            async for item in read_questions(args.input, args.id_field, args.question_field, done, args.limit):
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await mistral_client.close_shared_clients()
+    return summarize(results, skipped, time.monotonic() - started)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пакетный прогон вопросов из JSONL через систему рассуждений")
+    parser.add_argument("input", help="JSONL с вопросами")
+    parser.add_argument("--output", required=True, help="JSONL с результатами (дописывается; выполненные id пропускаются)")
+    parser.add_argument("--concurrency", type=int, default=4, help="число одновременных рассуждений")
+    parser.add_argument("--limit", type=int, help="обработать не больше N новых вопросов")
+    parser.add_argument("--id-field", default="id", help="поле с идентификатором вопроса")
+    parser.add_argument("--question-field", default="question", help="поле с текстом вопроса")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="перезаписать выходной файл и решить все вопросы заново")
+    parser.add_argument("--result-cache", action="store_true", help="разрешить готовые решения из кэша рассуждений")
+    parser.add_argument("--solution-index", action="store_true", help="использовать индекс принятых решений (подсказки гипотезам и готовые ответы)")
+    parser.add_argument("--summary", help="файл для итоговой сводки JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency должен быть не меньше 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    load_dotenv()
+    args = parse_args(argv)
+    if not os.getenv("MISTRAL_API_KEY"):
+        sys.exit("❌ MISTRAL_API_KEY не найден")
+    summary = asyncio.run(run(args))
+    output = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        os.makedirs(os.path.dirname(args.summary) or ".", exist_ok=True)
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Офлайн-бенчмарк: ReasoningEngine и обработчики bot.py против локальных заглушек Mistral и Telegram.
+
+Примеры:
+    python benchmark.py --mode engine --chats 20 --questions 3
+    python benchmark.py --mode bot --chats 50 --rate-limit-prob 0.05 --output data/bench.json
+
+Квоты ограничителя берутся из окружения как обычно (MISTRAL_RPM, MISTRAL_TPM, ...).
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+# Бенчмарк не должен трогать внешние сервисы и общий кэш; настройки читаются модулями при импорте
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+os.environ.setdefault("CACHE_ENABLED", "0")
+os.environ.setdefault("CHECKPOINT_ENABLED", "0")
+os.environ.setdefault("SOLUTION_INDEX_ENABLED", "0")
+os.environ.setdefault("METRICS_PORT", "0")
+# Бенчмарк измеряет пропускную способность: квоты и деградированный режим не должны в него вмешиваться
+os.environ.setdefault("ADMISSION_USER_LIMIT", "0")
+os.environ.setdefault("ADMISSION_CHAT_LIMIT", "0")
+os.environ.setdefault("ADMISSION_MAX_IN_FLIGHT", "0")
+os.environ.setdefault("DEGRADED_LATENCY_SECONDS", "0")
+
+from mock_services import LatencyModel, MockMistralTransport, MockTelegramRequest
+import mistral_client
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return round(values[index], 4)
+
+
+async def run_engine(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Каждый чат задает свои вопросы по очереди напрямую движку"""
+    from reasoning_engine import ReasoningEngine
+    engine = ReasoningEngine(os.environ["MISTRAL_API_KEY"])
+
+    async def chat(chat_id: int) -> List[Dict[str, Any]]:
+        results = []
+        for n in range(args.questions):
+            started = time.monotonic()
+            try:
+                report = await engine.reason_with_report(f"Вопрос {n} из чата {chat_id}")
+                results.append({
+                    "ok": True, "latency": time.monotonic() - started, "iterations": report.iterations,
+                    "stop_reason": report.stop_reason, "calls": report.usage.calls, "retries": report.usage.retries,
+                })
+            except Exception as e:
+                results.append({"ok": False, "latency": time.monotonic() - started, "error": type(e).__name__})
+        return results
+
+    chats = await asyncio.gather(*(chat(chat_id) for chat_id in range(1, args.chats + 1)))
+    return [result for results in chats for result in results]
+
+
+async def run_bot(args: argparse.Namespace, telegram: MockTelegramRequest) -> List[Dict[str, Any]]:
+    """Каждый чат шлет сообщение в handle_message и ждет итоговый ответ бота"""
+    from telegram import Bot, Update
+    import bot as bot_module
+
+    bot = Bot(os.environ["TELEGRAM_BOT_TOKEN"], request=telegram, get_updates_request=telegram)
+    await bot.initialize()
+    application = SimpleNamespace(bot=bot)
+    await bot_module.post_init(application)
+    update_id = 0
+
+    async def chat(chat_id: int) -> List[Dict[str, Any]]:
+        nonlocal update_id
+        results = []
+        for n in range(args.questions):
+            update_id += 1
+            update = Update.de_json({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+                    "text": f"Вопрос {n} из чата {chat_id}",
+                },
+            }, bot)
+            started = time.monotonic()
+            await bot_module.handle_message(update, SimpleNamespace(bot=bot))
+            final = await telegram.wait_final(chat_id)
+            results.append({"ok": final.lstrip().startswith("🎯"), "latency": time.monotonic() - started})
+        return results
+
+    try:
+        chats = await asyncio.gather(*(chat(chat_id) for chat_id in range(1, args.chats + 1)))
+    finally:
+        await bot_module.post_shutdown(application)
+        await bot.shutdown()
+    return [result for results in chats for result in results]
+
+
+def summarize(args: argparse.Namespace, results: List[Dict[str, Any]], elapsed: float, mistral: MockMistralTransport, telegram: Optional[MockTelegramRequest]) -> Dict[str, Any]:
+    latencies = [result["latency"] for result in results]
+    succeeded = [result for result in results if result["ok"]]
+    summary: Dict[str, Any] = {
+        "mode": args.mode,
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "questions": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "elapsed_seconds": round(elapsed, 3),
+        "questions_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "upstream_calls_per_question": round(mistral.stats["requests"] / len(results), 3) if results else None,
+        "mistral": dict(mistral.stats),
+    }
+    if args.mode == "engine" and succeeded:
+        summary["iterations_per_question"] = round(sum(result["iterations"] for result in succeeded) / len(succeeded), 3)
+        summary["stop_reasons"] = {}
+        for result in succeeded:
+            summary["stop_reasons"][result["stop_reason"]] = summary["stop_reasons"].get(result["stop_reason"], 0) + 1
+    errors: Dict[str, int] = {}
+    for result in results:
+        if not result["ok"] and "error" in result:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    if errors:
+        summary["errors"] = errors
+    if telegram is not None:
+        summary["telegram"] = dict(telegram.stats)
+    return summary
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    mistral = MockMistralTransport(
+        latency=LatencyModel(args.latency_median, args.latency_sigma),
+        rate_limit_probability=args.rate_limit_prob,
+        malformed_probability=args.malformed_prob,
+        accept_probability=args.accept_prob,
+        retry_after=args.retry_after,
+    )
+    mistral_client.use_transport(mistral)
+    telegram = None
+    started = time.monotonic()
+    try:
+        if args.mode == "bot":
+            telegram = MockTelegramRequest(
+                latency=LatencyModel(args.telegram_latency_median, args.latency_sigma),
+                retry_after_probability=args.telegram_retry_after_prob,
+            )
+            results = await run_bot(args, telegram)
+        else:
+            results = await run_engine(args)
+    finally:
+        await mistral_client.close_shared_clients()
+    return summarize(args, results, time.monotonic() - started, mistral, telegram)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк рассуждений с заглушками Mistral и Telegram")
+    parser.add_argument("--mode", choices=("engine", "bot"), default="engine", help="engine - напрямую ReasoningEngine, bot - через обработчики bot.py")
+    parser.add_argument("--chats", type=int, default=10, help="число одновременных чатов")
+    parser.add_argument("--questions", type=int, default=3, help="вопросов на чат (задаются по очереди)")
+    parser.add_argument("--latency-median", type=float, default=0.5, help="медиана задержки ответа Mistral, с")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="разброс логнормальной задержки")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After в ответах 429, с")
+    parser.add_argument("--malformed-prob", type=float, default=0.0, help="доля ответов с битым JSON")
+    parser.add_argument("--accept-prob", type=float, default=0.5, help="вероятность, что валидатор примет решение")
+    parser.add_argument("--telegram-latency-median", type=float, default=0.05, help="медиана задержки Bot API, с")
+    parser.add_argument("--telegram-retry-after-prob", type=float, default=0.0, help="доля ответов Bot API 429")
+    parser.add_argument("--output", help="файл для JSON-результата (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    summary = asyncio.run(main_async(args))
+    output = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
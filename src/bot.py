@@ -1,13 +1,26 @@
 import os
+import time
+# Время запуска отсчитывается до импорта тяжелых модулей (SDK Mistral, Telegram)
+STARTED_AT = time.monotonic()
 import asyncio
 import logging
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from telegram.constants import ParseMode, ChatAction
-from reasoning_engine import ReasoningEngine
-from typing import Dict, Any
-import telegramify_markdown as telegramify
+from telegram.constants import ParseMode
+from reasoning_engine import ReasoningEngine, ReasoningCancelled
+from job_scheduler import Job, JobScheduler, SchedulerClosed
+from mistral_client import close_shared_clients
+from telegram_stream import MessageStream
+from outbox import TelegramOutbox, solution_markdown
+from checkpoint_store import RunCheckpoint, get_checkpoint_store
+from single_flight import SingleFlight
+from admission import admission_from_env
+from model_router import get_model_router
+from cache import normalize_question
+from health import HealthMonitor, StartupTimer
+from metrics import gauge, add_route, start_metrics_server, stop_metrics_server, SCHEDULER_QUEUE_WAIT_SECONDS, BOT_QUESTION_SECONDS
+from typing import Dict, Any, Optional
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,30 +29,86 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Этапы запуска с длительностью (в лог, /status и /health)
+startup = StartupTimer(STARTED_AT)
+startup.record("imports", time.monotonic() - STARTED_AT)
+
 # Загрузка переменных окружения
 load_dotenv()
 
-# Получение токенов из переменных окружения
+# Получение токенов из переменных окружения (проверяются при запуске, в main)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 
-if not TELEGRAM_BOT_TOKEN or not MISTRAL_API_KEY:
-    raise ValueError("Пожалуйста, установите TELEGRAM_BOT_TOKEN и MISTRAL_API_KEY в файле .env")
+# Движок рассуждений создается при первом обращении (при запуске - в post_init, уже после подключения к Telegram)
+_reasoning_engine: Optional[ReasoningEngine] = None
+
+
+def get_reasoning_engine() -> ReasoningEngine:
+    global _reasoning_engine
+    if _reasoning_engine is None:
+        with startup.phase("reasoning_engine"):
+            _reasoning_engine = ReasoningEngine(MISTRAL_API_KEY)
+    return _reasoning_engine
+
 
-# Создание движка рассуждений
-reasoning_engine = ReasoningEngine(MISTRAL_API_KEY)
+# Одинаковые вопросы, пришедшие одновременно (из любых чатов), решаются одним рассуждением
+single_flight = SingleFlight(enabled=os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1")
+
+# Квоты пользователей и чатов, общий предел нагрузки и деградированный режим при медленных моделях
+admission = admission_from_env(get_model_router())
+
+# Потоковый вывод этапов правками одного сообщения
+STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "1") == "1"
+STREAM_EDIT_INTERVAL_SECONDS = float(os.getenv("STREAM_EDIT_INTERVAL_SECONDS", "1.5"))
+
+# Все исходящие сообщения идут через outbox с учетом лимитов Telegram
+outbox = TelegramOutbox(
+    global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")),
+    private_chat_rate=float(os.getenv("TELEGRAM_PRIVATE_CHAT_RATE", "1")),
+    group_chat_rate_per_minute=float(os.getenv("TELEGRAM_GROUP_CHAT_RATE_PER_MINUTE", "20"))
+)
+
+# Планировщик: общий лимит параллельных рассуждений и одна активная задача на чат
+job_scheduler = JobScheduler(
+    max_workers=int(os.getenv("SCHEDULER_MAX_WORKERS", "4")),
+    max_pending_per_chat=max(1, int(os.getenv("SCHEDULER_MAX_PENDING_PER_CHAT", "1")))
+)
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Сколько ждать завершения начатых рассуждений при остановке
+SCHEDULER_DRAIN_TIMEOUT_SECONDS = float(os.getenv("SCHEDULER_DRAIN_TIMEOUT_SECONDS", "60"))
+
+# Фоновое обслуживание чекпоинтов (продление аренды, подхват брошенных рассуждений)
+checkpoint_task: Optional[asyncio.Task] = None
+
+# Состояние планировщика и outbox в /metrics
+gauge("reshala_scheduler_jobs", "Задачи планировщика", ("state",), collect=lambda: {("running",): job_scheduler.running, ("queued",): job_scheduler.queued})
+gauge("reshala_single_flight_active", "Идущие рассуждения, к которым можно присоединиться", collect=lambda: {(): single_flight.active})
+gauge("reshala_outbox_backlog", "Вызовы Bot API, ждущие лимитов Telegram", collect=lambda: {(): outbox.backlog})
+
+# Состояние реплики для /status, /health и /ready (на сервере метрик)
+health = HealthMonitor(
+    startup,
+    get_model_router(),
+    job_scheduler,
+    outbox_backlog=lambda: outbox.backlog,
+    # Пробный запрос, когда модели давно не вызывались: список моделей не расходует токены
+    probe=lambda: get_reasoning_engine().client.models.list_async(),
+    max_in_flight=admission.max_in_flight,
+    recent_seconds=float(os.getenv("HEALTH_RECENT_SECONDS", "120")),
+    probe_interval=float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "30")),
+    probe_timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "5")),
+    extra=lambda: {"degraded_mode": admission.degraded, "single_flight_active": single_flight.active}
+)
+add_route("/health", health.health)
+add_route("/ready", health.ready)
 
 
 async def _send_long_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, parse_mode: ParseMode.MARKDOWN_V2) -> None:
-    """Splits a message into chunks of 4000 characters and sends them individually."""
-    text = telegramify.markdownify(text, normalize_whitespace=True)
-    for i in range(0, len(text), 4000):
-        chunk = text[i:i + 4000]
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=chunk,
-            parse_mode=parse_mode
-        )
+    """Splits a message into chunks of 4000 characters and sends them individually (through the outbox)."""
+    await outbox.send_markdown(chat_id, text, parse_mode)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -68,6 +137,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /start - Начать работу с ботом
 /help - Показать эту справку
 /status - Проверить статус бота
+/cancel - Отменить текущий вопрос
 
 💡 Примеры вопросов:
 - "Как улучшить производительность Python кода?"
@@ -79,85 +149,286 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text(help_text)
 
 
+def format_status(report: Dict[str, Any]) -> str:
+    """Текст /status по отчету HealthMonitor.snapshot"""
+    problems = {
+        "starting": "бот еще запускается",
+        "draining": "бот останавливается и не принимает новые вопросы",
+        "workers_down": "часть воркеров планировщика не работает",
+        "upstream_unreachable": "Mistral API недоступен",
+        "overloaded": "слишком много вопросов в работе",
+    }
+    if report["problems"]:
+        lines = ["⚠️ Бот работает с ограничениями:"] + [f"- {problems.get(problem, problem)}" for problem in report["problems"]]
+    else:
+        lines = ["✅ Бот работает нормально!"]
+    lines.append("")
+    lines.append(f"⏱ Работает {report['uptime_seconds'] / 60:.0f} мин, запуск занял {report['startup']['seconds'] or 0:.1f} с")
+    scheduler = report["scheduler"]
+    lines.append(f"📋 Вопросов в работе: {scheduler['running']}, в очереди: {scheduler['queued']} (воркеров {scheduler['workers_alive']}/{scheduler['max_workers']})")
+    if report.get("degraded_mode"):
+        lines.append("🐢 Включен деградированный режим: модели отвечают медленно")
+    probe = report["upstream"].get("probe")
+    if probe:
+        lines.append("🌐 Mistral API: " + (f"отвечает ({probe['latency']:.1f} с)" if probe["ok"] else "не отвечает"))
+    for model, state in report["models"].items():
+        latency = f"p50 {state['latency_p50']:.1f} с, p95 {state['latency_p95']:.1f} с" if state["latency_p95"] is not None else "мало данных о задержке"
+        icon = "🟢" if state["reachable"] else ("🔴" if state["state"] == "open" else "⚪️")
+        lines.append(f"{icon} {model}: {latency}, ошибок {state['error_rate']:.0%}")
+    for model, saturation in report["rate_limiters"].items():
+        lines.append(f"📈 Квота {model}: занято {saturation:.0%}")
+    lines.append(f"✉️ Сообщений в очереди отправки: {report['telegram_backlog']}")
+    return "\n".join(lines)
+
+
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик команды /status"""
-    status_text = "✅ Бот работает нормально!\n🤖 Все системы активны."
-    await update.message.reply_text(status_text)
+    """Обработчик команды /status: фактическое состояние реплики"""
+    await update.message.reply_text(format_status(await health.snapshot()))
+
+
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /cancel"""
+    cancelled = await job_scheduler.cancel(update.message.chat_id)
+    if cancelled:
+        await update.message.reply_text("🛑 Отменяю ваш вопрос. Текущий шаг агента будет завершен, дальше рассуждение не пойдет.")
+    else:
+        await update.message.reply_text("Нет вопросов в работе или в очереди.")
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик текстовых сообщений"""
-    user_question = update.message.text
-    chat_id = update.message.chat_id
+    """Обработчик текстовых сообщений: ставит вопрос в очередь планировщика"""
+    job = Job(
+        chat_id=update.message.chat_id,
+        text=update.message.text,
+        user_id=update.effective_user.id if update.effective_user else None,
+        run=lambda job: process_question(context, job),
+        on_dropped=drop_queued_question
+    )
+    decision = admission.admit(job.chat_id, job.user_id, job_scheduler.running + job_scheduler.queued)
+    if not decision.admitted:
+        if decision.reason == "overloaded":
+            await outbox.send_message(job.chat_id, "🚦 Сейчас слишком много вопросов. Пожалуйста, повторите через несколько минут.")
+        else:
+            await outbox.send_message(job.chat_id, f"⏳ Слишком много вопросов подряд. Следующий можно задать через {max(1, round(decision.retry_after))} с.")
+        return
+    try:
+        job, position, coalesced = await job_scheduler.submit(job)
+    except SchedulerClosed:
+        await outbox.send_message(job.chat_id, "🔄 Бот перезапускается. Пожалуйста, отправьте вопрос еще раз через минуту.")
+        return
+    if coalesced:
+        await outbox.send_message(job.chat_id, "📎 Сообщение добавлено к вашему вопросу, который ждет в очереди.")
+    elif position > 0:
+        await outbox.send_message(job.chat_id, f"⏳ Ваш вопрос в очереди, позиция: {position}. Отменить - /cancel")
+
+
+async def process_question(context: Optional[ContextTypes.DEFAULT_TYPE], job: Job, checkpoint: Optional[RunCheckpoint] = None) -> None:
+    """
+    Выполняет рассуждение по задаче планировщика и отправляет результат в чат.
+    checkpoint - чекпоинт прерванного рассуждения, которое нужно продолжить (иначе создается новый)
+    """
+    user_question = job.text
+    chat_id = job.chat_id
+    SCHEDULER_QUEUE_WAIT_SECONDS.observe(job.queue_wait)
+    started = time.monotonic()
+    outcome = "error"
     
     # Отправляем индикатор набора текста
-    await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+    await outbox.send_typing(chat_id)
     
     try:
-        # Функция для отправки промежуточных обновлений
+        checkpoint_store = get_checkpoint_store()
+        if checkpoint is None and checkpoint_store is not None:
+            checkpoint = await checkpoint_store.create(chat_id, user_question, job.user_id)
+        
+        # Функция для отправки промежуточных обновлений: они копятся в одном статусном сообщении
         async def send_progress(message: str):
-            await _send_long_message(
-                context=context,
-                chat_id=chat_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
+            await outbox.send_progress(chat_id, message, ParseMode.MARKDOWN_V2)
             # Продолжаем показывать индикатор набора
-            await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+            await outbox.send_typing(chat_id)
         
-        # Запускаем процесс рассуждения
-        _, solution = await reasoning_engine.reason(
-            user_question,
-            progress_callback=send_progress
+        # Потоковый вывод: каждый этап дописывается в свое сообщение, итог - в разметке
+        stream = None
+        
+        async def send_stream(message: str, final: bool):
+            nonlocal stream
+            if stream is None:
+                stream = MessageStream(outbox, chat_id, STREAM_EDIT_INTERVAL_SECONDS)
+            if final:
+                await stream.finish(message, ParseMode.MARKDOWN_V2)
+                stream = None
+                await outbox.send_typing(chat_id)
+            else:
+                await stream.update(message)
+        
+        # Под нагрузкой (модели отвечают медленно) рассуждение короче
+        max_iterations = admission.max_iterations()
+        if max_iterations:
+            await send_progress(f"🐢 *Сервис сейчас перегружен - рассуждение ограничено {max_iterations} итерациями.*")
+        
+        # Запускаем процесс рассуждения (или присоединяемся к идущему по такому же вопросу)
+        _, solution = await single_flight.run(
+            normalize_question(user_question),
+            lambda progress, stream, cancel, shared_checkpoint: get_reasoning_engine().reason(
+                user_question,
+                progress_callback=progress,
+                stream_callback=stream,
+                cancel_event=cancel,
+                checkpoint=shared_checkpoint,
+                max_iterations=max_iterations
+            ),
+            progress_callback=send_progress,
+            stream_callback=send_stream if STREAMING_ENABLED else None,
+            cancel_event=job.cancel_event,
+            checkpoint=checkpoint
         )
                 
         # Отправляем финальное решение
-        final_message = f"""
-🎯 *ФИНАЛЬНОЕ РЕШЕНИЕ:*
-
-*Решение:* {solution.solution}
-
-*Шаги реализации:*
-"""
-        for i, step in enumerate(solution.steps, 1):
-            final_message += f"""
-{i}. {step}"""
-        
         await _send_long_message(
             context=context,
             chat_id=chat_id,
-            text=final_message,
+            text=solution_markdown(solution),
             parse_mode=ParseMode.MARKDOWN_V2
         )
+        outcome = "ok"
         
+    except ReasoningCancelled:
+        if job_scheduler.closed and checkpoint is not None:
+            # Прервано остановкой бота: чекпоинт остается, рассуждение продолжится после запуска
+            outcome = "interrupted"
+            logger.info(f"Рассуждение для чата {chat_id} прервано остановкой, сохранено для продолжения")
+            await outbox.send_message(chat_id, "🔄 Бот перезапускается. Рассуждение сохранено и продолжится после запуска.")
+        else:
+            outcome = "cancelled"
+            logger.info(f"Рассуждение для чата {chat_id} отменено")
+            await outbox.send_message(chat_id, "🛑 Рассуждение отменено.")
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения: {str(e)}")
         error_message = f"❌ Произошла ошибка при обработке вашего запроса: {str(e)}"
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=error_message
+        await outbox.send_message(chat_id, error_message)
+    finally:
+        outbox.end_session(chat_id)
+        BOT_QUESTION_SECONDS.observe(time.monotonic() - started, outcome=outcome)
+        if checkpoint is not None:
+            if outcome == "interrupted":
+                await checkpoint.store.release(checkpoint.run_id)
+            else:
+                await checkpoint.store.finish(checkpoint.run_id, {"ok": "done", "cancelled": "cancelled"}.get(outcome, "failed"))
+
+
+async def drop_queued_question(job: Job) -> None:
+    """Вопрос снят из очереди, не начавшись: при остановке бота он сохраняется и будет решен после запуска"""
+    if not job_scheduler.closed:
+        return # /cancel: пользователь уже получил ответ
+    checkpoint_store = get_checkpoint_store()
+    if checkpoint_store is None:
+        await outbox.send_message(job.chat_id, "🔄 Бот перезапускается, и ваш вопрос не успел начаться. Пожалуйста, отправьте его еще раз через минуту.")
+        return
+    # Чекпоинт без состояния: после запуска вопрос подхватит resume_interrupted_runs (этот или другой процесс)
+    checkpoint = await checkpoint_store.create(job.chat_id, job.text, job.user_id)
+    await checkpoint_store.release(checkpoint.run_id)
+    await outbox.send_message(job.chat_id, "🔄 Бот перезапускается. Ваш вопрос сохранен и будет решен после запуска.")
+
+
+async def resume_interrupted_runs() -> None:
+    """Ставит в очередь рассуждения, прерванные перезапуском этого процесса или остановкой другой реплики"""
+    checkpoint_store = get_checkpoint_store()
+    if checkpoint_store is None:
+        return
+    for run in await checkpoint_store.claim_interrupted():
+        checkpoint = RunCheckpoint(checkpoint_store, run.run_id, run.state)
+        # Захват не отдается: если чат занят новым вопросом, продолжение встает в очередь за ним
+        job = Job(
+            chat_id=run.chat_id,
+            text=run.question,
+            user_id=run.user_id,
+            run=lambda job, checkpoint=checkpoint: process_question(None, job, checkpoint),
+            mergeable=False,
+            on_dropped=lambda job, checkpoint=checkpoint: drop_resumed_run(job, checkpoint)
         )
+        logger.info(f"Продолжаю рассуждение {run.run_id} для чата {run.chat_id} (реплика {run.previous_replica})")
+        try:
+            _, position, _ = await job_scheduler.submit(job)
+        except SchedulerClosed:
+            await checkpoint_store.release(run.run_id)
+            continue
+        if position > 0:
+            await outbox.send_message(run.chat_id, f"🔄 Продолжу ваш вопрос, прерванный перезапуском бота, когда подойдет очередь (позиция: {position}).")
+        else:
+            await outbox.send_message(run.chat_id, "🔄 Продолжаю ваш вопрос, прерванный перезапуском бота.")
+
+
+async def drop_resumed_run(job: Job, checkpoint: RunCheckpoint) -> None:
+    """Продолжение снято из очереди: при остановке бота рассуждение отдается другим процессам, при /cancel - отменяется"""
+    if job_scheduler.closed:
+        await checkpoint.store.release(checkpoint.run_id)
+        await outbox.send_message(job.chat_id, "🔄 Бот перезапускается. Рассуждение сохранено и продолжится после запуска.")
+    else:
+        await checkpoint.store.finish(checkpoint.run_id, "cancelled")
+
+
+async def checkpoint_maintenance() -> None:
+    """Продлевает аренду своих рассуждений и подхватывает брошенные другими репликами"""
+    checkpoint_store = get_checkpoint_store()
+    if checkpoint_store is None:
+        return
+    while True:
+        await asyncio.sleep(checkpoint_store.lease_seconds / 3)
+        try:
+            await checkpoint_store.renew_leases()
+            await resume_interrupted_runs()
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания чекпоинтов: {e}")
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик ошибок"""
     logger.error(f"Update {update} caused error {context.error}")
     
     if update and update.effective_chat:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text="❌ Произошла ошибка. Пожалуйста, попробуйте позже."
-        )
+        await outbox.send_message(update.effective_chat.id, "❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
+
+
+async def post_init(application: Application) -> None:
+    """Подключает outbox к боту, запускает воркеры планировщика и сервер метрик, продолжает прерванные рассуждения"""
+    global checkpoint_task
+    outbox.attach(application.bot)
+    job_scheduler.start()
+    get_reasoning_engine()
+    with startup.phase("metrics_server"):
+        await start_metrics_server()
+    with startup.phase("resume_checkpoints"):
+        await resume_interrupted_runs()
+    checkpoint_task = asyncio.create_task(checkpoint_maintenance())
+    startup.mark_ready()
+
+
+async def post_stop(application: Application) -> None:
+    """Дает начатым рассуждениям завершиться, пока бот еще может отправлять сообщения"""
+    await job_scheduler.drain(SCHEDULER_DRAIN_TIMEOUT_SECONDS)
+    if checkpoint_task is not None:
+        checkpoint_task.cancel()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Останавливает планировщик и сервер метрик, закрывает общий пул соединений с Mistral"""
+    await job_scheduler.stop()
+    await stop_metrics_server()
+    await close_shared_clients()
 
 
 def main() -> None:
     """Основная функция запуска бота"""
-    # Создание приложения
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    if not TELEGRAM_BOT_TOKEN or not MISTRAL_API_KEY:
+        raise ValueError("Пожалуйста, установите TELEGRAM_BOT_TOKEN и MISTRAL_API_KEY в файле .env")
+    
+    # Создание приложения (обновления разных чатов обрабатываются параллельно)
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True).post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
     
     # Регистрация обработчиков команд
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
     
     # Регистрация обработчика текстовых сообщений
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
@@ -166,8 +437,34 @@ def main() -> None:
     application.add_error_handler(error_handler)
     
     # Запуск бота
-    logger.info("Бот запускается...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == "webhook":
+        run_webhook(application)
+    else:
+        logger.info("Бот запускается (polling)...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+def run_webhook(application: Application) -> None:
+    """
+    Запуск во встроенном HTTP-сервере: Telegram присылает обновления на WEBHOOK_URL.
+    Запросы без верного секретного заголовка (WEBHOOK_SECRET_TOKEN) отклоняются.
+    Несколько реплик за балансировщиком должны использовать один URL и один секрет.
+    """
+    webhook_url = os.getenv("WEBHOOK_URL")
+    secret_token = os.getenv("WEBHOOK_SECRET_TOKEN")
+    if not webhook_url or not secret_token:
+        raise ValueError("Для BOT_MODE=webhook установите WEBHOOK_URL и WEBHOOK_SECRET_TOKEN")
+    url_path = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+    logger.info(f"Бот запускается (webhook, {webhook_url.rstrip('/')}/{url_path})...")
+    application.run_webhook(
+        listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        url_path=url_path,
+        webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+        secret_token=secret_token,
+        allowed_updates=Update.ALL_TYPES,
+        max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+    )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+"""
+Кэш ответов: LRU в памяти + SQLite на диске, с TTL и ограничением размера
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from metrics import gauge
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any) -> str:
+    """Стабильный ключ кэша из произвольных JSON-сериализуемых частей"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """Нормализует вопрос: регистр, пробелы и завершающая пунктуация не важны"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.…")
+
+
+class ResponseCache:
+    """Двухуровневый кэш строковых значений: LRU в памяти и (опционально) SQLite на диске"""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 86400, max_memory_entries: int = 1000, max_disk_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+        if self._db is not None:
+            entry = await asyncio.to_thread(self._disk_get, key, now)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.stats["disk_hits"] += 1
+                return entry[0]
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._remember(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0], row[1]
+
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now)
+            )
+            self._writes += 1
+            # Очистка просроченных и самых старых записей - не на каждую запись
+            if self._writes % 100 == 0:
+                self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+                deleted = self._db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                ).rowcount
+                self.stats["evictions"] += max(0, deleted)
+            self._db.commit()
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Общий для процесса кэш или None, если кэш выключен (CACHE_ENABLED=0)"""
+    global _response_cache
+    if os.getenv("CACHE_ENABLED", "1") != "1":
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            path=os.getenv("CACHE_PATH", "data/cache.sqlite3") or None,
+            ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "86400")),
+            max_memory_entries=int(os.getenv("CACHE_MEMORY_ENTRIES", "1000")),
+            max_disk_entries=int(os.getenv("CACHE_DISK_ENTRIES", "50000")),
+        )
+        logger.info(f"Кэш ответов включен (диск: {os.getenv('CACHE_PATH', 'data/cache.sqlite3') or 'нет'})")
+    return _response_cache
+
+
+# Счетчики кэша в /metrics
+gauge(
+    "reshala_cache_events", "Обращения к кэшу ответов (попадания в память/на диск, промахи, вытеснения)", ("event",),
+    collect=lambda: {(event,): value for event, value in _response_cache.stats.items()} if _response_cache else {}
+)
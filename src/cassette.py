@@ -0,0 +1,195 @@
+"""
+Запись и воспроизведение обменов с Mistral API (кассеты) на уровне HTTP-транспорта.
+
+record - запросы уходят в сеть, пары запрос/ответ дописываются в кассету (JSONL, при суффиксе .gz - сжатый);
+replay - ответы берутся из кассеты без сети, с нулевой или записанной задержкой.
+Так рассуждение (ReasoningEngine, рендеринг markdown, нарезка сообщений) профилируется детерминированно.
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+# Заголовки ответа, которые нужны клиенту (разбор потока, квоты); остальные не записываются
+_KEPT_HEADERS = ("content-type", "retry-after", "x-ratelimitbysize-remaining-minute", "x-ratelimit-remaining-tokens", "x-ratelimit-remaining-requests")
+
+
+class CassetteMiss(LookupError):
+    """В кассете нет ответа на запрос (промпты или порядок вызовов изменились с момента записи)"""
+
+
+def request_key(method: str, path: str, content: bytes) -> str:
+    """Ключ запроса: метод, путь и тело JSON без учета порядка полей (API ключ не входит)"""
+    try:
+        body = json.dumps(json.loads(content or b"{}"), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        body = content.decode("utf-8", errors="replace")
+    return hashlib.sha256(f"{method} {path}\n{body}".encode("utf-8")).hexdigest()[:32]
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_cassette(path: str) -> List[Dict[str, Any]]:
+    """Записи кассеты по порядку; строка, оборванная при аварийной остановке записи, пропускается"""
+    entries = []
+    with _open(path, "r") as f:
+        try:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        except EOFError:
+            pass # Недописанный блок gzip
+    return entries
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт httpx для записи (mode="record", запросы уходят в inner) или воспроизведения (mode="replay").
+
+    Одинаковые запросы воспроизводятся в порядке записи; когда записанные ответы кончились,
+    повторяется последний. latency_scale - доля записанной задержки при воспроизведении
+    (0 - мгновенно, 1 - как при записи).
+    """
+
+    def __init__(self, path: str, mode: str = "replay", inner: Optional[httpx.AsyncBaseTransport] = None, latency_scale: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.latency_scale = latency_scale
+        self.stats: Dict[str, int] = {"recorded": 0, "replayed": 0, "missed": 0}
+        self._entries: List[Dict[str, Any]] = []
+        self._responses: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._file_lock = threading.Lock()
+        if mode == "replay":
+            self._entries = load_cassette(path)
+            self.rewind()
+            logger.info(f"Кассета {path}: {len(self._entries)} ответов")
+        elif inner is None:
+            raise ValueError("Для записи кассеты нужен сетевой транспорт inner")
+
+    def rewind(self) -> None:
+        """Воспроизведение снова с начала кассеты (перед повторным прогоном тех же вопросов)"""
+        self._responses = {}
+        self._last = {}
+        for entry in self._entries:
+            self._responses.setdefault(entry["key"], deque()).append(entry)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request.method, request.url.path, await request.aread())
+        if self.mode == "record":
+            return await self._record(key, request)
+        return await self._replay(key, request)
+
+    async def _record(self, key: str, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        first_byte = time.monotonic() - started
+        try:
+            body = b"".join([chunk async for chunk in response.aiter_bytes()])
+        finally:
+            await response.aclose()
+        try:
+            model = json.loads(request.content).get("model")
+        except (ValueError, AttributeError):
+            model = None
+        headers = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+        entry = {
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "model": model,
+            "status": response.status_code,
+            "headers": headers,
+            "body": body.decode("utf-8", errors="replace"),
+            "first_byte": round(first_byte, 4),
+            "latency": round(time.monotonic() - started, 4),
+        }
+        await asyncio.to_thread(self._append, entry)
+        self.stats["recorded"] += 1
+        # Тело уже прочитано и распаковано: отдаем его без исходных заголовков сжатия
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._file_lock, _open(self.path, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    async def _replay(self, key: str, request: httpx.Request) -> httpx.Response:
+        responses = self._responses.get(key)
+        if responses:
+            entry = responses.popleft()
+            self._last[key] = entry
+        elif key in self._last:
+            entry = self._last[key]
+        else:
+            self.stats["missed"] += 1
+            raise CassetteMiss(f"Нет записанного ответа на {request.method} {request.url.path} (ключ {key}) в {self.path}")
+        self.stats["replayed"] += 1
+        first_byte = entry.get("first_byte", 0.0) * self.latency_scale
+        if first_byte > 0:
+            await asyncio.sleep(first_byte)
+        body = entry["body"].encode("utf-8")
+        if entry["headers"].get("content-type", "").startswith("text/event-stream"):
+            duration = max(0.0, entry.get("latency", 0.0) - entry.get("first_byte", 0.0)) * self.latency_scale
+            stream = _ReplayedEvents(body, duration)
+            return httpx.Response(entry["status"], headers=entry["headers"], stream=stream, request=request)
+        if self.latency_scale > 0:
+            await asyncio.sleep(max(0.0, entry.get("latency", 0.0) - entry.get("first_byte", 0.0)) * self.latency_scale)
+        return httpx.Response(entry["status"], headers=entry["headers"], content=body, request=request)
+
+    async def aclose(self) -> None:
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+class _ReplayedEvents(httpx.AsyncByteStream):
+    """Записанный поток SSE по событиям, равномерно распределенным по записанной длительности"""
+
+    def __init__(self, body: bytes, duration: float):
+        self.events = [event + b"\n\n" for event in body.split(b"\n\n") if event.strip()]
+        self.duration = duration
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for event in self.events:
+            if self.duration > 0:
+                await asyncio.sleep(self.duration / len(self.events))
+            yield event
+
+
+def cassette_from_env(inner_factory) -> Optional[CassetteTransport]:
+    """
+    Кассета по MISTRAL_CASSETTE_MODE (off, record, replay), MISTRAL_CASSETTE_PATH
+    и MISTRAL_CASSETTE_LATENCY_SCALE; inner_factory() создает сетевой транспорт для записи
+    """
+    mode = os.getenv("MISTRAL_CASSETTE_MODE", "off")
+    if mode == "off":
+        return None
+    path = os.getenv("MISTRAL_CASSETTE_PATH", "data/mistral_cassette.jsonl.gz")
+    return CassetteTransport(
+        path,
+        mode=mode,
+        inner=inner_factory() if mode == "record" else None,
+        latency_scale=float(os.getenv("MISTRAL_CASSETTE_LATENCY_SCALE", "0")),
+    )
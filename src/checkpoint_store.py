@@ -0,0 +1,227 @@
+"""
+Чекпоинты рассуждений в SQLite: состояние после каждого шага агента, возобновление после
+перезапуска и аренда (lease), чтобы незавершенную работу могла подхватить другая реплика
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from metrics import counter
+
+
+logger = logging.getLogger(__name__)
+
+RUNS_RESUMED = counter("reshala_runs_resumed", "Рассуждения, возобновленные из чекпоинта", ("source",))
+
+
+@dataclass
+class StoredRun:
+    """Незавершенное рассуждение, захваченное для возобновления"""
+    run_id: str
+    chat_id: int
+    user_id: Optional[int]
+    question: str
+    state: Optional[Dict[str, Any]]
+    resumes: int
+    previous_replica: str
+
+
+class RunCheckpoint:
+    """Чекпоинт одного рассуждения: последнее сохраненное состояние и запись нового (то, что нужно движку)"""
+
+    def __init__(self, store: "CheckpointStore", run_id: str, state: Optional[Dict[str, Any]] = None):
+        self.store = store
+        self.run_id = run_id
+        self.state = state
+
+    async def save(self, state: Dict[str, Any]) -> None:
+        self.state = state
+        if not await self.store.save(self.run_id, state):
+            logger.warning(f"Аренда рассуждения {self.run_id} перехвачена другой репликой")
+
+
+class SharedCheckpoint:
+    """
+    Чекпоинт рассуждения, объединенного single-flight: состояние пишется в чекпоинты всех текущих участников.
+    Ушедший участник (отмена) удаляется, и рассуждение остается сохраненным для остальных; после перезапуска
+    каждый чат продолжит свой вопрос, а одинаковые продолжения снова объединятся.
+    """
+
+    def __init__(self, checkpoint: RunCheckpoint):
+        self.checkpoints = [checkpoint]
+        self.state = checkpoint.state
+
+    async def add(self, checkpoint: RunCheckpoint) -> None:
+        """Присоединившийся участник сразу получает текущее состояние"""
+        self.checkpoints.append(checkpoint)
+        if self.state is not None:
+            await self._save(checkpoint, self.state)
+
+    def remove(self, checkpoint: RunCheckpoint) -> None:
+        """Участник ушел: его чекпоинт завершает он сам, рассуждение в него больше не пишет"""
+        if checkpoint in self.checkpoints:
+            self.checkpoints.remove(checkpoint)
+
+    async def save(self, state: Dict[str, Any]) -> None:
+        self.state = state
+        await asyncio.gather(*(self._save(checkpoint, state) for checkpoint in list(self.checkpoints)))
+
+    async def _save(self, checkpoint: RunCheckpoint, state: Dict[str, Any]) -> None:
+        checkpoint.state = state
+        # Участник мог уйти и завершить свой чекпоинт, пока шла запись, - это не перехват аренды
+        if not await checkpoint.store.save(checkpoint.run_id, state) and checkpoint in self.checkpoints:
+            logger.warning(f"Аренда рассуждения {checkpoint.run_id} перехвачена другой репликой")
+
+
+class CheckpointStore:
+    """
+    Таблица рассуждений со статусом running / done / failed / cancelled.
+
+    Каждое рассуждение арендует реплика (replica - стабильный идентификатор узла, incarnation -
+    конкретный процесс). Просроченную аренду может захватить любая реплика с доступом к файлу;
+    рассуждения предыдущего процесса той же реплики захватываются сразу после перезапуска.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 120, max_resumes: int = 3, retention_seconds: float = 7 * 86400, replica: Optional[str] = None):
+        self.lease_seconds = lease_seconds
+        self.max_resumes = max_resumes
+        self.retention_seconds = retention_seconds
+        self.replica = replica or os.getenv("REPLICA_ID") or socket.gethostname()
+        self.incarnation = uuid.uuid4().hex
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id TEXT PRIMARY KEY, chat_id INTEGER NOT NULL, user_id INTEGER, question TEXT NOT NULL, "
+            "state TEXT, status TEXT NOT NULL, replica TEXT NOT NULL, incarnation TEXT NOT NULL, "
+            "lease_until REAL NOT NULL, resumes INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_status ON runs (status, lease_until)")
+        self._db.commit()
+
+    async def create(self, chat_id: int, question: str, user_id: Optional[int] = None) -> RunCheckpoint:
+        run_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._create, run_id, chat_id, user_id, question)
+        return RunCheckpoint(self, run_id)
+
+    async def save(self, run_id: str, state: Dict[str, Any]) -> bool:
+        """Сохраняет состояние и продлевает аренду; False - аренда уже у другого процесса"""
+        return await asyncio.to_thread(self._save, run_id, json.dumps(state, ensure_ascii=False))
+
+    async def finish(self, run_id: str, status: str) -> None:
+        await asyncio.to_thread(self._finish, run_id, status)
+
+    async def release(self, run_id: str) -> None:
+        """Отдает рассуждение (при остановке процесса): его сразу может захватить этот или любой другой процесс"""
+        await asyncio.to_thread(self._release, run_id)
+
+    async def renew_leases(self) -> None:
+        """Продлевает аренду всех рассуждений этого процесса (долгие шаги агентов не теряют аренду)"""
+        await asyncio.to_thread(self._renew_leases)
+
+    async def claim_interrupted(self, limit: int = 100) -> List[StoredRun]:
+        """Захватывает прерванные рассуждения; превысившие max_resumes помечаются failed"""
+        return await asyncio.to_thread(self._claim_interrupted, limit)
+
+    def _create(self, run_id: str, chat_id: int, user_id: Optional[int], question: str) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO runs (run_id, chat_id, user_id, question, state, status, replica, incarnation, lease_until, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, NULL, 'running', ?, ?, ?, ?, ?)",
+                (run_id, chat_id, user_id, question, self.replica, self.incarnation, now + self.lease_seconds, now, now)
+            )
+            self._db.commit()
+
+    def _save(self, run_id: str, state: str) -> bool:
+        now = time.time()
+        with self._db_lock:
+            updated = self._db.execute(
+                "UPDATE runs SET state = ?, lease_until = ?, updated_at = ? WHERE run_id = ? AND incarnation = ? AND status = 'running'",
+                (state, now + self.lease_seconds, now, run_id, self.incarnation)
+            ).rowcount
+            self._db.commit()
+        return updated > 0
+
+    def _finish(self, run_id: str, status: str) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE runs SET status = ?, state = NULL, updated_at = ? WHERE run_id = ? AND incarnation = ?",
+                (status, now, run_id, self.incarnation)
+            )
+            # Старые завершенные записи не нужны
+            self._db.execute("DELETE FROM runs WHERE status != 'running' AND updated_at < ?", (now - self.retention_seconds,))
+            self._db.commit()
+
+    def _release(self, run_id: str) -> None:
+        with self._db_lock:
+            # Без владельца аренда не продлевается (renew_leases), а захват не отфильтрует рассуждение как свое
+            self._db.execute("UPDATE runs SET incarnation = '', lease_until = 0 WHERE run_id = ? AND incarnation = ?", (run_id, self.incarnation))
+            self._db.commit()
+
+    def _renew_leases(self) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE runs SET lease_until = ? WHERE incarnation = ? AND status = 'running'",
+                (now + self.lease_seconds, self.incarnation)
+            )
+            self._db.commit()
+
+    def _claim_interrupted(self, limit: int) -> List[StoredRun]:
+        now = time.time()
+        claimed = []
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT run_id, chat_id, user_id, question, state, resumes, replica FROM runs "
+                "WHERE status = 'running' AND incarnation != ? AND (lease_until < ? OR replica = ?) "
+                "ORDER BY created_at LIMIT ?",
+                (self.incarnation, now, self.replica, limit)
+            ).fetchall()
+            for run_id, chat_id, user_id, question, state, resumes, replica in rows:
+                if resumes >= self.max_resumes:
+                    logger.warning(f"Рассуждение {run_id} прерывалось {resumes} раз, больше не возобновляется")
+                    self._db.execute("UPDATE runs SET status = 'failed', updated_at = ? WHERE run_id = ?", (now, run_id))
+                    continue
+                # Захват атомарен: условие повторяется в UPDATE
+                updated = self._db.execute(
+                    "UPDATE runs SET replica = ?, incarnation = ?, lease_until = ?, resumes = resumes + 1, updated_at = ? "
+                    "WHERE run_id = ? AND status = 'running' AND incarnation != ? AND (lease_until < ? OR replica = ?)",
+                    (self.replica, self.incarnation, now + self.lease_seconds, now, run_id, self.incarnation, now, self.replica)
+                ).rowcount
+                if updated:
+                    claimed.append(StoredRun(run_id, chat_id, user_id, question, json.loads(state) if state else None, resumes + 1, replica))
+                    RUNS_RESUMED.inc(source="same_replica" if replica == self.replica else "other_replica")
+            self._db.commit()
+        return claimed
+
+
+_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Общее для процесса хранилище чекпоинтов или None, если выключено (CHECKPOINT_ENABLED=0)"""
+    global _store
+    if os.getenv("CHECKPOINT_ENABLED", "1") != "1":
+        return None
+    if _store is None:
+        _store = CheckpointStore(
+            path=os.getenv("CHECKPOINT_PATH", "data/checkpoints.sqlite3"),
+            lease_seconds=float(os.getenv("CHECKPOINT_LEASE_SECONDS", "120")),
+            max_resumes=int(os.getenv("CHECKPOINT_MAX_RESUMES", "3")),
+        )
+        logger.info(f"Чекпоинты рассуждений включены (реплика {_store.replica})")
+    return _store
@@ -0,0 +1,104 @@
+"""
+Бюджет токенов для контекста агентов: сжатие истории предыдущих попыток
+"""
+
+from typing import Any, Dict, List, Optional
+from rate_limiter import count_tokens
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+def _aspects(attempt: Dict[str, Any]) -> List[str]:
+    return [aspect for aspect in (attempt.get("missing_aspects") or []) if aspect]
+
+
+class ContextBudget:
+    """
+    Держит блок предыдущих попыток в пределах max_tokens.
+
+    Последние keep_recent попыток идут целиком; если бюджет превышен, более старые
+    сжимаются в короткие дайджесты (начало гипотезы + недостающие аспекты), а самые
+    старые дайджесты - в одну сводку отвергнутых подходов. Недостающие аспекты
+    сохраняются на всех уровнях сжатия.
+    """
+
+    def __init__(self, max_tokens: int = 1500, keep_recent: int = 1, digest_chars: int = 160):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.digest_chars = digest_chars
+
+    def _full(self, attempt: Dict[str, Any]) -> str:
+        text = f"- Гипотеза: {attempt['hypothesis']}\n"
+        text += f"  Обратная связь: {attempt['feedback']}\n"
+        aspects = _aspects(attempt)
+        if aspects:
+            text += f"  Не хватало: {'; '.join(aspects)}\n"
+        return text
+
+    def _digest(self, attempt: Dict[str, Any]) -> str:
+        text = f"- Гипотеза (кратко): {_shorten(attempt['hypothesis'], self.digest_chars)}\n"
+        aspects = _aspects(attempt)
+        if aspects:
+            text += f"  Не хватало: {'; '.join(aspects)}\n"
+        return text
+
+    def _summary(self, attempts: List[Dict[str, Any]]) -> str:
+        aspects: List[str] = []
+        for attempt in attempts:
+            for aspect in _aspects(attempt):
+                if aspect not in aspects:
+                    aspects.append(aspect)
+        text = f"- Ранее отвергнуто гипотез: {len(attempts)}"
+        if aspects:
+            text += f". Им не хватало: {'; '.join(aspects)}"
+        return text + "\n"
+
+    def render_attempts(self, attempts: Optional[List[Dict[str, Any]]], max_tokens: Optional[int] = None) -> str:
+        """Текст блока предыдущих попыток, уложенный в бюджет"""
+        if not attempts:
+            return ""
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        recent_from = max(0, len(attempts) - self.keep_recent)
+        # Каждая попытка может быть: 0 - целиком, 1 - дайджестом; старейшие уходят в сводку
+        levels = [0] * len(attempts)
+        summarized = 0
+
+        def render() -> str:
+            parts = [self._summary(attempts[:summarized])] if summarized else []
+            for attempt, level in zip(attempts[summarized:], levels[summarized:]):
+                parts.append(self._full(attempt) if level == 0 else self._digest(attempt))
+            return "".join(parts)
+
+        text = render()
+        # Сначала сжимаем старые попытки в дайджесты, от старых к новым
+        for i in range(recent_from):
+            if count_tokens(text) <= budget:
+                return text
+            levels[i] = 1
+            text = render()
+        # Затем сворачиваем старейшие дайджесты в сводку
+        while count_tokens(text) > budget and summarized < recent_from:
+            summarized += 1
+            text = render()
+        # Последние попытки тоже сжимаются, если бюджет совсем мал
+        for i in range(recent_from, len(attempts)):
+            if count_tokens(text) <= budget:
+                break
+            levels[i] = 1
+            text = render()
+        return text
+
+    def render_solutions(self, entries: Optional[List[Dict[str, Any]]], max_chars: int = 400) -> str:
+        """Короткий блок ранее принятых решений похожих проблем (из индекса решений)"""
+        parts = []
+        for i, entry in enumerate(entries or [], 1):
+            solution = entry["solution"]
+            steps = "; ".join(solution.get("steps") or [])
+            text = f"{i}. Проблема: {_shorten(entry['problem_statement'], max_chars // 2)}\n   Решение: {_shorten(solution['solution'], max_chars)}"
+            if steps:
+                text += f"\n   Шаги: {_shorten(steps, max_chars)}"
+            parts.append(text + "\n")
+        return "".join(parts)
@@ -0,0 +1,187 @@
+"""
+Состояние реплики по фактам: время запуска, доступность и задержки моделей, задачи планировщика,
+загрузка ограничителей квот и очередь отправки в Telegram. Отдается в /status бота
+и HTTP-эндпоинтами /health (жива ли реплика) и /ready (можно ли направлять ей вопросы).
+"""
+
+import json
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from model_router import CircuitBreaker, ModelRouter
+from rate_limiter import all_rate_limiters
+from job_scheduler import JobScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Длительность этапов запуска: каждый этап пишется в лог и в отчет о состоянии"""
+
+    def __init__(self, started: Optional[float] = None):
+        # started - time.monotonic() начала запуска (по умолчанию - момент создания)
+        self.started = time.monotonic() if started is None else started
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = round(seconds, 3)
+        logger.info(f"Запуск: {name} - {seconds:.2f} с")
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.monotonic()
+        logger.info(f"Бот готов к работе за {self.ready_at - self.started:.2f} с ({', '.join(f'{name} {seconds:.2f} с' for name, seconds in self.phases.items())})")
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+
+class HealthMonitor:
+    """
+    Сводка состояния реплики.
+
+    Модель считается доступной, если ее предохранитель не открыт и она успешно отвечала за последние
+    recent_seconds. Если успешных ответов давно не было (реплика простаивает), доступность API
+    проверяется пробным запросом probe (не чаще раза в probe_interval секунд).
+    """
+
+    def __init__(
+        self,
+        startup: StartupTimer,
+        router: ModelRouter,
+        scheduler: JobScheduler,
+        outbox_backlog: Callable[[], int],
+        probe: Optional[Callable[[], Awaitable[Any]]] = None,
+        max_in_flight: int = 0,
+        recent_seconds: float = 120,
+        probe_interval: float = 30,
+        probe_timeout: float = 5,
+        extra: Optional[Callable[[], Dict[str, Any]]] = None
+    ):
+        self.startup = startup
+        self.router = router
+        self.scheduler = scheduler
+        self.outbox_backlog = outbox_backlog
+        self.probe = probe
+        self.max_in_flight = max_in_flight
+        self.recent_seconds = recent_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.extra = extra
+        self._probe_at = 0.0
+        self._probe_result: Optional[Dict[str, Any]] = None
+        self._probe_lock: Optional[asyncio.Lock] = None # Создается в работающем цикле событий
+
+    def _model(self, breaker: CircuitBreaker, now: float) -> Dict[str, Any]:
+        def seconds_ago(at: Optional[float]) -> Optional[float]:
+            return round(now - at, 1) if at is not None else None
+
+        p50, p95 = breaker.latency_percentile(50), breaker.latency_percentile(95)
+        return {
+            "state": breaker.state,
+            "reachable": breaker.state != CircuitBreaker.OPEN and breaker.last_success_at is not None and now - breaker.last_success_at <= self.recent_seconds,
+            "error_rate": round(breaker.error_rate, 3),
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "last_success_seconds_ago": seconds_ago(breaker.last_success_at),
+            "last_failure_seconds_ago": seconds_ago(breaker.last_failure_at),
+        }
+
+    async def _probe_upstream(self) -> Optional[Dict[str, Any]]:
+        """Пробный запрос к API (результат кэшируется на probe_interval)"""
+        if self.probe is None:
+            return None
+        if self._probe_lock is None:
+            self._probe_lock = asyncio.Lock()
+        async with self._probe_lock:
+            if self._probe_result is not None and time.monotonic() - self._probe_at < self.probe_interval:
+                return self._probe_result
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.probe(), self.probe_timeout)
+                result = {"ok": True, "latency": round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                result = {"ok": False, "error": f"{type(e).__name__}: {e}"[:200]}
+                logger.warning(f"Пробный запрос к Mistral API не прошел: {result['error']}")
+            self._probe_at = time.monotonic()
+            self._probe_result = result
+            return result
+
+    async def snapshot(self, probe_upstream: bool = True) -> Dict[str, Any]:
+        """
+        Отчет о состоянии. probe_upstream=False - без пробного запроса (только последний результат из кэша),
+        чтобы медленный API не задерживал ответ проверке живости
+        """
+        now = time.time()
+        models = {model: self._model(breaker, now) for model, breaker in sorted(self.router.breakers().items())}
+        upstream: Dict[str, Any] = {"reachable": any(model["reachable"] for model in models.values())}
+        if not upstream["reachable"]:
+            probe = await self._probe_upstream() if probe_upstream else self._probe_result
+            if probe is not None:
+                upstream["probe"] = probe
+                upstream["reachable"] = probe["ok"]
+        in_flight = self.scheduler.running + self.scheduler.queued
+        report = {
+            "uptime_seconds": round(time.monotonic() - self.startup.started, 1),
+            "startup": {
+                "ready": self.startup.ready,
+                "seconds": round(self.startup.ready_at - self.startup.started, 3) if self.startup.ready else None,
+                "phases": self.startup.phases,
+            },
+            "upstream": upstream,
+            "models": models,
+            "scheduler": {
+                "running": self.scheduler.running,
+                "queued": self.scheduler.queued,
+                "workers_alive": self.scheduler.workers_alive,
+                "max_workers": self.scheduler.max_workers,
+                "closed": self.scheduler.closed,
+                "max_in_flight": self.max_in_flight or None,
+            },
+            "rate_limiters": {model: round(limiter.saturation, 3) for model, limiter in sorted(all_rate_limiters().items())},
+            "telegram_backlog": self.outbox_backlog(),
+        }
+        if self.extra:
+            report.update(self.extra())
+        report["problems"] = self._problems(report, in_flight)
+        report["status"] = "ok" if not report["problems"] else "degraded"
+        return report
+
+    def _problems(self, report: Dict[str, Any], in_flight: int) -> List[str]:
+        """Причины, по которым реплике сейчас не стоит направлять вопросы"""
+        problems = []
+        if not self.startup.ready:
+            problems.append("starting")
+        if self.scheduler.closed:
+            problems.append("draining")
+        elif self.startup.ready and self.scheduler.workers_alive < self.scheduler.max_workers:
+            problems.append("workers_down")
+        if not report["upstream"]["reachable"]:
+            problems.append("upstream_unreachable")
+        if self.max_in_flight and in_flight >= self.max_in_flight:
+            problems.append("overloaded")
+        return problems
+
+    async def health(self) -> Tuple[int, str, str]:
+        """/health: реплика жива (503 - только если упали воркеры, такую реплику нужно перезапустить); API не опрашивается"""
+        report = await self.snapshot(probe_upstream=False)
+        status = 503 if "workers_down" in report["problems"] else 200
+        return status, "application/json", json.dumps(report, ensure_ascii=False) + "\n"
+
+    async def ready(self) -> Tuple[int, str, str]:
+        """/ready: реплика запущена, принимает задачи, видит API и не перегружена"""
+        report = await self.snapshot()
+        status = 200 if not report["problems"] else 503
+        return status, "application/json", json.dumps(report, ensure_ascii=False) + "\n"
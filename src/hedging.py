@@ -0,0 +1,121 @@
+"""
+Дублирующие (hedged) запросы: если вызов модели не ответил за обычное для нее время,
+параллельно отправляется копия, и берется первый ответ
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from model_router import CircuitBreaker
+from metrics import HEDGED_REQUESTS
+
+
+logger = logging.getLogger(__name__)
+
+
+class HedgingPolicy:
+    """
+    Когда и сколько дублировать.
+
+    Задержка перед дублем - перцентиль latency последних успешных вызовов модели (не меньше min_delay).
+    Дополнительная нагрузка ограничена глобально: дублей не больше max_extra_ratio от числа основных
+    вызовов (с запасом burst) и не больше max_in_flight одновременно.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 95,
+        min_delay: float = 2.0,
+        max_extra_ratio: float = 0.1,
+        burst: float = 3,
+        max_in_flight: int = 4,
+        to_fallback: bool = False
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_extra_ratio = max_extra_ratio
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.to_fallback = to_fallback
+        self.credits = burst
+        self.in_flight = 0
+        self.stats: Dict[str, int] = {"calls": 0, "hedged": 0, "hedge_wins": 0, "skipped": 0}
+
+    def delay_for(self, breaker: CircuitBreaker) -> Optional[float]:
+        """Через сколько секунд дублировать вызов модели (None - пока мало данных о ее задержках)"""
+        latency = breaker.latency_percentile(self.percentile)
+        return None if latency is None else max(self.min_delay, latency)
+
+    def _try_acquire(self) -> bool:
+        if self.credits < 1 or self.in_flight >= self.max_in_flight:
+            self.stats["skipped"] += 1
+            HEDGED_REQUESTS.inc(outcome="skipped")
+            return False
+        self.credits -= 1
+        self.in_flight += 1
+        return True
+
+    async def run(
+        self,
+        primary: Callable[[asyncio.Event], Awaitable[Any]],
+        hedge: Callable[[asyncio.Event], Awaitable[Any]],
+        delay: float
+    ) -> Any:
+        """
+        Запускает primary; если он не ответил через delay секунд после отправки запроса
+        (ожидание квоты не считается), запускает hedge. Возвращает первый успешный ответ,
+        второй вызов отменяется. Вызовы получают событие, которое выставляют, отправив запрос.
+        """
+        self.stats["calls"] += 1
+        self.credits = min(self.burst, self.credits + self.max_extra_ratio)
+        sent = asyncio.Event()
+        primary_task = asyncio.ensure_future(primary(sent))
+        sent_task = asyncio.ensure_future(sent.wait())
+        hedge_task: Optional[asyncio.Future] = None
+        try:
+            await asyncio.wait([primary_task, sent_task], return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait([primary_task], timeout=delay)
+            if done or not self._try_acquire():
+                return await primary_task
+            self.stats["hedged"] += 1
+            logger.info(f"Вызов не ответил за {delay:.1f} с, отправлен дублирующий запрос")
+            hedge_task = asyncio.ensure_future(hedge(asyncio.Event()))
+            pending = {primary_task, hedge_task}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.stats["hedge_wins"] += 1
+                        HEDGED_REQUESTS.inc(outcome="hedge_won" if task is hedge_task else "primary_won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in (primary_task, sent_task, hedge_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            if hedge_task is not None:
+                self.in_flight -= 1
+
+
+_policy: Optional[HedgingPolicy] = None
+
+
+def get_hedging_policy() -> HedgingPolicy:
+    """Общая для процесса политика дублирования (HEDGING_* в окружении)"""
+    global _policy
+    if _policy is None:
+        _policy = HedgingPolicy(
+            enabled=os.getenv("HEDGING_ENABLED", "0") == "1",
+            percentile=float(os.getenv("HEDGING_PERCENTILE", "95")),
+            min_delay=float(os.getenv("HEDGING_MIN_DELAY_SECONDS", "2")),
+            max_extra_ratio=float(os.getenv("HEDGING_MAX_EXTRA_RATIO", "0.1")),
+            max_in_flight=int(os.getenv("HEDGING_MAX_IN_FLIGHT", "4")),
+            to_fallback=os.getenv("HEDGING_TO_FALLBACK", "0") == "1",
+        )
+    return _policy
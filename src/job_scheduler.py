@@ -0,0 +1,198 @@
+"""
+Планировщик задач рассуждения: ограничение числа воркеров, одна активная задача на чат,
+справедливая очередь по кругу между чатами и отмена
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerClosed(Exception):
+    """Планировщик останавливается и не принимает новые задачи"""
+
+
+@dataclass
+class Job:
+    """Задача рассуждения для одного чата"""
+    chat_id: int
+    text: str
+    run: Callable[["Job"], Awaitable[None]]
+    user_id: Optional[int] = None
+    created_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    cancel_event: asyncio.Event = field(default_factory=asyncio.Event)
+    # False - задача встает в очередь отдельно, даже сверх max_pending_per_chat, и к ней не дописываются
+    # другие сообщения чата (продолжение прерванного рассуждения)
+    mergeable: bool = True
+    # Вызывается, если задача снята из очереди, так и не начавшись (отмена или остановка планировщика)
+    on_dropped: Optional[Callable[["Job"], Awaitable[None]]] = None
+
+    @property
+    def queue_wait(self) -> float:
+        """Сколько задача ждала в очереди до запуска"""
+        return (self.started_at or time.monotonic()) - self.created_at
+
+
+class JobScheduler:
+    """Очередь задач с max_workers воркерами и обходом чатов по кругу"""
+
+    def __init__(self, max_workers: int = 4, max_pending_per_chat: int = 1):
+        if max_pending_per_chat < 1:
+            # Сообщения сверх лимита дописываются к ожидающей задаче - хотя бы одна должна помещаться в очередь
+            raise ValueError("max_pending_per_chat должен быть не меньше 1")
+        self.max_workers = max_workers
+        self.max_pending_per_chat = max_pending_per_chat
+        self._pending: Dict[int, Deque[Job]] = {}
+        self._active: Dict[int, Job] = {}
+        # Чаты, у которых есть ожидающие задачи и нет активной, в порядке обхода
+        self._ready: Deque[int] = deque()
+        self._condition: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+
+    @property
+    def running(self) -> int:
+        return len(self._active)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    @property
+    def closed(self) -> bool:
+        """Планировщик останавливается (drain): отмененные сейчас задачи прерваны остановкой, а не пользователем"""
+        return self._closed
+
+    @property
+    def workers_alive(self) -> int:
+        """Число работающих воркеров (меньше max_workers - воркер упал или планировщик остановлен)"""
+        return sum(1 for worker in self._workers if not worker.done())
+
+    def start(self) -> None:
+        """Запускает воркеры (внутри работающего цикла событий)"""
+        self._condition = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Перестает принимать задачи и ждет, пока выполнятся активные и ожидающие (не дольше timeout).
+        Оставшиеся после таймаута активные задачи отменяются на ближайшей границе агентов,
+        а не начавшиеся снимаются из очереди (Job.on_dropped).
+        """
+        if self._condition is None:
+            return
+        self._closed = True
+
+        def busy() -> bool:
+            return bool(self._active or self._pending)
+
+        async with self._condition:
+            if busy():
+                logger.info(f"Ожидаю завершения задач: активных {self.running}, в очереди {self.queued}")
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: not busy()), timeout)
+                return
+            except asyncio.TimeoutError:
+                pass
+        logger.warning(f"Задачи не завершились за {timeout:.0f} с: активных {self.running}, в очереди {self.queued}; отменяю")
+        for chat_id in list(self._active) + list(self._pending):
+            await self.cancel(chat_id)
+        async with self._condition:
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: not self._active), min(timeout, 10))
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, job: Job) -> Tuple[Job, int, bool]:
+        """
+        Ставит задачу в очередь.
+
+        Returns:
+            Tuple[задача, позиция в очереди (0 - запускается сразу), присоединена ли к уже ожидающей задаче чата]
+
+        Raises:
+            SchedulerClosed: планировщик останавливается (drain)
+        """
+        if self._closed:
+            raise SchedulerClosed()
+        async with self._condition:
+            pending = self._pending.setdefault(job.chat_id, deque())
+            if job.mergeable and len(pending) >= self.max_pending_per_chat and pending[-1].mergeable:
+                # Лишние сообщения чата дописываются к последней ожидающей задаче
+                queued_job = pending[-1]
+                queued_job.text += "\n" + job.text
+                return queued_job, self._position(queued_job), True
+            pending.append(job)
+            if job.chat_id not in self._active and job.chat_id not in self._ready:
+                self._ready.append(job.chat_id)
+            self._condition.notify()
+            return job, self._position(job), False
+
+    async def cancel(self, chat_id: int) -> int:
+        """Отменяет ожидающие задачи чата и останавливает активную на ближайшей границе агентов"""
+        async with self._condition:
+            dropped = list(self._pending.pop(chat_id, ()))
+            cancelled = len(dropped)
+            if chat_id in self._ready:
+                self._ready.remove(chat_id)
+            active = self._active.get(chat_id)
+            if active is not None and not active.cancel_event.is_set():
+                active.cancel_event.set()
+                cancelled += 1
+        for job in dropped:
+            if job.on_dropped is None:
+                continue
+            try:
+                await job.on_dropped(job)
+            except Exception as e:
+                logger.error(f"Ошибка при снятии задачи чата {chat_id} из очереди: {e}")
+        return cancelled
+
+    def _position(self, job: Job) -> int:
+        """Сколько задач запустится раньше этой (0 - свободный воркер возьмет ее сразу)"""
+        if job.chat_id in self._ready:
+            ahead = list(self._ready).index(job.chat_id)
+        else:
+            # Чат занят активной задачей - его очередь наступит после всех готовых чатов
+            ahead = len(self._ready)
+        ahead += list(self._pending.get(job.chat_id, ())).index(job) * len(self._ready)
+        free_workers = max(0, self.max_workers - len(self._active))
+        if job.chat_id not in self._active and ahead < free_workers:
+            return 0
+        return ahead + 1
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: bool(self._ready))
+                chat_id = self._ready.popleft()
+                job = self._pending[chat_id].popleft()
+                if not self._pending[chat_id]:
+                    del self._pending[chat_id]
+                self._active[chat_id] = job
+            job.started_at = time.monotonic()
+            try:
+                await job.run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Задача чата {chat_id} завершилась ошибкой: {e}")
+            finally:
+                async with self._condition:
+                    self._active.pop(chat_id, None)
+                    if self._pending.get(chat_id):
+                        self._ready.append(chat_id)
+                    self._condition.notify_all()
@@ -0,0 +1,253 @@
+"""
+Метрики в формате Prometheus (без внешних зависимостей) и локальный HTTP-эндпоинт /metrics
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Базовая метрика с набором меток"""
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(суффикс имени, метки, значение) для вывода"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [("_total", _format_labels(self.labelnames, key), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Текущее значение; collect - функция, которая при каждом запросе /metrics отдает {метки: значение}"""
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), collect: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        values = dict(self._values)
+        if self.collect is not None:
+            try:
+                values.update(self.collect())
+            except Exception as e:
+                logger.warning(f"Не удалось собрать метрику {self.name}: {e}")
+        return [("", _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * len(self.buckets))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            for bound, count in zip(self.buckets, counts):
+                samples.append(("_bucket", _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"'), count))
+            samples.append(("_sum", _format_labels(self.labelnames, key), self._sums[key]))
+            samples.append(("_count", _format_labels(self.labelnames, key), counts[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = (), collect: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, collect))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Вызовы агентов и моделей
+AGENT_CALL_SECONDS = histogram("reshala_agent_call_seconds", "Длительность вызова модели агентом", ("agent", "model", "outcome"))
+AGENT_TOKENS = counter("reshala_agent_tokens", "Токены из поля usage ответов API", ("agent", "model", "kind"))
+AGENT_RETRIES = counter("reshala_agent_retries", "Повторы вызовов модели", ("agent", "model", "reason"))
+MODEL_FALLBACKS = counter("reshala_model_fallbacks", "Вызовы, ушедшие не на основную модель этапа", ("stage", "model"))
+HEDGED_REQUESTS = counter("reshala_hedged_requests", "Дублирующие запросы", ("outcome",))
+LIMITER_WAIT_SECONDS = histogram("reshala_limiter_wait_seconds", "Ожидание квоты в ограничителе запросов", ("model",))
+
+# Рассуждения
+REASONING_SECONDS = histogram("reshala_reasoning_seconds", "Длительность рассуждения по одному вопросу", ("stop_reason",))
+REASONING_ITERATIONS = histogram("reshala_reasoning_iterations", "Итераций на вопрос", (), buckets=(1, 2, 3, 4, 5, 7, 10))
+REASONING_QUESTIONS = counter("reshala_reasoning_questions", "Вопросы по причине остановки", ("stop_reason",))
+REASONING_COST = counter("reshala_reasoning_cost_dollars", "Стоимость вызовов API, $")
+FUSED_PRECHECK = counter("reshala_fused_precheck", "Самопроверка в fused-режиме: passed - решение ушло валидатору, skipped - отклонено без валидатора", ("outcome",))
+VALIDATOR_ENSEMBLE_DECISIONS = counter("reshala_validator_ensemble_decisions", "Решения ансамбля валидаторов: early=yes - решено до ответа всех валидаторов", ("outcome", "early"))
+
+# Бот
+SCHEDULER_QUEUE_WAIT_SECONDS = histogram("reshala_scheduler_queue_wait_seconds", "Ожидание задачи в очереди планировщика")
+BOT_QUESTION_SECONDS = histogram("reshala_bot_question_seconds", "Обработка вопроса ботом от старта задачи до ответа", ("outcome",))
+TELEGRAM_SEND_SECONDS = histogram("reshala_telegram_send_seconds", "Длительность вызовов Bot API (включая ожидание лимитов)", ("outcome",))
+
+
+# Встроенный HTTP-сервер: /metrics и дополнительные маршруты
+RouteHandler = Callable[[], Awaitable[Tuple[int, str, str]]]
+
+
+async def _metrics_route() -> Tuple[int, str, str]:
+    return 200, "text/plain; version=0.0.4; charset=utf-8", REGISTRY.render()
+
+
+_routes: Dict[str, RouteHandler] = {"/metrics": _metrics_route}
+_server: Optional[asyncio.AbstractServer] = None
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def add_route(path: str, handler: RouteHandler) -> None:
+    """Добавляет GET-маршрут; handler возвращает (статус, content-type, тело)"""
+    _routes[path] = handler
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = (await asyncio.wait_for(reader.readline(), 10)).decode("latin-1").split()
+        while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+            pass # Заголовки запроса не нужны
+        if len(request_line) < 2:
+            return
+        method, path = request_line[0], request_line[1].split("?", 1)[0]
+        handler = _routes.get(path)
+        if method != "GET":
+            status, content_type, body = 405, "text/plain", "method not allowed\n"
+        elif handler is None:
+            status, content_type, body = 404, "text/plain", "not found\n"
+        else:
+            try:
+                status, content_type, body = await handler()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика {path}: {e}")
+                status, content_type, body = 500, "text/plain", "internal error\n"
+        payload = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: Optional[str] = None, port: Optional[int] = None) -> Optional[asyncio.AbstractServer]:
+    """Запускает HTTP-сервер метрик (METRICS_HOST / METRICS_PORT; порт 0 - не запускать)"""
+    global _server
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    port = int(os.getenv("METRICS_PORT", "9100")) if port is None else port
+    if _server is not None or port <= 0:
+        return _server
+    _server = await asyncio.start_server(_handle, host, port)
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return _server
+
+
+async def stop_metrics_server() -> None:
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
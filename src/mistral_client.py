@@ -0,0 +1,103 @@
+"""
+Общий клиент Mistral с пулом HTTP-соединений для всех агентов
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List, Optional
+import httpx
+from mistralai import Mistral
+from rate_limiter import get_rate_limiter
+from cassette import CassetteTransport, cassette_from_env
+
+
+logger = logging.getLogger(__name__)
+
+# Клиенты по API ключу: все агенты и все параллельные рассуждения используют один пул
+_shared_clients: Dict[str, Mistral] = {}
+_http_clients: List[httpx.AsyncClient] = []
+# Транспорт для новых клиентов (заглушка API в бенчмарке); None - обычная сеть
+_transport: Optional[httpx.AsyncBaseTransport] = None
+# Кассета записи/воспроизведения (MISTRAL_CASSETTE_MODE), общая для всех клиентов процесса
+_cassette: Optional[CassetteTransport] = None
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 включается через MISTRAL_HTTP2 и требует пакет h2"""
+    if os.getenv("MISTRAL_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("MISTRAL_HTTP2=1, но пакет h2 не установлен. Используется HTTP/1.1")
+        return False
+    return True
+
+
+_RATE_LIMIT_HEADERS = ("retry-after", "x-ratelimitbysize-remaining-minute", "x-ratelimit-remaining-tokens", "x-ratelimit-remaining-requests")
+
+
+async def _observe_rate_limit_headers(response: httpx.Response) -> None:
+    """Передает заголовки квот из ответа в ограничитель соответствующей модели"""
+    if not any(name in response.headers for name in _RATE_LIMIT_HEADERS):
+        return
+    try:
+        model = json.loads(response.request.content).get("model")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return
+    if model:
+        get_rate_limiter(model).observe_headers(response.headers)
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Подменяет HTTP-транспорт для клиентов, создаваемых после вызова"""
+    global _transport
+    _transport = transport
+
+
+def build_async_http_client() -> httpx.AsyncClient:
+    """Создает httpx.AsyncClient с настройками пула из переменных окружения"""
+    global _cassette
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("MISTRAL_MAX_CONNECTIONS", "50")),
+        max_keepalive_connections=int(os.getenv("MISTRAL_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("MISTRAL_KEEPALIVE_EXPIRY_SECONDS", "120")),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("MISTRAL_TIMEOUT_SECONDS", "120")),
+        connect=float(os.getenv("MISTRAL_CONNECT_TIMEOUT_SECONDS", "10")),
+    )
+    transport = _transport
+    if transport is None:
+        if _cassette is None:
+            # При записи запросы уходят в сеть через обычный пул соединений
+            _cassette = cassette_from_env(lambda: httpx.AsyncHTTPTransport(limits=limits, http2=_http2_enabled()))
+        transport = _cassette
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=_http2_enabled() if transport is None else False,
+        transport=transport,
+        event_hooks={"response": [_observe_rate_limit_headers]},
+    )
+
+
+def get_shared_client(api_key: str) -> Mistral:
+    """Возвращает общий для процесса клиент Mistral для данного API ключа"""
+    client = _shared_clients.get(api_key)
+    if client is None:
+        http_client = build_async_http_client()
+        _http_clients.append(http_client)
+        client = Mistral(api_key=api_key, async_client=http_client)
+        _shared_clients[api_key] = client
+    return client
+
+
+async def close_shared_clients() -> None:
+    """Закрывает пулы соединений (вызывается при остановке бота)"""
+    global _cassette
+    _cassette = None
+    _shared_clients.clear()
+    while _http_clients:
+        await _http_clients.pop().aclose()
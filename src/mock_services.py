@@ -0,0 +1,249 @@
+"""
+Локальные заглушки Mistral Chat API и Telegram Bot API для бенчмарка: задержки, 429, битый JSON
+"""
+
+import json
+import math
+import zlib
+import time
+import random
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from telegram.request import BaseRequest, RequestData
+
+
+@dataclass
+class LatencyModel:
+    """Логнормальное распределение задержки: медиана median секунд, разброс sigma"""
+    median: float = 0.5
+    sigma: float = 0.5
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+
+class MockMistralTransport(httpx.AsyncBaseTransport):
+    """
+    Заглушка POST /v1/chat/completions (в том числе потоковая, SSE) и /v1/embeddings.
+    Отвечает правдоподобным JSON для каждого агента по его системному промпту;
+    валидатор принимает решение (а fused-агент уверен в нем) с вероятностью accept_probability.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[LatencyModel] = None,
+        rate_limit_probability: float = 0.0,
+        malformed_probability: float = 0.0,
+        accept_probability: float = 0.5,
+        retry_after: float = 1.0
+    ):
+        self.latency = latency or LatencyModel()
+        self.rate_limit_probability = rate_limit_probability
+        self.malformed_probability = malformed_probability
+        self.accept_probability = accept_probability
+        self.retry_after = retry_after
+        self.stats: Dict[str, int] = {"requests": 0, "rate_limited": 0, "malformed": 0, "streamed": 0, "embeddings": 0}
+
+    def _content(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        system_prompt = str(messages[0].get("content", "")) if messages else ""
+        if "самопроверку" in system_prompt:
+            accepted = random.random() < self.accept_probability
+            return {
+                "hypothesis": "Гипотеза решения " + "детали " * 20,
+                "solution": "Решение " + "описание " * 30,
+                "steps": [f"Шаг {i}" for i in range(1, 6)],
+                "confidence": 0.95 if accepted else round(random.uniform(0.4, 0.9), 2),
+                "weaknesses": None if accepted else ["слабое место"],
+            }
+        if "анализу проблем" in system_prompt:
+            return {"problem_statement": "Сформулированная проблема", "problem_area": "Общая"}
+        if "построению гипотез" in system_prompt:
+            return {"hypothesis": "Гипотеза решения " + "детали " * 20, "confidence": round(random.uniform(0.5, 0.9), 2)}
+        if "решению проблем" in system_prompt:
+            return {"solution": "Решение " + "описание " * 30, "steps": [f"Шаг {i}" for i in range(1, 6)]}
+        if "критический эксперт" in system_prompt:
+            accepted = random.random() < self.accept_probability
+            return {
+                "confidence": 0.98 if accepted else round(random.uniform(0.5, 0.9), 2),
+                "feedback": "Обратная связь " + "замечание " * 15,
+                "missing_aspects": None if accepted else ["аспект"],
+            }
+        return {"result": "ok"}
+
+    @staticmethod
+    def _embedding(text: str, dimensions: int = 256) -> List[float]:
+        """Хэширование слов в вектор: тексты с общими словами получаются близкими"""
+        vector = [0.0] * dimensions
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % dimensions] += 1.0
+        return vector
+
+    def _embeddings_response(self, body: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+        self.stats["embeddings"] += 1
+        inputs = body.get("inputs") or body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        tokens = sum(len(text) for text in inputs) // 4 + 1
+        return httpx.Response(
+            200,
+            json={
+                "id": f"mock-{self.stats['requests']}",
+                "object": "list",
+                "model": body.get("model", "mock-embed"),
+                "data": [{"object": "embedding", "index": i, "embedding": self._embedding(text)} for i, text in enumerate(inputs)],
+                "usage": {"prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens},
+            },
+            request=request,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        body = json.loads(request.content or b"{}")
+        await asyncio.sleep(self.latency.sample() * 0.2) # Время до первого байта
+        if random.random() < self.rate_limit_probability:
+            self.stats["rate_limited"] += 1
+            return httpx.Response(
+                429,
+                headers={"retry-after": str(self.retry_after)},
+                json={"object": "error", "message": "Requests rate limit exceeded", "type": "rate_limited", "code": "1300"},
+                request=request,
+            )
+        if request.url.path.endswith("/embeddings"):
+            await asyncio.sleep(self.latency.sample() * 0.2)
+            return self._embeddings_response(body, request)
+        content = json.dumps(self._content(body.get("messages", [])), ensure_ascii=False)
+        if random.random() < self.malformed_probability:
+            self.stats["malformed"] += 1
+            content = content[:len(content) // 2]
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4 + 1}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get("model", "mock")
+        generation_time = self.latency.sample() * 0.8
+        if body.get("stream"):
+            self.stats["streamed"] += 1
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                stream=_SSEStream(model, content, usage, generation_time),
+                request=request,
+            )
+        await asyncio.sleep(generation_time)
+        return httpx.Response(
+            200,
+            json={
+                "id": f"mock-{self.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            },
+            request=request,
+        )
+
+
+class _SSEStream(httpx.AsyncByteStream):
+    """Потоковый ответ: контент частями с равномерной задержкой, в конце usage и [DONE]"""
+
+    def __init__(self, model: str, content: str, usage: Dict[str, int], duration: float, chunks: int = 8):
+        self.model = model
+        self.content = content
+        self.usage = usage
+        self.duration = duration
+        self.chunks = chunks
+
+    def _event(self, delta: Dict[str, Any], finish_reason: Optional[str] = None, usage: Optional[Dict[str, int]] = None) -> bytes:
+        chunk = {
+            "id": "mock-stream",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        size = max(1, math.ceil(len(self.content) / self.chunks))
+        for start in range(0, len(self.content), size):
+            await asyncio.sleep(self.duration / self.chunks)
+            yield self._event({"role": "assistant", "content": self.content[start:start + size]})
+        yield self._event({"content": ""}, "stop", self.usage)
+        yield b"data: [DONE]\n\n"
+
+
+class MockTelegramRequest(BaseRequest):
+    """
+    Заглушка Bot API для python-telegram-bot: getMe, sendMessage, editMessageText, sendChatAction.
+    Сообщения копятся в messages по чатам; с вероятностью retry_after_probability отвечает 429.
+    Итоговые ответы бота (начинаются с одного из FINAL_MARKERS) можно ждать через wait_final.
+    """
+
+    FINAL_MARKERS = ("🎯", "❌", "🛑")
+
+    def __init__(self, latency: Optional[LatencyModel] = None, retry_after_probability: float = 0.0, retry_after: int = 1):
+        self.latency = latency or LatencyModel(0.05, 0.3)
+        self.retry_after_probability = retry_after_probability
+        self.retry_after = retry_after
+        self.messages: Dict[int, List[str]] = {}
+        self._finals: Dict[int, "asyncio.Queue[str]"] = {}
+        self.stats: Dict[str, int] = {"requests": 0, "retry_after": 0}
+        self._message_id = 0
+
+    def _final_queue(self, chat_id: int) -> "asyncio.Queue[str]":
+        if chat_id not in self._finals:
+            self._finals[chat_id] = asyncio.Queue()
+        return self._finals[chat_id]
+
+    async def wait_final(self, chat_id: int) -> str:
+        """Ждет следующий итоговый ответ бота в чате"""
+        return await self._final_queue(chat_id).get()
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, chat_id: int, text: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": text}
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, **kwargs: Any) -> Tuple[int, bytes]:
+        self.stats["requests"] += 1
+        await asyncio.sleep(self.latency.sample())
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if endpoint != "getMe" and random.random() < self.retry_after_probability:
+            self.stats["retry_after"] += 1
+            return 429, json.dumps({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }).encode()
+        if endpoint == "getMe":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif endpoint in ("sendMessage", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            text = str(params.get("text", ""))
+            self.messages.setdefault(chat_id, []).append(text)
+            if endpoint == "sendMessage" and text.lstrip().startswith(self.FINAL_MARKERS):
+                self._final_queue(chat_id).put_nowait(text)
+            result = self._message(chat_id, str(params.get("text", "")), params.get("message_id"))
+        elif endpoint == "sendChatAction":
+            result = True
+        else:
+            return 400, json.dumps({"ok": False, "error_code": 400, "description": f"Bad Request: {endpoint} is not mocked"}).encode()
+        return 200, json.dumps({"ok": True, "result": result}, ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,185 @@
+"""
+Маршрутизация моделей по этапам конвейера с предохранителями (circuit breaker) на каждую модель
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Этапы конвейера и модели по умолчанию
+STAGES = ("analyzer", "hypothesis", "solution", "validator")
+DEFAULT_STAGE_MODELS = {
+    "analyzer": "mistral-small-latest",
+    "hypothesis": "mistral-large-latest",
+    "solution": "mistral-large-latest",
+    "validator": "mistral-small-latest",
+}
+DEFAULT_FALLBACK_MODELS = "mistral-medium-latest,mistral-small-latest"
+
+
+class CircuitBreaker:
+    """
+    Предохранитель одной модели, общий для всех параллельных рассуждений.
+
+    closed - запросы идут; open - модель перегружена, запросы не отправляются open_seconds;
+    half_open - пропускается один пробный запрос, по его итогу предохранитель закрывается или снова открывается.
+    Ошибкой считаются и слишком медленные ответы (дольше slow_call_seconds).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        model: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 60,
+        open_seconds: float = 30
+    ):
+        self.model = model
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+        self.last_success_at: Optional[float] = None
+        self.last_failure_at: Optional[float] = None
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=200)
+
+    def allow(self) -> bool:
+        """Можно ли сейчас отправить запрос этой модели"""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            # Пробный запрос, не вернувшийся за open_seconds (например, отмененный), не блокирует модель навсегда
+            if self.probe_in_flight and time.monotonic() - self.probe_started < self.open_seconds:
+                return False
+            self.probe_in_flight = True
+            self.probe_started = time.monotonic()
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self.last_success_at = time.time()
+        if latency > self.slow_call_seconds:
+            self._record(False)
+            return
+        if self.state == self.HALF_OPEN:
+            logger.info(f"Модель {self.model} снова доступна")
+            self.state = self.CLOSED
+            self._outcomes.clear()
+        self._record(True)
+
+    def record_neutral(self) -> None:
+        """Модель ответила ошибкой самого запроса (4xx): это не успех и не сбой модели, задержка не учитывается"""
+        # Пробный запрос завершился - следующий вызов снова может проверить модель
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.last_failure_at = time.time()
+        self._record(False)
+
+    def _record(self, ok: bool) -> None:
+        self._outcomes.append(ok)
+        if self.state == self.HALF_OPEN and not ok:
+            self._open()
+        elif self.state == self.CLOSED and len(self._outcomes) >= self.min_calls and self.error_rate >= self.failure_rate:
+            self._open()
+
+    def _open(self) -> None:
+        logger.warning(f"Предохранитель модели {self.model} открыт на {self.open_seconds:.0f} с (доля ошибок {self.error_rate:.0%})")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Перцентиль задержки по последним успешным вызовам (None - мало данных)"""
+        if len(self._latencies) < 5:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+
+class ModelRouter:
+    """Выбирает модель для этапа: основная модель этапа, затем запасные, минуя открытые предохранители"""
+
+    def __init__(self, stage_models: Dict[str, str], fallback_models: List[str], breaker_settings: Optional[Dict[str, float]] = None):
+        self.stage_models = stage_models
+        self.fallback_models = fallback_models
+        self.breaker_settings = breaker_settings or {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # Модель, которая на время заменяет основные модели всех этапов (деградированный режим)
+        self.forced_model: Optional[str] = None
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model, **self.breaker_settings)
+            self._breakers[model] = breaker
+        return breaker
+
+    def breakers(self) -> Dict[str, CircuitBreaker]:
+        return dict(self._breakers)
+
+    def force_model(self, model: Optional[str]) -> None:
+        """Направляет все этапы на model (None - вернуть модели этапов); запасные модели остаются в силе"""
+        self.forced_model = model
+
+    def candidates(self, stage: str) -> List[str]:
+        """Модели этапа в порядке предпочтения"""
+        primary = self.forced_model or self.stage_models.get(stage, DEFAULT_STAGE_MODELS["solution"])
+        return [primary] + [model for model in self.fallback_models if model != primary]
+
+    def select(self, stage: str) -> str:
+        """Первая доступная модель этапа; если все перегружены - та, что раньше всех откроется снова"""
+        candidates = self.candidates(stage)
+        for model in candidates:
+            if self.breaker(model).allow():
+                return model
+        return min(candidates, key=lambda model: self.breaker(model).opened_at)
+
+    def fallback_for(self, model: str, stage: str) -> Optional[str]:
+        """Следующая доступная модель этапа после model (для дублирующих запросов)"""
+        candidates = self.candidates(stage)
+        for candidate in candidates[candidates.index(model) + 1 if model in candidates else 0:]:
+            if candidate != model and self.breaker(candidate).state == CircuitBreaker.CLOSED:
+                return candidate
+        return None
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Общий для процесса маршрутизатор моделей (настраивается через MODEL_<STAGE> и MODEL_FALLBACKS)"""
+    global _router
+    if _router is None:
+        stage_models = {stage: os.getenv(f"MODEL_{stage.upper()}", model) for stage, model in DEFAULT_STAGE_MODELS.items()}
+        fallback_models = [model.strip() for model in os.getenv("MODEL_FALLBACKS", DEFAULT_FALLBACK_MODELS).split(",") if model.strip()]
+        breaker_settings = {
+            "window": int(os.getenv("BREAKER_WINDOW", "20")),
+            "min_calls": int(os.getenv("BREAKER_MIN_CALLS", "5")),
+            "failure_rate": float(os.getenv("BREAKER_FAILURE_RATE", "0.5")),
+            "slow_call_seconds": float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "60")),
+            "open_seconds": float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+        }
+        _router = ModelRouter(stage_models, fallback_models, breaker_settings)
+    return _router
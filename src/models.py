@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class ProblemAnalysis(BaseModel):
@@ -10,7 +10,7 @@ class ProblemAnalysis(BaseModel):
 class Hypothesis(BaseModel):
     """Гипотеза решения проблемы"""
     hypothesis: str
-    confidence: float  # От 0 до 1
+    confidence: float = Field(ge=0, le=1)  # От 0 до 1
     
 
 class Solution(BaseModel):
@@ -21,7 +21,15 @@ class Solution(BaseModel):
     
 class ValidationResult(BaseModel):
     """Результат проверки решения"""
-    confidence: float
+    confidence: float = Field(ge=0, le=1)  # От 0 до 1
     feedback: str
     missing_aspects: Optional[List[str]] = None
-        
\ No newline at end of file
+
+
+class FusedSolution(BaseModel):
+    """Гипотеза, решение по ней и самопроверка - результат одного вызова в fused-режиме"""
+    hypothesis: str
+    solution: str
+    steps: List[str]
+    confidence: float = Field(ge=0, le=1)  # Самооценка: насколько решение решает проблему, от 0 до 1
+    weaknesses: Optional[List[str]] = None
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Исходящие сообщения Telegram: лимиты на чат и глобально, склейка прогресса в одно
+сообщение, дедупликация индикатора набора и повтор по RetryAfter
+"""
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from telegram import Bot, Message
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, RetryAfter
+import telegramify_markdown as telegramify
+from rate_limiter import TokenBucket
+from models import Solution
+from metrics import TELEGRAM_SEND_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram - 4096 символов, оставляем запас
+MAX_MESSAGE_LENGTH = 4000
+
+
+def solution_markdown(solution: Solution) -> str:
+    """Итоговое сообщение с решением (markdown до перевода в MarkdownV2)"""
+    text = f"""
+🎯 *ФИНАЛЬНОЕ РЕШЕНИЕ:*
+
+*Решение:* {solution.solution}
+
+*Шаги реализации:*
+"""
+    for i, step in enumerate(solution.steps, 1):
+        text += f"""
+{i}. {step}"""
+    return text
+
+
+def markdown_chunks(text: str) -> List[str]:
+    """Переводит markdown в MarkdownV2 и режет на части, допустимые для одного сообщения"""
+    text = telegramify.markdownify(text, normalize_whitespace=True)
+    return [text[i:i + MAX_MESSAGE_LENGTH] for i in range(0, len(text), MAX_MESSAGE_LENGTH)]
+
+
+@dataclass
+class _ChatState:
+    """Состояние чата: корзина лимита, статусное сообщение прогресса и индикатор набора"""
+    bucket: TokenBucket
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    blocked_until: float = 0.0
+    status_message_id: Optional[int] = None
+    status_text: str = ""
+    pending_progress: List[str] = field(default_factory=list)
+    progress_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    typing_sent_at: float = 0.0
+
+
+class TelegramOutbox:
+    """Единая очередь отправки: все сообщения, правки и индикаторы чатов идут через нее"""
+
+    def __init__(
+        self,
+        bot: Optional[Bot] = None,
+        global_rate: float = 30,
+        private_chat_rate: float = 1,
+        group_chat_rate_per_minute: float = 20,
+        typing_interval: float = 4.5,
+        max_retries: int = 5
+    ):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate_per_minute = group_chat_rate_per_minute
+        self.typing_interval = typing_interval
+        self.max_retries = max_retries
+        self.backlog = 0
+        self._global_lock: Optional[asyncio.Lock] = None # Создается в работающем цикле событий
+        self._chats: Dict[int, _ChatState] = {}
+
+    def attach(self, bot: Bot) -> None:
+        """Привязывает бота (вызывается после создания приложения)"""
+        self.bot = bot
+
+    def _chat(self, chat_id: int) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            # Отрицательные id - группы и каналы: у них лимит в сообщениях в минуту
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_chat_rate_per_minute / 60, 3)
+            else:
+                bucket = TokenBucket(self.private_chat_rate, 1)
+            state = _ChatState(bucket=bucket)
+            self._chats[chat_id] = state
+        return state
+
+    def _delay(self, state: _ChatState) -> float:
+        now = time.monotonic()
+        return max(
+            state.blocked_until - now,
+            state.bucket.time_until(1),
+            self.global_bucket.time_until(1),
+        )
+
+    async def _acquire(self, state: _ChatState) -> None:
+        async with state.lock:
+            while True:
+                delay = self._delay(state)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            if self._global_lock is None:
+                self._global_lock = asyncio.Lock()
+            async with self._global_lock:
+                while self.global_bucket.time_until(1) > 0:
+                    await asyncio.sleep(self.global_bucket.time_until(1))
+                self.global_bucket.consume(1)
+            state.bucket.consume(1)
+
+    async def _call(self, chat_id: int, request: Callable[[], Awaitable[Any]], best_effort: bool = False) -> Any:
+        """
+        Выполняет вызов Bot API с учетом лимитов. При RetryAfter ждет и повторяет.
+        best_effort: не ждать лимита - если отправить сразу нельзя, вызов пропускается (возвращает None)
+        """
+        state = self._chat(chat_id)
+        if best_effort and (state.lock.locked() or self._delay(state) > 0):
+            return None
+        self.backlog += 1
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            for attempt in range(self.max_retries):
+                await self._acquire(state)
+                try:
+                    result = await request()
+                    outcome = "ok"
+                    return result
+                except RetryAfter as e:
+                    retry_after = float(e.retry_after)
+                    logger.warning(f"Telegram просит подождать {retry_after:.0f} с (чат {chat_id})")
+                    state.blocked_until = time.monotonic() + retry_after
+                    if best_effort:
+                        outcome = "skipped"
+                        return None
+            raise Exception("Max retries exceeded for Telegram API call.")
+        finally:
+            self.backlog -= 1
+            TELEGRAM_SEND_SECONDS.observe(time.monotonic() - started, outcome=outcome)
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None) -> Message:
+        """Отправляет одно сообщение; следующий прогресс начнется с нового статусного сообщения"""
+        message = await self._call(chat_id, lambda: self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode))
+        state = self._chat(chat_id)
+        state.status_message_id = None
+        state.status_text = ""
+        state.typing_sent_at = 0.0 # Новое сообщение гасит индикатор набора
+        return message
+
+    async def send_markdown(self, chat_id: int, text: str, parse_mode: str) -> List[Message]:
+        """Отправляет markdown-текст, разбивая его на сообщения допустимой длины"""
+        return [await self.send_message(chat_id, chunk, parse_mode) for chunk in markdown_chunks(text)]
+
+    async def edit_message(self, chat_id: int, message_id: int, text: str, parse_mode: Optional[str] = None, best_effort: bool = False) -> bool:
+        """Редактирует сообщение; best_effort - пропустить правку, если лимит сейчас исчерпан"""
+        async def edit():
+            try:
+                await self.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode=parse_mode)
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+            return True
+        return bool(await self._call(chat_id, edit, best_effort=best_effort))
+
+    async def send_typing(self, chat_id: int) -> None:
+        """Индикатор набора: не чаще, чем раз в typing_interval (Telegram показывает его ~5 с)"""
+        state = self._chat(chat_id)
+        now = time.monotonic()
+        if now - state.typing_sent_at < self.typing_interval:
+            return
+        state.typing_sent_at = now
+        await self._call(chat_id, lambda: self.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING), best_effort=True)
+
+    async def send_progress(self, chat_id: int, text: str, parse_mode: str) -> None:
+        """
+        Промежуточное обновление: дописывается в текущее статусное сообщение правкой.
+        Обновления, пришедшие, пока предыдущее ждет лимита, уходят одной правкой.
+        """
+        state = self._chat(chat_id)
+        state.pending_progress.append(text)
+        async with state.progress_lock:
+            if not state.pending_progress:
+                return # Уже отправлено вместе с предыдущим обновлением
+            new_text = "\n\n".join(state.pending_progress)
+            state.pending_progress.clear()
+            combined = f"{state.status_text}\n\n{new_text}" if state.status_text else new_text
+            chunks = markdown_chunks(combined)
+            if state.status_message_id is not None and len(chunks) == 1:
+                await self.edit_message(chat_id, state.status_message_id, chunks[0], parse_mode)
+                state.status_text = combined
+                return
+            # Статусное сообщение переполнено (или его нет) - начинаем новое
+            chunks = markdown_chunks(new_text)
+            messages = [await self.send_message(chat_id, chunk, parse_mode) for chunk in chunks]
+            if len(chunks) == 1:
+                state.status_message_id = messages[-1].message_id
+                state.status_text = new_text
+
+    def end_session(self, chat_id: int) -> None:
+        """Забывает состояние чата после завершения задачи"""
+        state = self._chats.get(chat_id)
+        if (
+            state is not None
+            and not state.lock.locked()
+            and not state.progress_lock.locked()
+            and state.blocked_until <= time.monotonic()
+        ):
+            del self._chats[chat_id]
@@ -0,0 +1,79 @@
+"""
+Разбор незавершенного JSON из потокового ответа модели
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _read_string(buffer: str, start: int) -> Tuple[str, bool, int]:
+    """
+    Читает JSON-строку, начиная сразу после открывающей кавычки.
+
+    Returns:
+        Tuple[прочитанный текст, закрыта ли строка, позиция после строки]
+    """
+    chars = []
+    i = start
+    while i < len(buffer):
+        char = buffer[i]
+        if char == '"':
+            return "".join(chars), True, i + 1
+        if char == "\\":
+            if i + 1 >= len(buffer):
+                break # Escape-последовательность еще не пришла целиком
+            code = buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(buffer):
+                    break
+                try:
+                    chars.append(chr(int(buffer[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+                continue
+            chars.append(_ESCAPES.get(code, code))
+            i += 2
+            continue
+        chars.append(char)
+        i += 1
+    return "".join(chars), False, len(buffer)
+
+
+def _field_start(buffer: str, field: str) -> Optional[int]:
+    match = re.search(r'"' + re.escape(field) + r'"\s*:\s*', buffer)
+    return match.end() if match else None
+
+
+def extract_partial_string(buffer: str, field: str) -> Optional[str]:
+    """Текущее (возможно, недописанное) значение строкового поля field"""
+    start = _field_start(buffer, field)
+    if start is None or start >= len(buffer) or buffer[start] != '"':
+        return None
+    text, _, _ = _read_string(buffer, start + 1)
+    return text
+
+
+def extract_partial_list(buffer: str, field: str) -> List[str]:
+    """Элементы (последний - возможно, недописанный) строкового массива field"""
+    start = _field_start(buffer, field)
+    if start is None or start >= len(buffer) or buffer[start] != "[":
+        return []
+    items = []
+    i = start + 1
+    while i < len(buffer):
+        char = buffer[i]
+        if char == "]":
+            break
+        if char == '"':
+            text, closed, i = _read_string(buffer, i + 1)
+            items.append(text)
+            if not closed:
+                break
+            continue
+        i += 1
+    return items
+
@@ -0,0 +1,175 @@
+"""
+Детерминированное профилирование собственного кода рассуждения по кассете ответов Mistral (см. cassette.py).
+
+Сначала ответы записываются один раз с настоящим API, затем прогоны воспроизводят их без сети:
+ReasoningEngine.reason_with_report, рендеринг markdown и нарезка сообщений для Telegram
+(как в bot.py) меряются по CPU и памяти без разброса задержек и ответов модели.
+
+Примеры:
+    python profile_engine.py --record --questions questions.txt --cassette ../data/profile.jsonl.gz
+    python profile_engine.py --questions questions.txt --cassette ../data/profile.jsonl.gz --runs 5 --profile-output ../data/engine.prof
+    python profile_engine.py --cassette ../data/profile.jsonl.gz --top 0 --max-cpu-seconds 2 --max-peak-mib 50
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import asyncio
+import argparse
+import cProfile
+import platform
+import tracemalloc
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+# Все, что зависит от времени или состояния между прогонами, выключено; настройки читаются модулями при импорте
+os.environ.setdefault("MISTRAL_API_KEY", "profile")
+os.environ.setdefault("CACHE_ENABLED", "0")
+os.environ.setdefault("REASONING_CACHE_ENABLED", "0")
+os.environ.setdefault("SOLUTION_INDEX_ENABLED", "0")
+os.environ.setdefault("HEDGING_ENABLED", "0")
+os.environ.setdefault("METRICS_PORT", "0")
+
+import httpx
+from cassette import CassetteTransport
+import mistral_client
+
+DEFAULT_QUESTION = "Как улучшить концентрацию при работе из дома?"
+
+
+def read_questions(path: Optional[str]) -> List[str]:
+    if not path:
+        return [DEFAULT_QUESTION]
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def run_questions(engine: Any, questions: List[str]) -> Dict[str, int]:
+    """Рассуждение по каждому вопросу с рендерингом прогресса, потока и итогового решения, как в боте"""
+    from outbox import markdown_chunks, solution_markdown
+
+    rendered = {"messages": 0, "chunks": 0}
+
+    def render(text: str) -> None:
+        rendered["messages"] += 1
+        rendered["chunks"] += len(markdown_chunks(text))
+
+    async def on_progress(message: str) -> None:
+        render(message)
+
+    async def on_stream(message: str, final: bool) -> None:
+        if final:
+            render(message)
+
+    for question in questions:
+        report = await engine.reason_with_report(question, progress_callback=on_progress, stream_callback=on_stream)
+        render(solution_markdown(report.solution))
+    return rendered
+
+
+async def profile(args: argparse.Namespace) -> Dict[str, Any]:
+    questions = read_questions(args.questions)
+    if args.record:
+        transport = CassetteTransport(args.cassette, mode="record", inner=httpx.AsyncHTTPTransport())
+    else:
+        # Ответы отдаются мгновенно, а ограничитель квот не должен ждать по записанной нагрузке
+        os.environ.setdefault("MISTRAL_RPM", "1000000")
+        os.environ.setdefault("MISTRAL_REQUEST_BURST", "1000000")
+        transport = CassetteTransport(args.cassette, mode="replay", latency_scale=args.latency_scale)
+    mistral_client.use_transport(transport)
+    from reasoning_engine import ReasoningEngine
+
+    engine = ReasoningEngine(os.environ["MISTRAL_API_KEY"])
+    runs = 1 if args.record else args.runs
+    profiler = cProfile.Profile() if args.profile_output or args.top else None
+    measurements = []
+    try:
+        for run in range(runs):
+            transport.rewind()
+            tracemalloc.start()
+            started, cpu_started = time.perf_counter(), time.process_time()
+            if profiler:
+                profiler.enable()
+            try:
+                rendered = await run_questions(engine, questions)
+            finally:
+                if profiler:
+                    profiler.disable()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            measurements.append({
+                "wall_seconds": round(time.perf_counter() - started, 4),
+                "cpu_seconds": round(time.process_time() - cpu_started, 4),
+                "peak_mib": round(peak / 2 ** 20, 3),
+                **rendered,
+            })
+            print(f"[{run + 1}/{runs}] {measurements[-1]}", file=sys.stderr)
+    finally:
+        await mistral_client.close_shared_clients()
+        mistral_client.use_transport(None)
+
+    # Первый из нескольких прогонов - прогрев (ленивые импорты и инициализация), в пороги он не входит
+    steady = measurements[1:] or measurements
+    if profiler:
+        if args.profile_output:
+            os.makedirs(os.path.dirname(args.profile_output) or ".", exist_ok=True)
+            profiler.dump_stats(args.profile_output)
+        if args.top:
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(args.top)
+    return {
+        "mode": "record" if args.record else "replay",
+        "cassette": args.cassette,
+        "questions": len(questions),
+        "runs": measurements,
+        "cpu_seconds_min": min(run["cpu_seconds"] for run in steady),
+        "peak_mib_max": max(run["peak_mib"] for run in steady),
+        "transport": transport.stats,
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Профилирование рассуждения по записанным ответам Mistral")
+    parser.add_argument("--cassette", default="../data/profile_cassette.jsonl.gz", help="файл кассеты (.gz - сжатый)")
+    parser.add_argument("--questions", help="файл с вопросами, по одному в строке (по умолчанию - один пример)")
+    parser.add_argument("--record", action="store_true", help="записать кассету, обращаясь к настоящему API (нужен MISTRAL_API_KEY)")
+    parser.add_argument("--runs", type=int, default=3, help="число прогонов при воспроизведении (первый из нескольких - прогрев)")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="доля записанной задержки ответов (0 - мгновенно, 1 - как при записи)")
+    parser.add_argument("--profile-output", help="файл статистики cProfile (pstats) для snakeviz и т.п.")
+    parser.add_argument("--top", type=int, default=20, help="вывести N самых дорогих функций в stderr (0 - без cProfile)")
+    parser.add_argument("--max-cpu-seconds", type=float, help="ошибка, если лучший прогон потратил больше CPU (для CI)")
+    parser.add_argument("--max-peak-mib", type=float, help="ошибка, если пик выделенной памяти больше (для CI)")
+    parser.add_argument("--output", help="файл для сводки JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+    if args.runs < 1:
+        parser.error("--runs должен быть не меньше 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.record and os.environ["MISTRAL_API_KEY"] == "profile":
+        sys.exit("❌ Для записи кассеты нужен MISTRAL_API_KEY")
+    if not args.record and not os.path.exists(args.cassette):
+        sys.exit(f"❌ Кассета {args.cassette} не найдена: сначала запишите ее с --record")
+    summary = asyncio.run(profile(args))
+    output = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    sys.stdout.write(output + "\n")
+    failures = []
+    if args.max_cpu_seconds is not None and summary["cpu_seconds_min"] > args.max_cpu_seconds:
+        failures.append(f"CPU {summary['cpu_seconds_min']} с > {args.max_cpu_seconds} с")
+    if args.max_peak_mib is not None and summary["peak_mib_max"] > args.max_peak_mib:
+        failures.append(f"память {summary['peak_mib_max']} MiB > {args.max_peak_mib} MiB")
+    if failures:
+        sys.exit("❌ Превышены пороги: " + ", ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Адаптивный ограничитель запросов к Mistral: token bucket по запросам и токенам в минуту для каждой модели
+"""
+
+import os
+import time
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+from metrics import gauge
+
+
+logger = logging.getLogger(__name__)
+
+
+def count_tokens(text: str) -> int:
+    """Грубая оценка числа токенов текста (~4 символа на токен)"""
+    return len(text) // 4 + 1
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Оценка числа токенов промпта (текст сообщений плюс служебные токены ролей)"""
+    return sum(count_tokens(str(message.get("content", ""))) for message in messages) + 4 * len(messages)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Классический token bucket: rate единиц в секунду, не больше capacity (clock - источник времени, для тестов)"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберется amount"""
+        self._refill(self.clock())
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill(self.clock())
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Возвращает (delta > 0) или дополнительно списывает (delta < 0) единицы"""
+        self._refill(self.clock())
+        self.level = min(self.capacity, self.level + delta)
+
+    def clamp(self, remaining: float) -> None:
+        """Синхронизирует уровень с остатком квоты, который сообщил сервер"""
+        self._refill(self.clock())
+        self.level = min(self.level, remaining)
+
+    @property
+    def saturation(self) -> float:
+        """Доля израсходованной емкости (0 - ведро полное, 1 - пустое)"""
+        self._refill(self.clock())
+        return max(0.0, 1 - self.level / self.capacity)
+
+
+class ModelRateLimiter:
+    """
+    Квоты одной модели: запросы и токены в минуту плюс пауза по Retry-After.
+    clock и sleep подменяются в тестах, чтобы ожидание не зависело от реального времени
+    """
+
+    def __init__(
+        self,
+        model: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        request_burst: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        self.model = model
+        self.clock = clock
+        self.sleep = sleep
+        self.requests = TokenBucket(requests_per_minute / 60, request_burst, clock)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute, clock)
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> float:
+        """Ждет, пока квота позволит запрос; возвращает время ожидания в секундах"""
+        started = self.clock()
+        self.waiting += 1
+        try:
+            # Лок выстраивает ожидающих в очередь FIFO
+            async with self._lock:
+                while True:
+                    delay = max(
+                        self.blocked_until - self.clock(),
+                        self.requests.time_until(1),
+                        self.tokens.time_until(tokens),
+                    )
+                    if delay <= 0:
+                        break
+                    await self.sleep(delay)
+                self.requests.consume(1)
+                self.tokens.consume(tokens)
+        finally:
+            self.waiting -= 1
+        waited = self.clock() - started
+        if waited > 0.05:
+            logger.info(f"Запрос к {self.model} ждал в очереди ограничителя {waited:.2f} с")
+        return waited
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Поправляет ведро токенов по фактическому usage ответа"""
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def block_for(self, seconds: float) -> None:
+        """Приостанавливает все запросы к модели (429 / Retry-After)"""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def observe_headers(self, headers: Mapping[str, str]) -> None:
+        """Учитывает заголовки ограничений из ответа сервера"""
+        retry_after = parse_retry_after(headers.get("retry-after"))
+        if retry_after:
+            self.block_for(retry_after)
+        for name in ("x-ratelimitbysize-remaining-minute", "x-ratelimit-remaining-tokens"):
+            if headers.get(name) is not None:
+                try:
+                    self.tokens.clamp(float(headers[name]))
+                except ValueError:
+                    pass
+        if headers.get("x-ratelimit-remaining-requests") is not None:
+            try:
+                self.requests.clamp(float(headers["x-ratelimit-remaining-requests"]))
+            except ValueError:
+                pass
+
+    @property
+    def saturation(self) -> float:
+        return max(self.requests.saturation, self.tokens.saturation)
+
+
+_limiters: Dict[str, ModelRateLimiter] = {}
+
+
+def _quota(name: str, model: str, default: str) -> float:
+    """Квота модели: MISTRAL_<NAME>_<MODEL> или общая MISTRAL_<NAME>"""
+    model_key = model.upper().replace("-", "_").replace(".", "_")
+    return float(os.getenv(f"MISTRAL_{name}_{model_key}", os.getenv(f"MISTRAL_{name}", default)))
+
+
+def get_rate_limiter(model: str) -> ModelRateLimiter:
+    """Общий для процесса ограничитель для модели"""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        limiter = ModelRateLimiter(
+            model,
+            requests_per_minute=_quota("RPM", model, "60"),
+            tokens_per_minute=_quota("TPM", model, "500000"),
+            request_burst=_quota("REQUEST_BURST", model, "5"),
+        )
+        _limiters[model] = limiter
+    return limiter
+
+
+def all_rate_limiters() -> Dict[str, ModelRateLimiter]:
+    return dict(_limiters)
+
+
+# Загрузка ограничителей в /metrics
+gauge(
+    "reshala_limiter_saturation", "Доля израсходованной квоты модели (0 - свободно, 1 - исчерпана)", ("model",),
+    collect=lambda: {(model,): limiter.saturation for model, limiter in _limiters.items()}
+)
+gauge(
+    "reshala_limiter_waiting", "Запросы, ждущие квоты модели", ("model",),
+    collect=lambda: {(model,): limiter.waiting for model, limiter in _limiters.items()}
+)
@@ -1,117 +1,648 @@
 import os
-from typing import List, Dict, Any, Tuple
-from agents import ProblemAnalyzer, HypothesisAgent, SolutionAgent, ValidationAgent
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+from agents import ProblemAnalyzer, HypothesisAgent, SolutionAgent, ValidationAgent, FusedSolverAgent
+from mistral_client import get_shared_client
+from usage import RunUsage, current_usage, track_usage
+from cache import get_response_cache, make_key, normalize_question
+from stopping import ReasoningProgress, StoppingPolicy, default_stopping_policy, STOP_REASON_MESSAGES
 from models import ProblemAnalysis, Hypothesis, Solution, ValidationResult
+from metrics import REASONING_SECONDS, REASONING_ITERATIONS, REASONING_QUESTIONS, REASONING_COST, FUSED_PRECHECK
+from tracing import span, trace
+from solution_index import get_solution_memory, SOLUTION_INDEX_LOOKUPS
+from validator_ensemble import validator_ensemble_from_env
 import asyncio
+import json
 import logging
 
 
+class ReasoningCancelled(Exception):
+    """Рассуждение отменено пользователем"""
+
+
+class SelfCheckResult(ValidationResult):
+    """Итог самопроверки решателя в fused-конвейере: валидатор решение не проверял"""
+
+
+@dataclass
+class ReasoningReport:
+    """Подробный результат рассуждения"""
+    dialogue_history: List[Dict[str, Any]]
+    solution: Solution
+    accepted: bool
+    iterations: int
+    confidence: Optional[float]
+    stop_reason: str
+    usage: RunUsage = field(default_factory=RunUsage)
+    elapsed: float = 0.0
+    cached: bool = False
+
+
 class ReasoningEngine:
     """Движок рассуждений, управляющий циклом агентов"""
     
-    def __init__(self, api_key: str):
-        self.analyzer = ProblemAnalyzer(api_key)
-        self.hypothesis_agent = HypothesisAgent(api_key)
-        self.solution_agent = SolutionAgent(api_key)
-        self.validation_agent = ValidationAgent(api_key)
+    def __init__(self, api_key: str, stopping_policy: Optional[StoppingPolicy] = None):
+        # Один клиент (и пул соединений) на все этапы конвейера
+        self.client = get_shared_client(api_key)
+        self.analyzer = ProblemAnalyzer(api_key, client=self.client)
+        self.hypothesis_agent = HypothesisAgent(api_key, client=self.client)
+        self.solution_agent = SolutionAgent(api_key, client=self.client)
+        self.validation_agent = ValidationAgent(api_key, client=self.client)
+        self.fused_agent = FusedSolverAgent(api_key, client=self.client)
         self.max_iterations = 5
         self.validity_threshold = float(os.getenv("VALIDITY_THRESHOLD_PERCENTAGE", "97"))/100 # Default to "97" if not set
+        # Ансамбль валидаторов (VALIDATOR_ENSEMBLE_SIZE > 1) вместо одного: решение принимается кворумом
+        self.validation_agent = validator_ensemble_from_env(api_key, self.client, self.validity_threshold) or self.validation_agent
+        # Ранняя остановка (плато уверенности, дедлайн, бюджеты); политику можно подменить
+        self.stopping_policy = stopping_policy or default_stopping_policy()
+        # Beam-режим: K гипотез за итерацию строятся и проверяются параллельно (1 - обычный режим)
+        self.beam_width = max(1, int(os.getenv("REASONING_BEAM_WIDTH", "1")))
+        self.beam_concurrency = max(1, int(os.getenv("REASONING_BEAM_CONCURRENCY", "3")))
+        # Конвейер итерации: classic - гипотеза, решение и проверка отдельными вызовами;
+        # fused - гипотеза и решение одним вызовом, валидатор - только если самооценка прошла предварительный порог
+        self.pipeline = os.getenv("REASONING_PIPELINE", "classic")
+        # Порог не выше порога валидности: без валидатора решение может быть только отклонено
+        self.fused_precheck = min(self.validity_threshold, float(os.getenv("FUSED_PRECHECK_PERCENTAGE", "80"))/100)
+        # Кэш готовых результатов по нормализованному вопросу (только принятые решения)
+        self.result_cache_enabled = os.getenv("REASONING_CACHE_ENABLED", "1") == "1"
+        self.result_cache_ttl = float(os.getenv("REASONING_CACHE_TTL_SECONDS", "604800"))
+        # Этапы, вывод которых транслируется потоком через stream_callback (analyzer, hypothesis, solution, validator)
+        self.streaming_stages = {stage.strip() for stage in os.getenv("STREAMING_STAGES", "solution").split(",") if stage.strip()}
+        # Индекс принятых решений: похожие решенные проблемы подсказывают гипотезы или дают готовый ответ
+        self.solution_memory = get_solution_memory(self.client)
 
         
-    async def reason(self, user_question: str, progress_callback=None) -> Tuple[List[Dict[str, Any]], Solution]:
+    async def reason(self, user_question: str, progress_callback=None, stream_callback=None, cancel_event: Optional[asyncio.Event] = None, checkpoint=None, max_iterations: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Solution]:
         """
         Запускает процесс рассуждения
         
         Args:
             user_question: Вопрос пользователя
             progress_callback: Функция для отправки промежуточных результатов
+            stream_callback: Функция (текст, final) для потокового вывода этапов из streaming_stages;
+                для этих этапов итоговое сообщение приходит с final=True вместо progress_callback
+            cancel_event: Событие отмены; проверяется перед каждым вызовом агента
+                (при отмене выбрасывается ReasoningCancelled)
+            checkpoint: Чекпоинт (checkpoint_store.RunCheckpoint): состояние сохраняется после каждого
+                шага агента, а если в нем уже есть состояние - рассуждение продолжается с последнего шага
+            max_iterations: Предел итераций для этого вопроса, если он ниже self.max_iterations
+                (деградированный режим под нагрузкой)
             
         Returns:
             Tuple[история диалога агентов, финальное решение]
         """
-        dialogue_history = []
+        report = await self.reason_with_report(user_question, progress_callback, stream_callback, cancel_event, checkpoint, max_iterations)
+        return report.dialogue_history, report.solution
+
+    async def reason_with_report(self, user_question: str, progress_callback=None, stream_callback=None, cancel_event: Optional[asyncio.Event] = None, checkpoint=None, max_iterations: Optional[int] = None) -> ReasoningReport:
+        """
+        То же, что reason, но возвращает подробный отчет: итерации, уверенность, причину остановки и расход API.
         
-        # Шаг 1: Анализ проблемы
-        if progress_callback:
-            await progress_callback("🔍 *Анализирую проблему...*")
-            
-        problem_analysis = self.analyzer.analyze(user_question)
-        await asyncio.sleep(1) # Задержка между запросами к агентам
+        Расход API (вызовы, токены, стоимость, ожидание в очереди ограничителя) копится
+        в usage.current_usage(), если вызывающий код обернул вызов в track_usage().
+        """
+        cache = get_response_cache() if self.result_cache_enabled else None
+        cache_key = make_key(
+            "reason", normalize_question(user_question), self.validity_threshold, self.max_iterations, self.beam_width,
+            self._config_fingerprint()
+        )
+        if cache:
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                payload = json.loads(cached)
+                if progress_callback:
+                    await progress_callback("⚡ *Этот вопрос уже решался - использую сохраненное решение.*")
+                REASONING_QUESTIONS.inc(stop_reason="cached")
+                return ReasoningReport(
+                    dialogue_history=payload["dialogue_history"],
+                    solution=Solution(**payload["solution"]),
+                    accepted=True,
+                    iterations=payload.get("iterations", 0),
+                    confidence=payload.get("confidence"),
+                    stop_reason="cached",
+                    cached=True
+                )
         
-        analysis_message = f"""*Аналитик:*
+        started_at = time.monotonic()
+        with trace("question", question=user_question[:200]) as root, track_usage(current_usage()) as usage:
+            report = await self._reason(user_question, progress_callback, stream_callback, cancel_event, checkpoint, max_iterations)
+            if root:
+                root.set(
+                    stop_reason=report.stop_reason, iterations=report.iterations, confidence=report.confidence,
+                    calls=usage.calls, retries=usage.retries, tokens=usage.total_tokens, cost=round(usage.cost, 6)
+                )
+        report.usage = usage
+        report.elapsed = time.monotonic() - started_at
+        REASONING_SECONDS.observe(report.elapsed, stop_reason=report.stop_reason)
+        REASONING_ITERATIONS.observe(report.iterations)
+        REASONING_QUESTIONS.inc(stop_reason=report.stop_reason)
+        REASONING_COST.inc(usage.cost)
+        if cache and report.accepted:
+            payload = {
+                "dialogue_history": report.dialogue_history,
+                "solution": report.solution.model_dump(),
+                "iterations": report.iterations,
+                "confidence": report.confidence
+            }
+            await cache.set(cache_key, json.dumps(payload, ensure_ascii=False), ttl_seconds=self.result_cache_ttl)
+        logging.info(
+            f"Рассуждение завершено ({report.stop_reason}) за {report.elapsed:.1f} с: итераций {report.iterations}, "
+            f"вызовов {usage.calls}, повторов {usage.retries}, токенов {usage.total_tokens}, "
+            f"стоимость ${usage.cost:.4f}, ожидание в очереди {usage.queue_wait:.2f} с"
+        )
+        return report
+
+    def _config_fingerprint(self) -> Dict[str, Any]:
+        """Настройки, от которых зависит ответ (для ключа кэша результатов): конвейер, модели этапов и состав валидаторов"""
+        def model_of(agent) -> str:
+            return agent.model or agent.router.candidates(agent.STAGE)[0]
+
+        validators = getattr(self.validation_agent, "validators", [self.validation_agent])
+        return {
+            "pipeline": self.pipeline,
+            "fused_precheck": self.fused_precheck if self.pipeline == "fused" else None,
+            "models": {
+                type(agent).__name__: model_of(agent)
+                for agent in (self.analyzer, self.hypothesis_agent, self.solution_agent, self.fused_agent)
+            },
+            "validators": [[model_of(validator), validator.focus] for validator in validators],
+            "quorum": getattr(self.validation_agent, "quorum", None),
+        }
+
+    async def _reason(self, user_question: str, progress_callback=None, stream_callback=None, cancel_event: Optional[asyncio.Event] = None, checkpoint=None, max_iterations: Optional[int] = None) -> ReasoningReport:
+        max_iterations = min(self.max_iterations, max_iterations or self.max_iterations)
+        progress = ReasoningProgress(usage=current_usage() or RunUsage())
+        saved = checkpoint.state if checkpoint is not None else None
+        
+        if saved:
+            # Продолжение после перезапуска: восстанавливаем состояние последнего завершенного шага
+            dialogue_history = saved["dialogue_history"]
+            problem_analysis = ProblemAnalysis(**saved["problem"])
+            previous_attempts = saved["previous_attempts"]
+            progress.confidences = saved["confidences"]
+            progress.started_at -= saved["elapsed"]
+            for name, value in saved["usage"].items():
+                setattr(progress.usage, name, getattr(progress.usage, name) + value)
+            best_solution = Solution(**saved["best_solution"]) if saved["best_solution"] else None
+            best_confidence = saved["best_confidence"]
+            unchecked_solution = Solution(**saved["unchecked_solution"]) if saved.get("unchecked_solution") else None
+            unchecked_confidence = saved.get("unchecked_confidence")
+            similar_solutions = saved.get("similar_solutions", [])
+            problem_vector = None
+            resume_steps = saved["current"]
+            # Незавершенная итерация будет выполнена заново с первого несделанного шага
+            progress.iteration = saved["iteration"] - 1 if resume_steps else saved["iteration"]
+            if progress_callback:
+                await progress_callback(f"🔄 *Продолжаю рассуждение с итерации {progress.iteration + 1}...*")
+        else:
+            dialogue_history = []
+            # Шаг 1: Анализ проблемы
+            if progress_callback:
+                await progress_callback("🔍 *Анализирую проблему...*")
+                
+            self._check_cancelled(cancel_event)
+            with span("analysis"):
+                problem_analysis = await self.analyzer.analyze(
+                    user_question, on_partial=self._stream_for("analyzer", "Аналитик", stream_callback)
+                )
+            
+            analysis_message = f"""*Аналитик:*
 Проблема: {problem_analysis.problem_statement}
 Область: {problem_analysis.problem_area}"""
-        dialogue_history.append({"agent": "Аналитик", "message": analysis_message})
-        if progress_callback:
-            await progress_callback(analysis_message)
+            dialogue_history.append({"agent": "Аналитик", "message": analysis_message})
+            await self._emit("analyzer", analysis_message, progress_callback, stream_callback)
+            
+            # Шаг 1.5: Поиск похожих решенных проблем
+            problem_vector, similar_solutions = await self._lookup_similar(problem_analysis)
+            reused = self.solution_memory.reusable(problem_analysis, similar_solutions) if self.solution_memory else None
+            if reused:
+                SOLUTION_INDEX_LOOKUPS.inc(outcome="reused")
+                reuse_message = f"""*Индекс решений:*
+Найдено принятое решение почти такой же проблемы (близость {reused['similarity']*100:.0f}%):
+{reused['problem_statement']}"""
+                dialogue_history.append({"agent": "Индекс решений", "message": reuse_message})
+                if progress_callback:
+                    await progress_callback(reuse_message)
+                return ReasoningReport(
+                    dialogue_history=dialogue_history,
+                    solution=Solution(**reused["solution"]),
+                    accepted=True,
+                    iterations=0,
+                    confidence=reused["confidence"],
+                    stop_reason="similar"
+                )
+            if similar_solutions:
+                SOLUTION_INDEX_LOOKUPS.inc(outcome="seeded")
+                if progress_callback:
+                    await progress_callback(f"📚 *Нашел похожие решенные проблемы: {len(similar_solutions)}. Учту их при построении гипотез.*")
+            elif self.solution_memory:
+                SOLUTION_INDEX_LOOKUPS.inc(outcome="miss")
+            
+            previous_attempts = []
+            best_solution, best_confidence = None, None
+            # Лучшее из решений, отклоненных самопроверкой без валидатора (только если проверенных нет)
+            unchecked_solution, unchecked_confidence = None, None
+            resume_steps = {}
+        
+        async def save_checkpoint(current: Dict[str, Any]) -> None:
+            """Сохраняет состояние; current - уже выполненные шаги текущей итерации"""
+            if checkpoint is None:
+                return
+            await checkpoint.save({
+                "problem": problem_analysis.model_dump(),
+                "dialogue_history": dialogue_history,
+                "previous_attempts": previous_attempts,
+                "iteration": progress.iteration,
+                "confidences": progress.confidences,
+                "best_solution": best_solution.model_dump() if best_solution else None,
+                "best_confidence": best_confidence,
+                "unchecked_solution": unchecked_solution.model_dump() if unchecked_solution else None,
+                "unchecked_confidence": unchecked_confidence,
+                "similar_solutions": similar_solutions,
+                "elapsed": progress.elapsed,
+                "usage": {name: getattr(progress.usage, name) for name in ("calls", "retries", "prompt_tokens", "completion_tokens", "queue_wait", "cost")},
+                "current": current,
+            })
+        
+        if not saved:
+            await save_checkpoint({})
         
         # Цикл рассуждений
-        previous_attempts = []
-        iteration = 0
         final_solution = None
+        stop_reason = None
         
-        while iteration < self.max_iterations:
-            iteration += 1
+        while progress.iteration < max_iterations:
+            progress.iteration += 1
             
-            # Шаг 2: Построение гипотезы
-            hypothesis = self.hypothesis_agent.build_hypothesis(problem_analysis, previous_attempts)
-            await asyncio.sleep(1) # Задержка между запросами к агентам
-            
-            hypothesis_message = f"""*Генератор гипотез:*
-Гипотеза: {hypothesis.hypothesis}
-Уверенность: {hypothesis.confidence:.2f}"""
-            dialogue_history.append({"agent": "Генератор гипотез", "message": hypothesis_message})
-            if progress_callback:
-                await progress_callback(hypothesis_message)
-            
-            # Шаг 3: Построение решения
-            solution = self.solution_agent.build_solution(problem_analysis, hypothesis)
-            await asyncio.sleep(1) # Задержка между запросами к агентам
+            if self.beam_width > 1:
+                iteration = self._beam_iteration(
+                    problem_analysis, previous_attempts, dialogue_history, progress_callback, cancel_event, similar_solutions
+                )
+            elif self.pipeline == "fused":
+                iteration = self._fused_iteration(
+                    problem_analysis, previous_attempts, dialogue_history, progress_callback, stream_callback, cancel_event,
+                    resume_steps, save_checkpoint, similar_solutions
+                )
+            else:
+                iteration = self._sequential_iteration(
+                    problem_analysis, previous_attempts, dialogue_history, progress_callback, stream_callback, cancel_event,
+                    resume_steps, save_checkpoint, similar_solutions
+                )
+            resume_steps = {}
             
-            solution_message = f"""*Решатель:*
-Решение: {solution.solution}
-Шаги:
-""" + "\n".join([f"{i+1}. {step}" for i, step in enumerate(solution.steps)])
-            dialogue_history.append({"agent": "Решатель", "message": solution_message})
-            if progress_callback:
-                await progress_callback(solution_message)
+            time_left = self.stopping_policy.time_left(progress)
+            with span("iteration", number=progress.iteration) as iteration_span:
+                if best_solution is not None and time_left is not None:
+                    # Лучшее решение уже есть - итерацию, не укладывающуюся в дедлайн, прерываем
+                    try:
+                        hypothesis, solution, validation, rejected = await asyncio.wait_for(iteration, time_left)
+                    except asyncio.TimeoutError:
+                        progress.iteration -= 1
+                        stop_reason = "deadline"
+                        break
+                else:
+                    hypothesis, solution, validation, rejected = await iteration
+                if iteration_span:
+                    iteration_span.set(confidence=validation.confidence)
             
-            # Шаг 4: Валидация решения
-            validation = self.validation_agent.validate_solution(problem_analysis, solution)
-            await asyncio.sleep(1) # Задержка между запросами к агентам
+            if isinstance(validation, SelfCheckResult):
+                # Самооценка решателя - не оценка валидатора: в лучшее решение и плато она не попадает
+                if unchecked_confidence is None or validation.confidence > unchecked_confidence:
+                    unchecked_solution, unchecked_confidence = solution, validation.confidence
+            else:
+                progress.confidences.append(validation.confidence)
+                if best_confidence is None or validation.confidence > best_confidence:
+                    best_solution, best_confidence = solution, validation.confidence
             
             isValid = validation.confidence >= self.validity_threshold
-
-            validation_message = f"""*Валидатор:*
-Валидность решения: {validation.confidence*100:.0f}%: {'✅ Решение валидно' if isValid else '❌ Решение требует доработки'}\nОбратная связь: {validation.feedback}"""
-            dialogue_history.append({"agent": "Валидатор", "message": validation_message})
-            if progress_callback:
-                await progress_callback(validation_message)
             
             if isValid:
                 if progress_callback:
-                    await progress_callback(f"✅ *Решение принято после {iteration} итераций!*")
+                    await progress_callback(f"✅ *Решение принято после {progress.iteration} итераций!*")
                 final_solution = solution
+                stop_reason = "accepted"
                 break
             else:
                 logging.info(f"Решение не валидно (уверенность: {validation.confidence}). Настройка: {self.validity_threshold}")
                 # Добавляем попытку в историю для следующей итерации
-                previous_attempts.append({
-                    "hypothesis": hypothesis.hypothesis,
-                    "feedback": validation.feedback,
-                    "missing_aspects": validation.missing_aspects
-                })
+                for attempt_hypothesis, attempt_validation in [(hypothesis, validation)] + rejected:
+                    previous_attempts.append({
+                        "hypothesis": attempt_hypothesis.hypothesis,
+                        "feedback": attempt_validation.feedback,
+                        "missing_aspects": attempt_validation.missing_aspects
+                    })
+                
+                await save_checkpoint({})
+                
+                stop_reason = self.stopping_policy.should_stop(progress)
+                if stop_reason:
+                    logging.info(f"Ранняя остановка рассуждения: {stop_reason} (уверенности по итерациям: {progress.confidences})")
+                    break
                 
                 #if progress_callback:
                 #    await progress_callback(f"🔄 *Решение требует доработки. Переход к следующей итерации...*")
-                    
-                # Небольшая задержка между итерациями
-                await asyncio.sleep(1)
         
+        accepted = final_solution is not None
+        if accepted:
+            await self._remember_solution(problem_analysis, final_solution, best_confidence, problem_vector)
         if not final_solution:
-            # Если не нашли валидное решение за max_iterations, берем последнее
-            final_solution = solution
+            # Валидное решение не найдено - берем лучшее по уверенности валидатора
+            stop_reason = stop_reason or "max_iterations"
+            if best_solution is not None:
+                final_solution = best_solution
+                outcome = f"Используется лучшее найденное решение ({best_confidence*100:.0f}%)."
+            elif unchecked_solution is not None:
+                final_solution = unchecked_solution
+                outcome = f"Валидатор не проверил ни одного решения, используется лучшее по самопроверке решателя ({unchecked_confidence*100:.0f}%)."
+            else:
+                # Ни одно решение не проверено (например, продолжение без сохраненного лучшего решения)
+                final_solution = Solution(solution="Решение не найдено.", steps=[])
+                outcome = "Решение не найдено."
             if progress_callback:
-                await progress_callback(f"⚠️ *Достигнут лимит итераций. Используется последнее решение.*")
+                await progress_callback(f"⚠️ *{STOP_REASON_MESSAGES.get(stop_reason, stop_reason)}. {outcome}*")
+        
+        return ReasoningReport(
+            dialogue_history=dialogue_history,
+            solution=final_solution,
+            accepted=accepted,
+            iterations=progress.iteration,
+            confidence=best_confidence,
+            stop_reason=stop_reason
+        )
+
+    async def _sequential_iteration(
+        self,
+        problem_analysis: ProblemAnalysis,
+        previous_attempts: List[Dict[str, Any]],
+        dialogue_history: List[Dict[str, Any]],
+        progress_callback=None,
+        stream_callback=None,
+        cancel_event: Optional[asyncio.Event] = None,
+        resume_steps: Optional[Dict[str, Any]] = None,
+        save_checkpoint=None,
+        similar_solutions: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Hypothesis, Solution, ValidationResult, List[Tuple[Hypothesis, ValidationResult]]]:
+        """
+        Обычная итерация: гипотеза, решение и проверка строго друг за другом.
+        resume_steps - шаги, выполненные до перезапуска (пропускаются); после каждого шага вызывается save_checkpoint.
+        """
+        resume_steps = resume_steps or {}
+        
+        # Шаг 2: Построение гипотезы
+        if "hypothesis" in resume_steps:
+            hypothesis = Hypothesis(**resume_steps["hypothesis"])
+        else:
+            self._check_cancelled(cancel_event)
+            hypothesis = await self.hypothesis_agent.build_hypothesis(
+                problem_analysis, previous_attempts,
+                on_partial=self._stream_for("hypothesis", "Генератор гипотез", stream_callback),
+                similar_solutions=similar_solutions
+            )
+            
+            hypothesis_message = self._hypothesis_message(hypothesis)
+            dialogue_history.append({"agent": "Генератор гипотез", "message": hypothesis_message})
+            await self._emit("hypothesis", hypothesis_message, progress_callback, stream_callback)
+            if save_checkpoint:
+                await save_checkpoint({"hypothesis": hypothesis.model_dump()})
+        
+        # Шаг 3: Построение решения
+        if "solution" in resume_steps:
+            solution = Solution(**resume_steps["solution"])
+        else:
+            self._check_cancelled(cancel_event)
+            solution = await self.solution_agent.build_solution(
+                problem_analysis, hypothesis,
+                on_partial=self._stream_for("solution", "Решатель", stream_callback)
+            )
+            
+            solution_message = self._solution_message(solution)
+            dialogue_history.append({"agent": "Решатель", "message": solution_message})
+            await self._emit("solution", solution_message, progress_callback, stream_callback)
+            if save_checkpoint:
+                await save_checkpoint({"hypothesis": hypothesis.model_dump(), "solution": solution.model_dump()})
+        
+        # Шаг 4: Валидация решения
+        validation = await self._validate(problem_analysis, solution, dialogue_history, progress_callback, stream_callback, cancel_event)
+        
+        return hypothesis, solution, validation, []
+
+    async def _fused_iteration(
+        self,
+        problem_analysis: ProblemAnalysis,
+        previous_attempts: List[Dict[str, Any]],
+        dialogue_history: List[Dict[str, Any]],
+        progress_callback=None,
+        stream_callback=None,
+        cancel_event: Optional[asyncio.Event] = None,
+        resume_steps: Optional[Dict[str, Any]] = None,
+        save_checkpoint=None,
+        similar_solutions: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Hypothesis, Solution, ValidationResult, List[Tuple[Hypothesis, ValidationResult]]]:
+        """
+        Fused-итерация: гипотеза и решение одним вызовом, затем проверка валидатором, если самооценка
+        решения не ниже fused_precheck. Иначе итерация отклоняется без валидатора по итогам самопроверки.
+        В истории диалога те же записи, что и в обычной итерации.
+        """
+        resume_steps = resume_steps or {}
+        
+        # Шаги 2-3: гипотеза и решение (уверенность гипотезы - самооценка решения)
+        if "solution" in resume_steps:
+            hypothesis = Hypothesis(**resume_steps["hypothesis"])
+            solution = Solution(**resume_steps["solution"])
+            weaknesses = resume_steps.get("weaknesses")
+        else:
+            self._check_cancelled(cancel_event)
+            fused = await self.fused_agent.solve(
+                problem_analysis, previous_attempts,
+                on_partial=self._stream_for("solution", "Решатель", stream_callback),
+                similar_solutions=similar_solutions
+            )
+            hypothesis = Hypothesis(hypothesis=fused.hypothesis, confidence=fused.confidence)
+            solution = Solution(solution=fused.solution, steps=fused.steps)
+            weaknesses = fused.weaknesses
+            
+            hypothesis_message = self._hypothesis_message(hypothesis)
+            dialogue_history.append({"agent": "Генератор гипотез", "message": hypothesis_message})
+            if progress_callback:
+                await progress_callback(hypothesis_message)
+            solution_message = self._solution_message(solution)
+            dialogue_history.append({"agent": "Решатель", "message": solution_message})
+            await self._emit("solution", solution_message, progress_callback, stream_callback)
+            if save_checkpoint:
+                await save_checkpoint({"hypothesis": hypothesis.model_dump(), "solution": solution.model_dump(), "weaknesses": weaknesses})
+        
+        if hypothesis.confidence < self.fused_precheck:
+            # Решатель сам не уверен в решении - вызов валидатора не нужен
+            FUSED_PRECHECK.inc(outcome="skipped")
+            validation = SelfCheckResult(
+                confidence=hypothesis.confidence,
+                feedback="Решение не прошло самопроверку решателя" + (": " + "; ".join(weaknesses) if weaknesses else ""),
+                missing_aspects=weaknesses
+            )
+            validation_message = self._validation_message(validation, " (самопроверка)")
+            dialogue_history.append({"agent": "Валидатор", "message": validation_message})
+            if progress_callback:
+                await progress_callback(validation_message)
+            return hypothesis, solution, validation, []
+        
+        # Шаг 4: Валидация решения
+        FUSED_PRECHECK.inc(outcome="passed")
+        validation = await self._validate(problem_analysis, solution, dialogue_history, progress_callback, stream_callback, cancel_event)
+        
+        return hypothesis, solution, validation, []
+
+    async def _validate(
+        self,
+        problem_analysis: ProblemAnalysis,
+        solution: Solution,
+        dialogue_history: List[Dict[str, Any]],
+        progress_callback=None,
+        stream_callback=None,
+        cancel_event: Optional[asyncio.Event] = None
+    ) -> ValidationResult:
+        """Проверка решения валидатором с записью в историю диалога"""
+        self._check_cancelled(cancel_event)
+        validation = await self.validation_agent.validate_solution(
+            problem_analysis, solution,
+            on_partial=self._stream_for("validator", "Валидатор", stream_callback)
+        )
+        
+        validation_message = self._validation_message(validation)
+        dialogue_history.append({"agent": "Валидатор", "message": validation_message})
+        await self._emit("validator", validation_message, progress_callback, stream_callback)
+        return validation
+
+    async def _lookup_similar(self, problem_analysis: ProblemAnalysis) -> Tuple[Optional[Any], List[Dict[str, Any]]]:
+        """Эмбеддинг проблемы и похожие решенные проблемы; сбой индекса не мешает рассуждению"""
+        if self.solution_memory is None:
+            return None, []
+        try:
+            with span("solution_lookup"):
+                return await self.solution_memory.lookup(problem_analysis)
+        except Exception as e:
+            SOLUTION_INDEX_LOOKUPS.inc(outcome="error")
+            logging.warning(f"Поиск похожих решений не удался: {e}")
+            return None, []
+
+    async def _remember_solution(self, problem_analysis: ProblemAnalysis, solution: Solution, confidence: Optional[float], problem_vector: Optional[Any] = None) -> None:
+        """Добавляет принятое решение в индекс решений"""
+        if self.solution_memory is None:
+            return
+        try:
+            await self.solution_memory.remember(problem_analysis, solution, confidence, problem_vector)
+        except Exception as e:
+            logging.warning(f"Решение не добавлено в индекс решений: {e}")
+
+    @staticmethod
+    def _check_cancelled(cancel_event: Optional[asyncio.Event]) -> None:
+        """Граница между вызовами агентов: здесь прерывается отмененное рассуждение"""
+        if cancel_event is not None and cancel_event.is_set():
+            raise ReasoningCancelled()
+
+    def _stream_for(self, stage: str, agent: str, stream_callback=None):
+        """on_partial для агента, если вывод этапа транслируется потоком"""
+        if not stream_callback or stage not in self.streaming_stages:
+            return None
+        
+        async def on_partial(text: str) -> None:
+            await stream_callback(f"✍️ {agent}:\n{text}", False)
+        
+        return on_partial
+
+    async def _emit(self, stage: str, message: str, progress_callback=None, stream_callback=None) -> None:
+        """Отправляет итоговое сообщение этапа: завершает поток или идет обычным прогрессом"""
+        if stream_callback and stage in self.streaming_stages:
+            await stream_callback(message, True)
+        elif progress_callback:
+            await progress_callback(message)
+
+    def _hypothesis_message(self, hypothesis: Hypothesis, label: str = "") -> str:
+        return f"""*Генератор гипотез{label}:*
+Гипотеза: {hypothesis.hypothesis}
+Уверенность: {hypothesis.confidence:.2f}"""
+
+    def _solution_message(self, solution: Solution, label: str = "") -> str:
+        return f"""*Решатель{label}:*
+Решение: {solution.solution}
+Шаги:
+""" + "\n".join([f"{i+1}. {step}" for i, step in enumerate(solution.steps)])
+
+    def _validation_message(self, validation: ValidationResult, label: str = "") -> str:
+        isValid = validation.confidence >= self.validity_threshold
+        return f"""*Валидатор{label}:*
+Валидность решения: {validation.confidence*100:.0f}%: {'✅ Решение валидно' if isValid else '❌ Решение требует доработки'}\nОбратная связь: {validation.feedback}"""
+
+    async def _beam_iteration(
+        self,
+        problem_analysis: ProblemAnalysis,
+        previous_attempts: List[Dict[str, Any]],
+        dialogue_history: List[Dict[str, Any]],
+        progress_callback=None,
+        cancel_event: Optional[asyncio.Event] = None,
+        similar_solutions: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Hypothesis, Solution, ValidationResult, List[Tuple[Hypothesis, ValidationResult]]]:
+        """
+        Одна итерация beam-режима: beam_width разных гипотез строятся, решаются и проверяются
+        параллельно (не больше beam_concurrency веток одновременно).
+        
+        Returns:
+            Tuple[гипотеза, решение и проверка лучшей ветки, (гипотеза, проверка) остальных веток]
+        """
+        semaphore = asyncio.Semaphore(self.beam_concurrency)
+        
+        async def run_branch(variant: int) -> Tuple[int, Hypothesis, Solution, ValidationResult]:
+            async with semaphore:
+                self._check_cancelled(cancel_event)
+                hypothesis = await self.hypothesis_agent.build_hypothesis(
+                    problem_analysis, previous_attempts, variant=variant, variants=self.beam_width,
+                    similar_solutions=similar_solutions
+                )
+                self._check_cancelled(cancel_event)
+                solution = await self.solution_agent.build_solution(problem_analysis, hypothesis)
+                self._check_cancelled(cancel_event)
+                validation = await self.validation_agent.validate_solution(problem_analysis, solution)
+            return variant, hypothesis, solution, validation
+        
+        tasks = [asyncio.ensure_future(run_branch(variant)) for variant in range(self.beam_width)]
+        branches = []
+        errors = []
+        try:
+            for next_branch in asyncio.as_completed(tasks):
+                try:
+                    branch = await next_branch
+                except ReasoningCancelled:
+                    raise
+                except Exception as e:
+                    logging.warning(f"Ветка beam-поиска завершилась ошибкой: {e}")
+                    errors.append(e)
+                    continue
+                branches.append(branch)
+                # Валидная ветка найдена - остальные можно не ждать
+                if branch[3].confidence >= self.validity_threshold:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        if not branches:
+            raise errors[0]
+        
+        for variant, hypothesis, solution, validation in sorted(branches, key=lambda branch: branch[0]):
+            label = f" (вариант {variant + 1})"
+            dialogue_history.append({"agent": "Генератор гипотез", "message": self._hypothesis_message(hypothesis, label)})
+            dialogue_history.append({"agent": "Решатель", "message": self._solution_message(solution, label)})
+            dialogue_history.append({"agent": "Валидатор", "message": self._validation_message(validation, label)})
+        
+        branches.sort(key=lambda branch: branch[3].confidence, reverse=True)
+        best_variant, hypothesis, solution, validation = branches[0]
+        if progress_callback:
+            label = f" (вариант {best_variant + 1})"
+            await progress_callback(f"🔀 *Проверено гипотез: {len(branches)} из {self.beam_width}. Лучшая - вариант {best_variant + 1}.*")
+            await progress_callback(self._hypothesis_message(hypothesis, label))
+            await progress_callback(self._solution_message(solution, label))
+            await progress_callback(self._validation_message(validation, label))
         
-        return dialogue_history, final_solution 
\ No newline at end of file
+        rejected = [(branch[1], branch[3]) for branch in branches[1:]]
+        return hypothesis, solution, validation, rejected
@@ -0,0 +1,177 @@
+"""
+Single-flight: одновременные одинаковые вопросы (после нормализации) решаются одним рассуждением.
+Присоединившиеся получают уже отправленные сообщения прогресса, дальнейший поток и итоговое решение.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from reasoning_engine import ReasoningCancelled
+from checkpoint_store import RunCheckpoint, SharedCheckpoint
+from metrics import counter, histogram
+
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_CALLERS = counter(
+    "reshala_single_flight_callers", "Вызовы рассуждения: leader - запустил рассуждение, follower - присоединился к идущему", ("role",)
+)
+SINGLE_FLIGHT_GROUP_SIZE = histogram(
+    "reshala_single_flight_group_size", "Сколько вызовов обслужило одно рассуждение", (), buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+
+ProgressCallback = Callable[[str], Awaitable[None]]
+StreamCallback = Callable[[str, bool], Awaitable[None]]
+# Запуск рассуждения с общими для всех участников callback'ами прогресса, потока, событием отмены и чекпоинтом
+StartReasoning = Callable[[ProgressCallback, Optional[StreamCallback], asyncio.Event, Optional[SharedCheckpoint]], Awaitable[Any]]
+
+JOIN_MESSAGE = "👥 *Такой же вопрос уже решается - подключаю вас к этому рассуждению...*"
+
+
+@dataclass
+class _Subscriber:
+    progress_callback: Optional[ProgressCallback]
+    stream_callback: Optional[StreamCallback]
+
+
+@dataclass
+class _Flight:
+    """Идущее рассуждение и его участники"""
+    task: Optional["asyncio.Future[Any]"] = None
+    subscribers: List[_Subscriber] = field(default_factory=list)
+    # Итоговые сообщения (прогресс и завершенные этапы потока) для тех, кто присоединится позже
+    history: List[Tuple[str, bool]] = field(default_factory=list)
+    cancel_event: asyncio.Event = field(default_factory=asyncio.Event)
+    # Состояние пишется в чекпоинты всех текущих участников, а не только запустившего
+    checkpoint: Optional[SharedCheckpoint] = None
+    callers: int = 0
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в одно рассуждение.
+
+    Рассуждение отменяется, только когда отменили все участники; отменивший участник
+    отключается сразу, остальные продолжают получать прогресс и результат. Чекпоинт своего вопроса
+    каждый участник завершает сам, рассуждение пишет в чекпоинты оставшихся.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[str, _Flight] = {}
+
+    @property
+    def active(self) -> int:
+        """Число идущих рассуждений"""
+        return len(self._flights)
+
+    async def run(
+        self,
+        key: str,
+        start: StartReasoning,
+        progress_callback: Optional[ProgressCallback] = None,
+        stream_callback: Optional[StreamCallback] = None,
+        cancel_event: Optional[asyncio.Event] = None,
+        checkpoint: Optional[RunCheckpoint] = None
+    ) -> Any:
+        """
+        Запускает рассуждение start или присоединяется к уже идущему с тем же ключом.
+        checkpoint - чекпоинт вопроса участника: пока участник не ушел, в него пишется состояние общего рассуждения
+
+        Raises:
+            ReasoningCancelled: участник отменил свой вызов (cancel_event)
+        """
+        if not self.enabled:
+            return await start(progress_callback, stream_callback, cancel_event or asyncio.Event(), SharedCheckpoint(checkpoint) if checkpoint else None)
+        subscriber = _Subscriber(progress_callback, stream_callback)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(checkpoint=SharedCheckpoint(checkpoint) if checkpoint else None)
+            self._flights[key] = flight
+            flight.subscribers.append(subscriber)
+            flight.callers = 1
+            SINGLE_FLIGHT_CALLERS.inc(role="leader")
+            flight.task = asyncio.ensure_future(start(
+                lambda message: self._progress(flight, message),
+                (lambda message, final: self._stream(flight, message, final)) if stream_callback else None,
+                flight.cancel_event,
+                flight.checkpoint
+            ))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+        else:
+            flight.callers += 1
+            SINGLE_FLIGHT_CALLERS.inc(role="follower")
+            logger.info(f"Вопрос присоединен к идущему рассуждению (участников: {flight.callers})")
+            await self._deliver(subscriber, JOIN_MESSAGE, True, progress=True)
+            # Между последней проверкой и подпиской нет await - ни одно сообщение не теряется
+            replayed = 0
+            while replayed < len(flight.history):
+                message, is_progress = flight.history[replayed]
+                await self._deliver(subscriber, message, True, progress=is_progress)
+                replayed += 1
+            flight.subscribers.append(subscriber)
+
+        try:
+            if flight.checkpoint is not None and checkpoint is not None and checkpoint not in flight.checkpoint.checkpoints:
+                await flight.checkpoint.add(checkpoint)
+            if cancel_event is None:
+                return await asyncio.shield(flight.task)
+            cancelled = asyncio.ensure_future(cancel_event.wait())
+            try:
+                await asyncio.wait({flight.task, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                cancelled.cancel()
+            if not flight.task.done():
+                if flight.subscribers != [subscriber]:
+                    raise ReasoningCancelled()
+                # Последний участник ждет, пока рассуждение остановится на ближайшей границе агентов
+                # (как без объединения: к этому моменту чекпоинт уже не меняется)
+                self._cancel(key, flight)
+                return await asyncio.shield(flight.task)
+            return flight.task.result()
+        finally:
+            flight.subscribers.remove(subscriber)
+            if flight.checkpoint is not None and checkpoint is not None:
+                flight.checkpoint.remove(checkpoint)
+            if not flight.subscribers and not flight.task.done():
+                self._cancel(key, flight)
+
+    def _cancel(self, key: str, flight: _Flight) -> None:
+        """Останавливает рассуждение без участников; новые вопросы с тем же ключом запустят свое"""
+        flight.cancel_event.set()
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _finish(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        SINGLE_FLIGHT_GROUP_SIZE.observe(flight.callers)
+        if not flight.task.cancelled():
+            flight.task.exception() # Ошибку получают участники; если все ушли - она не должна попасть в лог как необработанная
+
+    async def _deliver(self, subscriber: _Subscriber, message: str, final: bool, progress: bool) -> None:
+        """Сообщение одному участнику; этап потока без stream_callback уходит обычным прогрессом"""
+        if not progress and subscriber.stream_callback:
+            await subscriber.stream_callback(message, final)
+        elif final and subscriber.progress_callback:
+            await subscriber.progress_callback(message)
+
+    async def _fan_out(self, flight: _Flight, message: str, final: bool, progress: bool) -> None:
+        results = await asyncio.gather(
+            *(self._deliver(subscriber, message, final, progress) for subscriber in list(flight.subscribers)),
+            return_exceptions=True
+        )
+        # Сбой отправки одному участнику не должен прерывать рассуждение для остальных
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Не удалось отправить сообщение участнику рассуждения: {result}")
+
+    async def _progress(self, flight: _Flight, message: str) -> None:
+        flight.history.append((message, True))
+        await self._fan_out(flight, message, True, progress=True)
+
+    async def _stream(self, flight: _Flight, message: str, final: bool) -> None:
+        if final:
+            flight.history.append((message, False))
+        await self._fan_out(flight, message, final, progress=False)
@@ -0,0 +1,208 @@
+"""
+Семантический индекс принятых решений: эмбеддинги Mistral в компактном массиве NumPy,
+пакетный поиск по косинусной близости и хранение на диске.
+Похожие решенные проблемы подсказывают направление генератору гипотез, а почти совпадающие отдают готовый ответ.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from mistralai import Mistral
+from models import ProblemAnalysis, Solution
+from rate_limiter import get_rate_limiter, count_tokens
+from usage import current_usage
+from metrics import counter
+
+
+logger = logging.getLogger(__name__)
+
+SOLUTION_INDEX_LOOKUPS = counter(
+    "reshala_solution_index_lookups", "Поиск похожих решений: reused - готовый ответ, seeded - подсказка гипотезам, miss - ничего похожего, error - сбой", ("outcome",)
+)
+
+
+class SolutionIndex:
+    """
+    Векторы (float32, нормированные) - строки одной матрицы; метаданные решений - параллельный список.
+    Файлы: <path>.npy (векторы) и <path>.json (метаданные), запись атомарная.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000, duplicate_similarity: float = 0.99):
+        self.path = path
+        self.max_entries = max_entries
+        self.duplicate_similarity = duplicate_similarity
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._file_lock = threading.Lock()
+        if path:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        try:
+            vectors = np.load(f"{self.path}.npy")
+            with open(f"{self.path}.json", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Индекс решений {self.path} не загружен: {e}")
+            return
+        if len(vectors) != len(entries):
+            logger.warning(f"Индекс решений {self.path} поврежден: {len(vectors)} векторов, {len(entries)} записей")
+            return
+        self._vectors = vectors.astype(np.float32, copy=False)
+        self._entries = entries
+        logger.info(f"Индекс решений загружен: {len(entries)} записей")
+
+    def _save(self, vectors: np.ndarray, entries: List[Dict[str, Any]]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._file_lock:
+            with open(f"{self.path}.npy.tmp", "wb") as f:
+                np.save(f, vectors)
+            with open(f"{self.path}.json.tmp", "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(f"{self.path}.npy.tmp", f"{self.path}.npy")
+            os.replace(f"{self.path}.json.tmp", f"{self.path}.json")
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def search(self, queries: np.ndarray, k: int = 3) -> List[List[Tuple[float, Dict[str, Any]]]]:
+        """
+        Top-k ближайших записей для каждого запроса (строки queries) одним матричным умножением.
+
+        Returns:
+            Для каждого запроса список (косинусная близость, запись) по убыванию близости
+        """
+        queries = self._normalize(np.atleast_2d(queries))
+        if self._vectors is None or not self._entries or k <= 0:
+            return [[] for _ in range(len(queries))]
+        similarities = queries @ self._vectors.T
+        k = min(k, similarities.shape[1])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for row, indices in zip(similarities, top):
+            indices = indices[np.argsort(-row[indices])]
+            results.append([(float(row[i]), self._entries[i]) for i in indices])
+        return results
+
+    def add(self, vector: np.ndarray, entry: Dict[str, Any]) -> None:
+        """Добавляет запись; почти совпадающая старая запись заменяется, самые старые вытесняются"""
+        vector = self._normalize(vector).reshape(1, -1)
+        if self._vectors is None:
+            self._vectors = vector
+            self._entries = [entry]
+            return
+        similarities = self._vectors @ vector[0]
+        duplicate = int(np.argmax(similarities))
+        if similarities[duplicate] >= self.duplicate_similarity:
+            self._vectors[duplicate] = vector[0]
+            self._entries[duplicate] = entry
+            return
+        self._vectors = np.concatenate([self._vectors, vector])[-self.max_entries:]
+        self._entries = (self._entries + [entry])[-self.max_entries:]
+
+    async def persist(self) -> None:
+        if self.path and self._vectors is not None:
+            await asyncio.to_thread(self._save, self._vectors.copy(), list(self._entries))
+
+
+class SolutionMemory:
+    """Индекс решений вместе с эмбеддингами Mistral и порогами близости"""
+
+    def __init__(self, client: Mistral, index: SolutionIndex, model: str = "mistral-embed", top_k: int = 3, min_similarity: float = 0.75, reuse_similarity: float = 0.95):
+        self.client = client
+        self.index = index
+        self.model = model
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.reuse_similarity = reuse_similarity
+
+    @staticmethod
+    def problem_text(problem: ProblemAnalysis) -> str:
+        return f"{problem.problem_area}\n{problem.problem_statement}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Эмбеддинги пачки текстов одним запросом через общий ограничитель квот"""
+        limiter = get_rate_limiter(self.model)
+        estimated_tokens = sum(count_tokens(text) for text in texts)
+        usage = current_usage()
+        waited = await limiter.acquire(estimated_tokens)
+        if usage:
+            usage.queue_wait += waited
+        response = await self.client.embeddings.create_async(model=self.model, inputs=list(texts))
+        if response.usage is not None:
+            limiter.reconcile(estimated_tokens, response.usage.total_tokens or 0)
+        if usage:
+            usage.add_response(response, self.model)
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+    async def lookup(self, problem: ProblemAnalysis) -> Tuple[Optional[np.ndarray], List[Dict[str, Any]]]:
+        """
+        Похожие решенные проблемы не ниже min_similarity (у каждой - поле similarity).
+
+        Returns:
+            Tuple[эмбеддинг проблемы (для add), похожие записи по убыванию близости]
+        """
+        vector = (await self.embed([self.problem_text(problem)]))[0]
+        similar = [
+            dict(entry, similarity=round(similarity, 4))
+            for similarity, entry in self.index.search(vector, self.top_k)[0]
+            if similarity >= self.min_similarity
+        ]
+        return vector, similar
+
+    def reusable(self, problem: ProblemAnalysis, similar: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Запись, решение которой можно отдать как есть: почти та же проблема в той же области"""
+        if similar and similar[0]["similarity"] >= self.reuse_similarity and similar[0]["problem_area"] == problem.problem_area:
+            return similar[0]
+        return None
+
+    async def remember(self, problem: ProblemAnalysis, solution: Solution, confidence: Optional[float], vector: Optional[np.ndarray] = None) -> None:
+        """Добавляет принятое решение в индекс и сохраняет индекс на диск"""
+        if vector is None:
+            vector = (await self.embed([self.problem_text(problem)]))[0]
+        self.index.add(vector, {
+            "problem_statement": problem.problem_statement,
+            "problem_area": problem.problem_area,
+            "solution": solution.model_dump(),
+            "confidence": confidence,
+            "created_at": time.time(),
+        })
+        await self.index.persist()
+
+
+_memory: Optional[SolutionMemory] = None
+
+
+def get_solution_memory(client: Mistral) -> Optional[SolutionMemory]:
+    """Общий для процесса индекс решений или None, если выключен (SOLUTION_INDEX_ENABLED=0)"""
+    global _memory
+    if os.getenv("SOLUTION_INDEX_ENABLED", "1") != "1":
+        return None
+    if _memory is None:
+        _memory = SolutionMemory(
+            client,
+            SolutionIndex(
+                path=os.getenv("SOLUTION_INDEX_PATH", "data/solution_index") or None,
+                max_entries=int(os.getenv("SOLUTION_INDEX_MAX_ENTRIES", "10000")),
+            ),
+            model=os.getenv("SOLUTION_INDEX_EMBED_MODEL", "mistral-embed"),
+            top_k=int(os.getenv("SOLUTION_INDEX_TOP_K", "3")),
+            min_similarity=float(os.getenv("SOLUTION_INDEX_MIN_SIMILARITY", "0.75")),
+            reuse_similarity=float(os.getenv("SOLUTION_INDEX_REUSE_SIMILARITY", "0.95")),
+        )
+    return _memory
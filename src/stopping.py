@@ -0,0 +1,130 @@
+"""
+Политики остановки цикла рассуждений: плато уверенности, дедлайн, бюджет токенов и стоимости
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+from usage import RunUsage
+
+
+@dataclass
+class ReasoningProgress:
+    """Состояние рассуждения, по которому политика решает, продолжать ли"""
+    iteration: int = 0
+    confidences: List[float] = field(default_factory=list)
+    started_at: float = field(default_factory=time.monotonic)
+    usage: RunUsage = field(default_factory=RunUsage)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def best_confidence(self) -> Optional[float]:
+        return max(self.confidences) if self.confidences else None
+
+
+class StoppingPolicy:
+    """Базовая политика: should_stop возвращает причину остановки или None"""
+
+    def should_stop(self, progress: ReasoningProgress) -> Optional[str]:
+        raise NotImplementedError
+
+    def time_left(self, progress: ReasoningProgress) -> Optional[float]:
+        """Сколько секунд осталось до дедлайна (None - дедлайна нет)"""
+        return None
+
+
+class PlateauPolicy(StoppingPolicy):
+    """Остановка, если лучшая уверенность не выросла на min_delta за patience итераций (плато или регресс)"""
+
+    def __init__(self, patience: int = 2, min_delta: float = 0.02):
+        self.patience = patience
+        self.min_delta = min_delta
+
+    def should_stop(self, progress: ReasoningProgress) -> Optional[str]:
+        confidences = progress.confidences
+        if self.patience <= 0 or len(confidences) <= self.patience:
+            return None
+        best_before = max(confidences[:-self.patience])
+        if max(confidences[-self.patience:]) < best_before + self.min_delta:
+            return "plateau"
+        return None
+
+
+class DeadlinePolicy(StoppingPolicy):
+    """Ограничение времени на один вопрос"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def should_stop(self, progress: ReasoningProgress) -> Optional[str]:
+        return "deadline" if progress.elapsed >= self.seconds else None
+
+    def time_left(self, progress: ReasoningProgress) -> Optional[float]:
+        return max(0.0, self.seconds - progress.elapsed)
+
+
+class BudgetPolicy(StoppingPolicy):
+    """Ограничение токенов и стоимости (в $) на один вопрос; 0 - без ограничения"""
+
+    def __init__(self, max_tokens: int = 0, max_cost: float = 0.0):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+
+    def should_stop(self, progress: ReasoningProgress) -> Optional[str]:
+        if self.max_tokens and progress.usage.total_tokens >= self.max_tokens:
+            return "token_budget"
+        if self.max_cost and progress.usage.cost >= self.max_cost:
+            return "cost_budget"
+        return None
+
+
+class CompositePolicy(StoppingPolicy):
+    """Останавливает по первой сработавшей политике"""
+
+    def __init__(self, policies: List[StoppingPolicy]):
+        self.policies = policies
+
+    def should_stop(self, progress: ReasoningProgress) -> Optional[str]:
+        for policy in self.policies:
+            reason = policy.should_stop(progress)
+            if reason:
+                return reason
+        return None
+
+    def time_left(self, progress: ReasoningProgress) -> Optional[float]:
+        limits = [policy.time_left(progress) for policy in self.policies]
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+
+def default_stopping_policy() -> StoppingPolicy:
+    """
+    Политика из переменных окружения (0 отключает соответствующее ограничение).
+    Лимит итераций движок проверяет сам, политика добавляет ранние остановки.
+    """
+    policies: List[StoppingPolicy] = []
+    patience = int(os.getenv("STOP_PLATEAU_PATIENCE", "2"))
+    if patience > 0:
+        policies.append(PlateauPolicy(patience, float(os.getenv("STOP_PLATEAU_MIN_DELTA", "0.02"))))
+    deadline = float(os.getenv("REASONING_DEADLINE_SECONDS", "0"))
+    if deadline > 0:
+        policies.append(DeadlinePolicy(deadline))
+    max_tokens = int(os.getenv("REASONING_TOKEN_BUDGET", "0"))
+    max_cost = float(os.getenv("REASONING_COST_BUDGET", "0"))
+    if max_tokens or max_cost:
+        policies.append(BudgetPolicy(max_tokens, max_cost))
+    return CompositePolicy(policies)
+
+
+# Тексты для пользователя
+STOP_REASON_MESSAGES = {
+    "max_iterations": "Достигнут лимит итераций",
+    "plateau": "Уверенность валидатора перестала расти",
+    "deadline": "Истекло время на вопрос",
+    "token_budget": "Исчерпан бюджет токенов",
+    "cost_budget": "Исчерпан бюджет стоимости",
+}
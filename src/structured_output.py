@@ -0,0 +1,196 @@
+"""
+Структурированный вывод агентов: JSON-схема из pydantic-моделей, быстрая проверка ответа
+и локальный ремонт типичных дефектов JSON до повторного вызова модели
+"""
+
+import os
+import re
+import json
+import copy
+import typing
+from typing import Any, Dict, List, Tuple, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from metrics import counter
+
+
+STRUCTURED_OUTPUT = counter(
+    "reshala_structured_output", "Разбор ответов агентов: direct - сразу валиден, repaired - починен локально, "
+    "reissued - понадобился повторный вызов, failed - не удалось", ("agent", "path")
+)
+
+# json_schema - ответ ограничен схемой модели; json_object - только валидный JSON (для моделей без поддержки схем)
+STRUCTURED_OUTPUT_MODE = os.getenv("STRUCTURED_OUTPUT_MODE", "json_schema")
+
+# Поля-доли от 0 до 1, которые модели иногда возвращают в процентах
+FRACTION_FIELDS = ("confidence",)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class StructuredOutputError(ValueError):
+    """Ответ модели не удалось привести к схеме даже после ремонта"""
+
+
+def _strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Запрещает лишние поля во всех объектах схемы"""
+    schema = copy.deepcopy(schema)
+    nodes = [schema]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, dict):
+            if node.get("type") == "object":
+                node.setdefault("additionalProperties", False)
+            nodes.extend(node.values())
+        elif isinstance(node, list):
+            nodes.extend(node)
+    return schema
+
+
+def response_format_for(model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """response_format для запроса: JSON-схема модели или просто JSON-объект"""
+    if STRUCTURED_OUTPUT_MODE != "json_schema":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model_cls.__name__,
+            "schema": _strict_schema(model_cls.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _extract_object(text: str) -> str:
+    """Первый JSON-объект в тексте: без обрамляющего текста и markdown-блоков; недописанный - закрывается"""
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return text.strip()
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+    # Ответ оборван: закрываем строку и скобки
+    tail = text[start:]
+    if in_string:
+        tail += '"'
+    tail = re.sub(r'[,:]\s*$', "", tail.rstrip())
+    return tail + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Any:
+    """Разбирает JSON после ремонта: markdown-блоки, текст вокруг, висячие запятые, обрыв ответа, переводы строк и табуляции внутри строк"""
+    candidate = _TRAILING_COMMA.sub(r"\1", _extract_object(text))
+    # strict=False: сырые управляющие символы внутри строк - частый дефект ответов модели
+    return json.loads(candidate, strict=False)
+
+
+def _split_steps(text: str) -> List[str]:
+    lines = [re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", line).strip() for line in text.splitlines()]
+    return [line for line in lines if line]
+
+
+def _as_fraction(value: Any) -> Any:
+    """Уверенность в процентах ("85%", 85) -> доля (0.85)"""
+    if isinstance(value, str):
+        text = value.strip().replace(",", ".")
+        percent = text.endswith("%")
+        try:
+            value = float(text.rstrip("%").strip())
+        except ValueError:
+            return value
+        if percent:
+            return value / 100
+    if isinstance(value, (int, float)) and 1 < value <= 100:
+        return value / 100
+    return value
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    """Приводит значение к типу поля: строки <-> списки, числа в строках"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        if value is None or value in ("", "null", "None"):
+            return None
+        annotation = next(arg for arg in args if arg is not type(None))
+        origin = typing.get_origin(annotation)
+    if origin in (list, List):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return _split_steps(value)
+        if isinstance(value, list):
+            return [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) if isinstance(item, (dict, list)) else str(item) for item in value]
+        return [str(value)]
+    if annotation is str:
+        if isinstance(value, list):
+            return "\n".join(str(item) for item in value)
+        if value is not None and not isinstance(value, str):
+            return str(value)
+    return value
+
+
+def coerce_fields(data: Any, model_cls: Type[BaseModel]) -> Any:
+    """Ремонт на уровне полей: снимает обертки ({"result": {...}}, [{...}]) и приводит типы"""
+    fields = model_cls.model_fields
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if isinstance(data, dict) and not set(fields) & set(data) and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            data = inner
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for name, value in data.items():
+        if name not in fields:
+            result[name] = value
+        elif fields[name].annotation is float:
+            result[name] = _as_fraction(value) if name in FRACTION_FIELDS else value
+        else:
+            result[name] = _coerce(value, fields[name].annotation)
+    return result
+
+
+def parse_structured(content: str, model_cls: Type[ModelT]) -> Tuple[ModelT, str]:
+    """
+    Разбирает ответ модели в model_cls.
+
+    Returns:
+        Tuple[модель, путь разбора: "direct" или "repaired"]
+
+    Raises:
+        StructuredOutputError: ответ не удалось починить
+    """
+    try:
+        return model_cls.model_validate_json(content), "direct"
+    except ValidationError:
+        pass
+    try:
+        return model_cls.model_validate(coerce_fields(repair_json(content), model_cls)), "repaired"
+    except (ValueError, ValidationError) as e:
+        raise StructuredOutputError(f"Ответ не соответствует схеме {model_cls.__name__}: {e}") from e
@@ -0,0 +1,44 @@
+"""
+Потоковый вывод в Telegram: одно сообщение редактируется по мере генерации текста
+"""
+
+import time
+from typing import Optional
+from outbox import TelegramOutbox, MAX_MESSAGE_LENGTH, markdown_chunks
+
+
+class MessageStream:
+    """Одно сообщение, которое дописывается правками не чаще, чем раз в min_interval секунд"""
+
+    def __init__(self, outbox: TelegramOutbox, chat_id: int, min_interval: float = 1.5):
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id: Optional[int] = None
+        self._last_text: Optional[str] = None
+        self._next_edit_at = 0.0
+
+    async def update(self, text: str) -> None:
+        """Промежуточный текст (без разметки); слишком частые правки пропускаются"""
+        if self.message_id is not None and time.monotonic() < self._next_edit_at:
+            return
+        # Промежуточная правка не критична: если лимит Telegram исчерпан, ее можно пропустить
+        await self._show(text[:MAX_MESSAGE_LENGTH], None, best_effort=True)
+
+    async def finish(self, text: str, parse_mode: Optional[str]) -> None:
+        """Итоговый текст в разметке; все, что не влезло в одно сообщение, уходит отдельными"""
+        chunks = markdown_chunks(text)
+        await self._show(chunks[0], parse_mode)
+        for chunk in chunks[1:]:
+            await self.outbox.send_message(self.chat_id, chunk, parse_mode)
+
+    async def _show(self, text: str, parse_mode: Optional[str], best_effort: bool = False) -> None:
+        if text == self._last_text:
+            return
+        if self.message_id is None:
+            message = await self.outbox.send_message(self.chat_id, text, parse_mode)
+            self.message_id = message.message_id
+        elif not await self.outbox.edit_message(self.chat_id, self.message_id, text, parse_mode, best_effort=best_effort):
+            return
+        self._last_text = text
+        self._next_edit_at = time.monotonic() + self.min_interval
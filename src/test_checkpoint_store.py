@@ -0,0 +1,149 @@
+"""
+Тесты чекпоинтов: отданное рассуждение снова захватывается, продолжение для занятого чата встает
+в очередь за его текущим вопросом, а не начавшийся к остановке вопрос сохраняется
+(запуск: python -m pytest test_checkpoint_store.py)
+"""
+
+import asyncio
+import sqlite3
+import pytest
+import bot
+import checkpoint_store
+from checkpoint_store import CheckpointStore
+from job_scheduler import Job, JobScheduler
+
+
+def run_status(path, run_id):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT status, incarnation FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+
+
+def test_released_run_is_claimed_again(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+
+    async def scenario():
+        store = CheckpointStore(path, replica="a")
+        other = CheckpointStore(path, replica="b")
+        checkpoint = await store.create(1, "вопрос")
+        await checkpoint.save({"step": 1})
+        await store.release(checkpoint.run_id)
+        # Отданное рассуждение не продлевается своим процессом и достается первому, кто его захватит
+        await store.renew_leases()
+        claimed = await other.claim_interrupted()
+        assert [run.run_id for run in claimed] == [checkpoint.run_id]
+        assert claimed[0].state == {"step": 1}
+        assert await store.claim_interrupted() == []
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def resume_env(tmp_path, monkeypatch):
+    """Хранилище бота, свой планировщик и перехват отправки сообщений"""
+    path = str(tmp_path / "checkpoints.sqlite3")
+    monkeypatch.setenv("CHECKPOINT_ENABLED", "1")
+    monkeypatch.setattr(checkpoint_store, "_store", CheckpointStore(path, replica="a"))
+    scheduler = JobScheduler(max_workers=2)
+    monkeypatch.setattr(bot, "job_scheduler", scheduler)
+    sent = []
+
+    async def send_message(chat_id, text, parse_mode=None):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(bot.outbox, "send_message", send_message)
+    resumed = []
+
+    async def process_question(context, job, checkpoint=None):
+        resumed.append((job.text, checkpoint.state))
+        await checkpoint.store.finish(checkpoint.run_id, "done")
+
+    monkeypatch.setattr(bot, "process_question", process_question)
+    return path, scheduler, sent, resumed
+
+
+async def interrupted_run(path):
+    """Рассуждение, брошенное предыдущим процессом той же реплики"""
+    crashed = CheckpointStore(path, replica="a")
+    checkpoint = await crashed.create(1, "прерванный вопрос")
+    await checkpoint.save({"step": 2})
+    return checkpoint.run_id
+
+
+def test_resume_waits_for_busy_chat(resume_env):
+    path, scheduler, sent, resumed = resume_env
+
+    async def scenario():
+        run_id = await interrupted_run(path)
+        scheduler.start()
+        current_done = asyncio.Event()
+
+        async def current(job):
+            await current_done.wait()
+
+        await scheduler.submit(Job(chat_id=1, text="новый вопрос", run=current))
+        await asyncio.sleep(0)
+        await bot.resume_interrupted_runs()
+        # Захват не отдан: продолжение ждет в очереди чата, другие реплики его не берут
+        assert scheduler.queued == 1
+        assert "позиция" in sent[-1][1]
+        assert await CheckpointStore(path, replica="b", lease_seconds=0).claim_interrupted() == []
+        # Новое сообщение чата не дописывается к продолжению
+        await scheduler.submit(Job(chat_id=1, text="еще вопрос", run=current))
+        assert scheduler.queued == 2
+
+        current_done.set()
+        for _ in range(100):
+            if resumed:
+                break
+            await asyncio.sleep(0.01)
+        assert resumed == [("прерванный вопрос", {"step": 2})]
+        assert run_status(path, run_id)[0] == "done"
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_resume_is_finished(resume_env):
+    path, scheduler, sent, resumed = resume_env
+
+    async def scenario():
+        run_id = await interrupted_run(path)
+        scheduler.start()
+        current_done = asyncio.Event()
+
+        async def current(job):
+            await current_done.wait()
+
+        await scheduler.submit(Job(chat_id=1, text="новый вопрос", run=current))
+        await asyncio.sleep(0)
+        await bot.resume_interrupted_runs()
+        await scheduler.cancel(1)
+        current_done.set()
+        assert run_status(path, run_id)[0] == "cancelled"
+        assert resumed == []
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_drain_saves_queued_question(resume_env):
+    path, scheduler, sent, resumed = resume_env
+
+    async def scenario():
+        scheduler.start()
+
+        async def current(job):
+            await job.cancel_event.wait()
+
+        await scheduler.submit(Job(chat_id=1, text="долгий вопрос", run=current))
+        await asyncio.sleep(0)
+        await scheduler.submit(Job(chat_id=1, text="вопрос в очереди", run=current, on_dropped=bot.drop_queued_question))
+        await asyncio.sleep(0)
+        await scheduler.drain(0.1)
+        assert "сохранен" in sent[-1][1]
+        # Не начавшийся вопрос продолжит следующий процесс
+        claimed = await CheckpointStore(path, replica="a").claim_interrupted()
+        assert [(run.chat_id, run.question, run.state) for run in claimed] == [(1, "вопрос в очереди", None)]
+        await scheduler.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+"""
+Тесты планировщика: обход чатов по кругу и присоединение лишних сообщений к ожидающей задаче
+(запуск: python -m pytest test_job_scheduler.py)
+"""
+
+import asyncio
+import pytest
+from job_scheduler import Job, JobScheduler
+
+
+def test_round_robin_and_merging():
+    async def scenario():
+        scheduler = JobScheduler(max_workers=1, max_pending_per_chat=1)
+        scheduler.start()
+        first_done = asyncio.Event()
+        started = []
+
+        async def first(job):
+            started.append(job.text)
+            await first_done.wait()
+
+        async def record(job):
+            started.append(job.text)
+
+        _, position, _ = await scheduler.submit(Job(chat_id=1, text="a1", run=first))
+        assert position == 0
+        await asyncio.sleep(0)
+        await scheduler.submit(Job(chat_id=1, text="a2", run=record))
+        await scheduler.submit(Job(chat_id=2, text="b1", run=record))
+        await scheduler.submit(Job(chat_id=3, text="c1", run=record))
+        # Лимит ожидающих задач чата исчерпан - сообщение дописывается к последней из них
+        job, _, coalesced = await scheduler.submit(Job(chat_id=1, text="a3", run=record))
+        assert coalesced
+        assert job.text == "a2\na3"
+        assert scheduler.queued == 3
+
+        first_done.set()
+        for _ in range(100):
+            if len(started) == 4:
+                break
+            await asyncio.sleep(0.01)
+        # Чат 1 только что отработал и встает в очередь после чатов 2 и 3
+        assert started == ["a1", "b1", "c1", "a2\na3"]
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_unmergeable_job_is_queued_separately():
+    async def scenario():
+        scheduler = JobScheduler(max_workers=1, max_pending_per_chat=1)
+        scheduler.start()
+        first_done = asyncio.Event()
+
+        async def first(job):
+            await first_done.wait()
+
+        await scheduler.submit(Job(chat_id=1, text="a1", run=first))
+        await asyncio.sleep(0)
+        await scheduler.submit(Job(chat_id=1, text="продолжение", run=first, mergeable=False))
+        _, _, coalesced = await scheduler.submit(Job(chat_id=1, text="a2", run=first))
+        assert not coalesced
+        assert scheduler.queued == 2
+        first_done.set()
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_max_pending_per_chat_must_be_positive():
+    with pytest.raises(ValueError):
+        JobScheduler(max_pending_per_chat=0)
@@ -0,0 +1,100 @@
+"""
+Тесты ограничителя запросов: пополнение ведра, ожидание сверх квоты и пауза по Retry-After
+на подмененных часах (запуск: python -m pytest test_rate_limiter.py)
+"""
+
+import asyncio
+import pytest
+from rate_limiter import ModelRateLimiter, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    """Часы, которые идут только по sleep"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(clock, rpm=60, tpm=600000, burst=2):
+    return ModelRateLimiter("test-model", rpm, tpm, burst, clock=clock, sleep=clock.sleep)
+
+
+def test_bucket_refills_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    bucket.consume(2)
+    assert bucket.time_until(1) == pytest.approx(1.0)
+    assert bucket.saturation == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.time_until(1) == pytest.approx(0.5)
+    clock.now += 10
+    # Ведро не переполняется: за простой набирается не больше capacity
+    assert bucket.time_until(2) == 0.0
+    assert bucket.level == pytest.approx(2)
+    assert bucket.saturation == pytest.approx(0.0)
+
+
+def test_requests_over_budget_wait():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rpm=60, burst=2)
+
+    async def scenario():
+        return [await limiter.acquire(1) for _ in range(3)]
+
+    # Два запроса проходят сразу (burst), третий ждет секунду при 60 запросах в минуту
+    assert asyncio.run(scenario()) == pytest.approx([0.0, 0.0, 1.0])
+    assert clock.sleeps == pytest.approx([1.0])
+
+
+def test_tokens_over_budget_wait():
+    clock = FakeClock()
+    limiter = make_limiter(clock, tpm=60, burst=10)
+
+    async def scenario():
+        await limiter.acquire(60)
+        return await limiter.acquire(30)
+
+    assert asyncio.run(scenario()) == pytest.approx(30.0)
+
+
+def test_reconcile_returns_overestimated_tokens():
+    clock = FakeClock()
+    limiter = make_limiter(clock, tpm=100, burst=10)
+
+    async def scenario():
+        await limiter.acquire(100)
+        limiter.reconcile(100, 40)
+        return await limiter.acquire(60)
+
+    assert asyncio.run(scenario()) == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2", 2.0),
+    ("0.5", 0.5),
+    ("-3", 0.0),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+    ("когда-нибудь", None),
+    (None, None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_retry_after_blocks_requests():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    limiter.observe_headers({"retry-after": "5"})
+
+    async def scenario():
+        return await limiter.acquire(1)
+
+    assert asyncio.run(scenario()) == pytest.approx(5.0)
@@ -0,0 +1,108 @@
+"""
+Тесты single-flight: одинаковые вопросы решаются одним рассуждением, отмена одного участника
+не останавливает рассуждение для остальных (запуск: python -m pytest test_single_flight.py)
+"""
+
+import asyncio
+import pytest
+from reasoning_engine import ReasoningCancelled
+from single_flight import JOIN_MESSAGE, SingleFlight
+
+
+class FakeReasoning:
+    """Рассуждение, которое отправляет шаг прогресса и ждет разрешения завершиться"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancel_event = None
+
+    async def __call__(self, progress_callback, stream_callback, cancel_event, checkpoint):
+        self.calls += 1
+        self.cancel_event = cancel_event
+        self.started.set()
+        await progress_callback("шаг 1")
+        await self.release.wait()
+        if cancel_event.is_set():
+            raise ReasoningCancelled()
+        return {"solution": "42"}
+
+
+def recorder():
+    messages = []
+
+    async def progress(message):
+        messages.append(message)
+
+    return messages, progress
+
+
+def test_two_callers_share_one_run():
+    async def scenario():
+        flight = SingleFlight()
+        start = FakeReasoning()
+        leader_messages, leader_progress = recorder()
+        follower_messages, follower_progress = recorder()
+
+        leader = asyncio.ensure_future(flight.run("ключ", start, leader_progress))
+        await start.started.wait()
+        follower = asyncio.ensure_future(flight.run("ключ", start, follower_progress))
+        await asyncio.sleep(0)
+        assert flight.active == 1
+        start.release.set()
+        leader_result, follower_result = await asyncio.gather(leader, follower)
+
+        assert start.calls == 1
+        assert leader_result is follower_result
+        assert leader_result == {"solution": "42"}
+        assert leader_messages == ["шаг 1"]
+        # Присоединившийся получает уже отправленный прогресс
+        assert follower_messages == [JOIN_MESSAGE, "шаг 1"]
+        assert flight.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_leaves_run_for_others():
+    async def scenario():
+        flight = SingleFlight()
+        start = FakeReasoning()
+        leader_cancel = asyncio.Event()
+
+        leader = asyncio.ensure_future(flight.run("ключ", start, cancel_event=leader_cancel))
+        await start.started.wait()
+        follower = asyncio.ensure_future(flight.run("ключ", start))
+        await asyncio.sleep(0)
+        leader_cancel.set()
+        with pytest.raises(ReasoningCancelled):
+            await leader
+        assert not start.cancel_event.is_set()
+        start.release.set()
+        assert await follower == {"solution": "42"}
+        assert start.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_last_caller_cancel_stops_run():
+    async def scenario():
+        flight = SingleFlight()
+        start = FakeReasoning()
+        cancel_event = asyncio.Event()
+
+        caller = asyncio.ensure_future(flight.run("ключ", start, cancel_event=cancel_event))
+        await start.started.wait()
+        cancel_event.set()
+        for _ in range(100):
+            if start.cancel_event.is_set():
+                break
+            await asyncio.sleep(0.01)
+        assert start.cancel_event.is_set()
+        # Новый вопрос с тем же ключом запускает свое рассуждение
+        assert flight.active == 0
+        start.release.set()
+        with pytest.raises(ReasoningCancelled):
+            await caller
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+"""
+Тесты локального ремонта ответов модели (запуск: python -m pytest test_structured_output.py)
+"""
+
+import pytest
+from models import Solution, ValidationResult
+from structured_output import StructuredOutputError, parse_structured, repair_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Вот ответ: {"a": [1, 2]} - готово', {"a": [1, 2]}),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ('{"a": "оборванная строка', {"a": "оборванная строка"}),
+    ('{"a": [1, {"b": 2', {"a": [1, {"b": 2}]}),
+    # Сырые перевод строки и табуляция внутри строки
+    ('{"a": "первая строка\nвторая\tстрока"}', {"a": "первая строка\nвторая\tстрока"}),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_control_characters_are_repaired_locally():
+    solution, path = parse_structured('{"solution": "Решение:\n\tкоротко", "steps": ["шаг 1\nпродолжение"]}', Solution)
+    assert path == "repaired"
+    assert solution.solution == "Решение:\n\tкоротко"
+    assert solution.steps == ["шаг 1\nпродолжение"]
+
+
+def test_coerced_fields():
+    result, path = parse_structured('{"confidence": "85%", "feedback": "ок", "missing_aspects": "- первое\n- второе"}', ValidationResult)
+    assert path == "repaired"
+    assert result.confidence == pytest.approx(0.85)
+    assert result.missing_aspects == ["первое", "второе"]
+
+
+def test_unrepairable_answer():
+    with pytest.raises(StructuredOutputError):
+        parse_structured("не JSON", Solution)
@@ -0,0 +1,80 @@
+"""
+Тесты ансамбля валидаторов: уверенность - quorum-я по величине оценка, оставшиеся вызовы
+отменяются, как только исход кворума определен (запуск: python -m pytest test_validator_ensemble.py)
+"""
+
+import asyncio
+import pytest
+from models import ProblemAnalysis, Solution, ValidationResult
+from validator_ensemble import ValidatorEnsemble
+
+
+PROBLEM = ProblemAnalysis(problem_statement="проблема", problem_area="тест")
+SOLUTION = Solution(solution="решение", steps=["шаг"])
+
+
+class FakeValidator:
+    """Валидатор с заданной оценкой (или ошибкой), отвечающий через delay секунд"""
+
+    def __init__(self, confidence, delay=0.0, error=False):
+        self.confidence = confidence
+        self.delay = delay
+        self.error = error
+        self.finished = False
+        self.cancelled = False
+
+    async def validate_solution(self, problem, solution, on_partial=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        self.finished = True
+        if self.error:
+            raise RuntimeError("сбой валидатора")
+        return ValidationResult(confidence=self.confidence, feedback=f"оценка {self.confidence}", missing_aspects=["риски"])
+
+
+def validate(validators, threshold=0.7, quorum=None):
+    return asyncio.run(ValidatorEnsemble(validators, threshold, quorum).validate_solution(PROBLEM, SOLUTION))
+
+
+def test_confidence_is_quorum_th_highest():
+    # Исход решает последний голос: 0.9 за, 0.5 против, 0.75 за
+    validators = [FakeValidator(0.9, 0.0), FakeValidator(0.5, 0.01), FakeValidator(0.75, 0.02)]
+    result = validate(validators, quorum=2)
+    assert result.confidence == pytest.approx(0.75)
+    assert result.feedback.startswith("Голоса валидаторов: 2 за, 1 против (кворум 2 из 3)")
+    assert result.missing_aspects == ["риски"]
+
+
+def test_failed_validator_votes_with_zero_confidence():
+    validators = [FakeValidator(0.9, 0.0), FakeValidator(0.9, 0.01, error=True), FakeValidator(0.2, 0.02)]
+    result = validate(validators, quorum=2)
+    # Оценки 0.9, 0.2 и 0.0 за ошибку - вторая по величине ниже порога
+    assert result.confidence == pytest.approx(0.2)
+    assert "1 за, 2 против" in result.feedback
+
+
+def test_early_exit_cancels_remaining_validators():
+    slow = FakeValidator(0.1, delay=10)
+    validators = [FakeValidator(0.9, 0.0), FakeValidator(0.8, 0.01), slow]
+    result = asyncio.run(asyncio.wait_for(ValidatorEnsemble(validators, 0.7, 2).validate_solution(PROBLEM, SOLUTION), 5))
+    # Кворум набран двумя голосами - медленный валидатор не дождались
+    assert result.confidence == pytest.approx(0.8)
+    assert slow.cancelled
+    assert not slow.finished
+
+
+def test_early_exit_when_quorum_unreachable():
+    slow = FakeValidator(0.95, delay=10)
+    validators = [FakeValidator(0.3, 0.0), FakeValidator(0.4, 0.01), slow]
+    result = asyncio.run(asyncio.wait_for(ValidatorEnsemble(validators, 0.7, 2).validate_solution(PROBLEM, SOLUTION), 5))
+    assert result.confidence < 0.7
+    assert slow.cancelled
+
+
+def test_all_validators_failed():
+    validators = [FakeValidator(0.9, error=True), FakeValidator(0.9, error=True)]
+    with pytest.raises(RuntimeError):
+        validate(validators)
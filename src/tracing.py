@@ -0,0 +1,99 @@
+"""
+Трассировка рассуждений: дерево спанов на каждый вопрос (этапы, вызовы моделей, повторы)
+"""
+
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+# Файл JSONL для трасс; без него трассы пишутся в лог
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+
+
+@dataclass
+class Span:
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+    duration: Optional[float] = None
+    status: str = "ok"
+    children: List["Span"] = field(default_factory=list)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.started_at if origin is None else origin
+        return {
+            "name": self.name,
+            "offset": round(self.started_at - origin, 4),
+            "duration": round(self.duration, 4) if self.duration is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def _run_span(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = type(e).__name__
+        raise
+    finally:
+        span.duration = time.monotonic() - span.started_at
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Дочерний спан текущей трассы; вне трассы ничего не делает (отдает None)"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attributes)
+    parent.children.append(child)
+    with _run_span(child) as current:
+        yield current
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Корневой спан вопроса; по завершении трасса выгружается (если TRACING_ENABLED=1)"""
+    if not TRACING_ENABLED or _current_span.get() is not None:
+        with span(name, **attributes) as current:
+            yield current
+        return
+    root = Span(name, attributes)
+    try:
+        with _run_span(root) as current:
+            yield current
+    finally:
+        _export(root)
+
+
+def _export(root: Span) -> None:
+    line = json.dumps(root.to_dict(), ensure_ascii=False, default=str)
+    if not TRACE_PATH:
+        logger.info(f"Трасса: {line}")
+        return
+    try:
+        with open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning(f"Не удалось записать трассу в {TRACE_PATH}: {e}")
@@ -0,0 +1,74 @@
+"""
+Учет расхода API в рамках одного рассуждения (вызовы, токены, ожидание в очереди)
+"""
+
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+# Цены по умолчанию, $ за 1M токенов (вход, выход); переопределяются MISTRAL_PRICE_INPUT_<MODEL> / MISTRAL_PRICE_OUTPUT_<MODEL>
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "mistral-large-latest": (2.0, 6.0),
+    "mistral-medium-latest": (0.4, 2.0),
+    "mistral-small-latest": (0.1, 0.3),
+    "mistral-embed": (0.1, 0.0),
+}
+
+
+def model_price(model: str) -> Tuple[float, float]:
+    """Цена модели в $ за 1M входных и выходных токенов"""
+    model_key = model.upper().replace("-", "_").replace(".", "_")
+    input_price, output_price = DEFAULT_PRICES.get(model, (0.0, 0.0))
+    return (
+        float(os.getenv(f"MISTRAL_PRICE_INPUT_{model_key}", input_price)),
+        float(os.getenv(f"MISTRAL_PRICE_OUTPUT_{model_key}", output_price)),
+    )
+
+
+@dataclass
+class RunUsage:
+    """Счетчики одного рассуждения; общие для всех задач, порожденных в его контексте"""
+    calls: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    queue_wait: float = 0.0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add_response(self, response: Any, model: str) -> None:
+        """Учитывает поле usage ответа API и его стоимость"""
+        self.calls += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            input_price, output_price = model_price(model)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cost += (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+_current_usage: ContextVar[Optional[RunUsage]] = ContextVar("current_usage", default=None)
+
+
+def current_usage() -> Optional[RunUsage]:
+    """Счетчики текущего рассуждения или None, если учет не включен"""
+    return _current_usage.get()
+
+
+@contextmanager
+def track_usage(usage: Optional[RunUsage] = None) -> Iterator[RunUsage]:
+    """Включает учет расхода для кода внутри блока with"""
+    usage = usage or RunUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
@@ -0,0 +1,115 @@
+"""
+Ансамбль валидаторов: M критиков (разные модели и/или фокус проверки) оценивают решение параллельно,
+решение принимается кворумом, а оставшиеся вызовы отменяются, как только исход кворума определен
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence
+from mistralai import Mistral
+from agents import ValidationAgent, PartialCallback
+from models import ProblemAnalysis, Solution, ValidationResult
+from metrics import VALIDATOR_ENSEMBLE_DECISIONS
+
+
+logger = logging.getLogger(__name__)
+
+# На чем сосредоточены критики ансамбля по очереди (первый - общая проверка)
+DEFAULT_FOCUSES: Sequence[Optional[str]] = (
+    None,
+    "выполнимости шагов: можно ли выполнить их на практике, в этом порядке и с доступными ресурсами",
+    "полноте: какие стороны проблемы, ограничения и риски решение не учитывает",
+    "корректности: нет ли в решении фактических и логических ошибок",
+)
+
+
+class ValidatorEnsemble:
+    """
+    Тот же интерфейс, что у ValidationAgent (validate_solution), но голосуют несколько валидаторов.
+
+    Валидатор голосует "за", если его уверенность не ниже threshold; решение принято, если "за" не меньше
+    quorum голосов. Ошибка валидатора считается голосом "против" с нулевой уверенностью (не смог подтвердить решение).
+    Уверенность ансамбля - quorum-я по величине оценка из полученных голосов: она не ниже порога ровно тогда,
+    когда порог прошли не меньше quorum валидаторов.
+    """
+
+    def __init__(self, validators: List[ValidationAgent], threshold: float, quorum: Optional[int] = None):
+        if not validators:
+            raise ValueError("Ансамбль валидаторов пуст")
+        self.validators = validators
+        self.threshold = threshold
+        self.quorum = min(len(validators), quorum or len(validators) // 2 + 1)
+
+    async def validate_solution(self, problem: ProblemAnalysis, solution: Solution, on_partial: Optional[PartialCallback] = None) -> ValidationResult:
+        """Проверяет решение ансамблем (поток частичного вывода - только от первого валидатора)"""
+        tasks = [
+            asyncio.ensure_future(validator.validate_solution(problem, solution, on_partial=on_partial if i == 0 else None))
+            for i, validator in enumerate(self.validators)
+        ]
+        results: List[ValidationResult] = []
+        errors: List[Exception] = []
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                try:
+                    results.append(await next_result)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Валидатор ансамбля завершился ошибкой: {e}")
+                    errors.append(e)
+                votes_for = sum(1 for result in results if result.confidence >= self.threshold)
+                votes_against = len(results) + len(errors) - votes_for
+                # Кворум набран или уже недостижим - остальных можно не ждать (но хотя бы одна оценка нужна)
+                if results and (votes_for >= self.quorum or votes_against > len(self.validators) - self.quorum):
+                    break
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception() # Ошибка валидатора, ответившего уже после решения, не попадет в лог как необработанная
+        if not results:
+            raise errors[-1]
+        validation = self._aggregate(results, len(errors), votes_for, votes_against)
+        VALIDATOR_ENSEMBLE_DECISIONS.inc(
+            outcome="accepted" if votes_for >= self.quorum else "rejected",
+            early="yes" if votes_for + votes_against < len(self.validators) else "no"
+        )
+        return validation
+
+    def _aggregate(self, results: List[ValidationResult], failed: int, votes_for: int, votes_against: int) -> ValidationResult:
+        # Голос упавшего валидатора - "против" с нулевой уверенностью
+        confidences = sorted([result.confidence for result in results] + [0.0] * failed, reverse=True)
+        confidence = confidences[min(self.quorum, len(confidences)) - 1]
+        accepted = votes_for >= self.quorum
+        # Обратная связь - от валидаторов, чье мнение победило
+        winners = [result for result in results if (result.confidence >= self.threshold) == accepted] or results
+        feedback = f"Голоса валидаторов: {votes_for} за, {votes_against} против (кворум {self.quorum} из {len(self.validators)})\n"
+        feedback += "\n".join(f"- {result.feedback}" for result in winners)
+        # Недостающие аспекты всех валидаторов без повторов; названные несколькими - первыми
+        aspects: Dict[str, List] = {}
+        for result in results:
+            for aspect in result.missing_aspects or []:
+                key = " ".join(aspect.lower().split())
+                if key in aspects:
+                    aspects[key][1] += 1
+                else:
+                    aspects[key] = [aspect, 1, len(aspects)]
+        missing_aspects = [aspect for aspect, _, _ in sorted(aspects.values(), key=lambda item: (-item[1], item[2]))]
+        return ValidationResult(confidence=confidence, feedback=feedback, missing_aspects=missing_aspects or None)
+
+
+def validator_ensemble_from_env(api_key: str, client: Mistral, threshold: float) -> Optional[ValidatorEnsemble]:
+    """Ансамбль из VALIDATOR_ENSEMBLE_* или None, если VALIDATOR_ENSEMBLE_SIZE меньше 2"""
+    size = int(os.getenv("VALIDATOR_ENSEMBLE_SIZE", "1"))
+    if size < 2:
+        return None
+    # Модели по кругу; пусто - модель этапа validator через маршрутизатор (с запасными моделями)
+    models = [model.strip() for model in os.getenv("VALIDATOR_ENSEMBLE_MODELS", "").split(",") if model.strip()] or [None]
+    validators = [
+        ValidationAgent(api_key, model=models[i % len(models)], client=client, focus=DEFAULT_FOCUSES[i % len(DEFAULT_FOCUSES)])
+        for i in range(size)
+    ]
+    quorum = int(os.getenv("VALIDATOR_ENSEMBLE_QUORUM", "0")) or None
+    return ValidatorEnsemble(validators, threshold, quorum)